@@ -1,7 +1,11 @@
 import streamlit as st
 from openai import OpenAI
-import os
 import backend # This imports your backend.py file
+import batch
+import jobs
+import publishers
+import speculative
+import tracing
 
 # --- 1. Page Configuration & Title ---
 st.set_page_config(
@@ -105,18 +109,30 @@ load_css()
 
 
 # --- 2. Load API Keys & Initialize Clients ---
-try:
-    keys = {
-        "OPENWEATHER_API_KEY": st.secrets["OPENWEATHER_API_KEY"],
-        "IQAIR_API_KEY": st.secrets["IQAIR_API_KEY"],
-        "CALENDARIFIC_API_KEY": st.secrets["CALENDARIFIC_API_KEY"],
-        "NEWS_API_KEY": st.secrets["NEWS_API_KEY"],
-        "TELEGRAM_BOT_TOKEN": st.secrets["TELEGRAM_BOT_TOKEN"],
-        "TELEGRAM_CHAT_ID": st.secrets["TELEGRAM_CHAT_ID"],
-        "DISCORD_WEBHOOK_URL": st.secrets["DISCORD_WEBHOOK_URL"],
-        "OPENAI_API_KEY": st.secrets["OPENAI_API_KEY"]
-    }
+@st.cache_resource(show_spinner=False)
+def load_services():
+    """
+    Keys, the OpenAI client (and its connection pool) and the background services,
+    created once per server process rather than on every rerun. A missing key
+    raises KeyError, which is not cached, so the next run tries again.
+    """
+    keys = {name: st.secrets[name] for name in backend.KEY_NAMES}
     openai_client = OpenAI(api_key=keys["OPENAI_API_KEY"])
+    # Keeps the yearly holiday index current; only the first call starts a thread
+    backend.holiday_index.start_background_refresh(keys)
+    # Keeps every city's signals in the shared snapshot store, so analysis rarely waits on a signal API
+    backend.ensure_signal_refresher(keys)
+    # Generation runs in background workers so reruns and reloads don't lose it
+    job_pool = jobs.ensure_workers(keys, openai_client)
+    speculator = speculative.ensure_speculator(openai_client)
+    # Re-runs the strategist for watched brand/city pairs when their signals change materially
+    change_scheduler = jobs.ensure_change_scheduler(job_pool)
+    # Prometheus-style /metrics, only when GEOPULSE_METRICS_PORT is set
+    tracing.start_metrics_server_from_env()
+    return keys, openai_client, job_pool, speculator, change_scheduler
+
+try:
+    keys, openai_client, job_pool, speculator, change_scheduler = load_services()
 except KeyError as e:
     st.error(f"❌ Missing API Key in secrets.toml: {e}. Please add it and restart the app.")
     st.stop()
@@ -134,6 +150,84 @@ if 'ranked_triggers' not in st.session_state:
     st.session_state.ranked_triggers = []
 if 'final_assets' not in st.session_state:
     st.session_state.final_assets = {}
+if 'batch_results' not in st.session_state:
+    st.session_state.batch_results = []
+if 'batch_report' not in st.session_state:
+    st.session_state.batch_report = {}
+if 'publish_results' not in st.session_state:
+    st.session_state.publish_results = {}
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'speculation_round' not in st.session_state:
+    st.session_state.speculation_round = None
+if 'run_traces' not in st.session_state:
+    st.session_state.run_traces = []  # job ids (= trace ids) of the current run, for the waterfall
+
+JOB_POLL_SECONDS = 0.75
+STREAM_POLL_SECONDS = 0.25  # faster refresh for a generation that streams post_text
+ANALYZE_STAGES = {
+    "queued": "⏳ Waiting for a free worker...",
+    "signals": "📡 Fetching live signals...",
+    "strategist": "🤖 AI Strategist is analyzing signals... (Call 1)",
+}
+GENERATE_STAGES = {
+    "queued": "⏳ Waiting for a free worker...",
+    "creative": "🤖 AI Creative is writing the post and analysis... (Call 2)",
+    "image_prompt": "🎨 AI Director is writing a safe image prompt... (Call 3)",
+    "image": "🖼️ DALL-E is generating the image... (Call 4)",
+    "variants": "🤖 AI Creative is writing several post variants... (Call 2)",
+}
+
+# --- 3.5 Reattach to a background job after a reload ---
+# The job id is kept in the URL, so a refreshed tab picks up where it left off.
+if st.session_state.job_id is None and "job" in st.query_params:
+    reattached = job_pool.queue.get(st.query_params["job"])
+    if reattached is None:
+        del st.query_params["job"]
+    else:
+        st.session_state.job_id = reattached["id"]
+        if reattached["kind"] == "analyze":
+            st.session_state.step = "analyzing"
+        else:
+            payload = reattached["payload"]
+            st.session_state.company_profile = payload["company_profile"]
+            st.session_state.city = payload["city"]
+            st.session_state.live_signals = payload["live_signals"]
+            st.session_state.ranked_triggers = payload.get("ranked_triggers", [])
+            st.session_state.final_assets = {"trigger": payload["trigger"], "tone": payload["tone"]}
+            st.session_state.step = "variants" if reattached["kind"] == "variants" else "generation"
+
+def job_pending(job):
+    return job is not None and job["status"] in ("queued", "running")
+
+# --- 3.6 Cached status reads (sidebar and signal panels) ---
+# Shown on every rerun but only change every few seconds, so they are read at most once per TTL.
+# Live signals are not cached here: the script never fetches them, the analyze job does, and
+# fetch_live_signals already reads the shared snapshot store and signal_cache (per-provider
+# TTLs) first. An st.cache_data layer would also keep an "N/A" fallback for its whole TTL.
+@st.cache_data(ttl=5, show_spinner=False)
+def signal_health():
+    return {
+        "cache": backend.signal_cache.stats(),
+        "snapshot_version": backend.snapshot_store.version(),
+        "snapshots": backend.snapshot_store.status(),
+        "breakers": backend.signal_breaker_status(),
+    }
+
+@st.cache_data(ttl=10, show_spinner=False)
+def signal_change_log(limit=30):
+    return backend.change_detector.stats(), backend.change_detector.log(limit)
+
+@st.cache_data(ttl=5, show_spinner=False)
+def api_quotas(_keys):
+    return backend.quota_status(_keys)
+
+def start_job(kind, payload):
+    st.session_state.job_id = job_pool.submit(kind, payload)
+    st.query_params["job"] = st.session_state.job_id
+    if kind == "analyze":
+        st.session_state.run_traces = []
+    st.session_state.run_traces.append(st.session_state.job_id)
 
 # --- 4. Main App UI ---
 st.title("🚀 GeoPulse AI Publisher")
@@ -144,237 +238,578 @@ st.sidebar.title("GeoPulse Controls 🎮")
 
 # --- Step 1: Selection Form ---
 st.sidebar.markdown("### Step 1: Choose Your Target")
-industry_key = st.sidebar.selectbox("🛍️ Select an Industry:", list(backend.COMPANY_PROFILES.keys()))
-brand_options = list(backend.COMPANY_PROFILES[industry_key].keys())
+industries = backend.profile_registry.industries()
+industry_key = st.sidebar.selectbox("🛍️ Select an Industry:", list(industries))
+brand_options = industries[industry_key]
 brand_key = st.sidebar.selectbox("🏷️ Select a Brand:", brand_options)
+if backend.profile_registry.errors:
+    st.sidebar.warning("Some brand profiles were skipped:\n\n" + "\n\n".join(backend.profile_registry.errors.values()))
 city_key = st.sidebar.selectbox("🏙️ Select a City:", backend.CITIES)
+fast_mode = st.sidebar.checkbox(
+    "⚡ Fast pipeline (post + image prompt in one AI call)", value=False,
+    help="Merges Call 2 and Call 3 into one structured call. Off = the two-call path, for quality comparison."
+)
+stream_mode = st.sidebar.checkbox(
+    "📝 Stream the post as it's written", value=True,
+    help="Shows the caption token by token and starts the image prompt as soon as the caption is done. Ignored in fast pipeline mode."
+)
+draft_images = st.sidebar.checkbox(
+    "🖼️ Draft images (DALL-E 2, 512px)", value=False,
+    help="Cheaper and faster previews ($0.018 instead of $0.040). The draft is upscaled to each channel's size "
+         "only when you publish."
+)
+reuse_images = st.sidebar.checkbox(
+    "♻️ Reuse a matching past image", value=True,
+    help="Before calling DALL-E, looks for a past image of this brand whose image prompt is close enough "
+         "and uses it instantly. You can still ask for a new image in the review step."
+)
+reuse_threshold = backend.image_library.threshold
+if reuse_images:
+    reuse_threshold = st.sidebar.slider("Minimum prompt similarity:", 0.5, 1.0, backend.image_library.threshold, 0.05)
+    library_stats = backend.image_library.stats()
+    st.sidebar.caption(f"Image library: {library_stats['images']} images, {library_stats['total_reuses']} reuses "
+                       f"(each image at most {library_stats['max_reuse']}x)")
+variant_count = st.sidebar.slider(
+    "✨ Post variants per request:", 1, backend.MAX_VARIANTS, 1,
+    help="Writes several candidate posts in one AI call and ranks them locally (length, hashtags, brand voice, "
+         "repeats of recent posts). You pick one; only it gets an image."
+)
+compare_top_k = min(3, variant_count)
+if variant_count > 1:
+    compare_top_k = st.sidebar.slider("Variants to compare side by side:", 1, variant_count, compare_top_k)
+fresh_creativity = st.sidebar.checkbox(
+    "🎲 Fresh creativity (bypass AI response cache)", value=False,
+    help="Identical strategist/creative requests are normally answered from the cache while the signals are fresh."
+)
+llm_stats = backend.llm_cache.stats()
+st.sidebar.caption(
+    f"AI response cache: {llm_stats['hit_rate']:.0%} hit rate "
+    f"({llm_stats['hits']} hits / {llm_stats['misses']} misses), ~{llm_stats['saved_latency_s']:.1f}s saved"
+)
+speculative_mode = st.sidebar.checkbox(
+    "🔮 Pre-generate top triggers while you choose", value=False,
+    help="Drafts the creative package for the top-ranked triggers in the background during approval, "
+         "so picking one of them is near-instant. Costs extra AI calls, capped per analysis."
+)
+if speculative_mode:
+    speculate_top_n = st.sidebar.slider("Triggers to pre-generate:", 1, 3, speculator.top_n)
+    spec_stats = speculator.stats()
+    st.sidebar.caption(
+        f"Pre-generation: {spec_stats['hit_rate']:.0%} hit rate ({spec_stats['hits']} hits / {spec_stats['misses']} misses), "
+        f"~${spec_stats['spent_usd']:.3f} spent, ~${spec_stats['wasted_usd']:.3f} wasted"
+    )
+auto_reanalyze = st.sidebar.checkbox(
+    "🔁 Re-analyze when signals change", value=False,
+    help="Runs the strategist again in the background for this brand and city when the AQI crosses a band, "
+         "the weather turns, the temperature swings or a new holiday/event appears."
+)
+if auto_reanalyze:
+    change_scheduler.watch(brand_key, city_key)
+else:
+    change_scheduler.unwatch(brand_key, city_key)
+with st.sidebar.expander("📈 Signal change log"):
+    change_stats, change_log = signal_change_log()
+    st.caption(f"{change_stats['material_changes']} material changes in {change_stats['observations']} observations, "
+               f"{change_scheduler.jobs_submitted} re-analyses scheduled")
+    st.dataframe([
+        {
+            "City": d['city'], "Field": d['field'], "From": str(d['from']), "To": str(d['to']),
+            "Material": "✅" if d['material'] else "", "Reason": d['reason'],
+        }
+        for d in change_log
+    ], use_container_width=True)
+with st.sidebar.expander("📊 API quotas"):
+    limiter_stats = backend.rate_limiter.stats()
+    st.caption(f"Shared by every session and worker on this machine. This process: {limiter_stats['queued']} calls "
+               f"queued ({limiter_stats['waited_s']:.1f}s waited), {limiter_stats['rejected']} degraded")
+    st.dataframe([
+        {
+            "API": q['vendor'], "Endpoint": q['endpoint'], "Tier": q['tier'],
+            "Tokens now": f"{q['tokens']:g} / {q['burst']}", "Per minute": q['per_minute'],
+            "Used today": q['used_today'],
+            "Left today": "no cap" if q['remaining_today'] is None else f"{q['remaining_today']} / {q['daily']}",
+        }
+        for q in api_quotas(keys)
+    ], use_container_width=True, hide_index=True)
+st.sidebar.markdown("---")
+analyze_button =st.sidebar.button("🧠 Analyze Signals & Get Triggers", use_container_width=True, type="primary")
+
+# --- Batch Mode: brand x city matrix ---
 st.sidebar.markdown("---")
-analyze_button = st.sidebar.button("🧠 Analyze Signals & Get Triggers", use_container_width=True, type="primary")
+with st.sidebar.expander("📦 Batch Mode (Brands × Cities)"):
+    batch_brands = st.multiselect("Brands:", backend.all_brands(), default=backend.all_brands())
+    batch_cities = st.multiselect("Cities:", backend.CITIES, default=backend.CITIES)
+    batch_concurrency = st.slider("Pipelines in parallel:", 1, 12, 4)
+    batch_rpm = st.slider("OpenAI calls per minute:", 10, 500, 60)
+    batch_images = st.checkbox("Generate images (DALL-E)", value=True)
+    batch_button = st.button("📦 Run Batch Campaign", use_container_width=True)
 
 # --- 6. Main Content Area (Displays results based on step) ---
 main_content = st.container()
 
 if analyze_button:
-    st.session_state.company_profile = backend.COMPANY_PROFILES[industry_key][brand_key].copy()
-    st.session_state.company_profile['brand_name'] = brand_key.upper()
-    st.session_state.company_profile['industry'] = industry_key 
+    if st.session_state.speculation_round:
+        speculator.cancel(st.session_state.speculation_round)
+        st.session_state.speculation_round = None
     st.session_state.city = city_key
-    
-    try:
-        with st.spinner(f"📡 Fetching live signals for {city_key}..."):
-            st.session_state.live_signals = backend.fetch_live_signals(keys, city_key)
-        
-        with st.spinner("🤖 AI Strategist is analyzing signals... (Call 1)"):
-            st.session_state.ranked_triggers = backend.get_dynamic_triggers_and_tone(
-                openai_client, 
-                st.session_state.live_signals, 
-                st.session_state.company_profile
-            )
-        
-        if not st.session_state.ranked_triggers:
-            st.warning("AI Strategist found no brand-safe triggers. Please try different parameters.")
-            st.session_state.step = "selection" 
+    start_job("analyze", {"brand": brand_key, "city": city_key, "use_cache": not fresh_creativity})
+    st.session_state.step = "analyzing"
+
+# --- Step 1.5: Analysis (background job) ---
+def job_progress(stages):
+    """
+    Progress of the current job. Run as a fragment with run_every, so while a job
+    runs only this block reruns; once it is done or failed, a full rerun moves on.
+    """
+    job = job_pool.queue.get(st.session_state.job_id)
+    if not job_pending(job):
+        st.rerun()
+    progress = job["progress"] or {}
+    st.info(stages[progress.get("stage", "queued")])
+    if progress.get("streaming"):
+        # Fields fill in as their JSON keys close in the streamed reply
+        col1_metric, col2_metric, col3_metric = st.columns(3)
+        with col1_metric:
+            st.metric(label="Predicted Impact", value=progress.get('predicted_impact_rating', '...'))
+        with col2_metric:
+            st.markdown("**Target Audience**")
+            st.code(", ".join(progress.get('target_audience', [])) or "...")
+        with col3_metric:
+            st.markdown("**Hashtags**")
+            st.code(" ".join(progress.get('hashtags', [])) or "...")
+        st.subheader("Generated Caption")
+    if progress.get("post_text"):
+        st.markdown(progress["post_text"])
+    if progress.get("image_prompt"):
+        st.caption(f"Image prompt: *{progress['image_prompt']}*")
+    st.caption("This runs in the background: you can reload the page and it will pick up where it left off.")
+
+def poll_job(stages, every=JOB_POLL_SECONDS):
+    st.fragment(job_progress, run_every=every)(stages)
+
+if st.session_state.step == "analyzing":
+    with main_content:
+        job = job_pool.queue.get(st.session_state.job_id)
+        if job_pending(job):
+            poll_job(ANALYZE_STAGES)
+        elif job is None or job["status"] == "failed":
+            st.error(f"An error occurred during analysis: {job['error'] if job else 'job not found'}")
+            st.session_state.step = "selection"
         else:
-            st.session_state.step = "approval" 
-            st.rerun() 
-    
-    except Exception as e:
-        st.error(f"An error occurred during analysis: {e}")
-        st.session_state.step = "selection" 
+            result = job["result"]
+            st.session_state.company_profile = result["company_profile"]
+            st.session_state.city = result["city"]
+            st.session_state.live_signals = result["live_signals"]
+            st.session_state.ranked_triggers = result["ranked_triggers"]
+            if not st.session_state.ranked_triggers:
+                st.warning("AI Strategist found no brand-safe triggers. Please try different parameters.")
+                st.session_state.step = "selection"
+            else:
+                # Rendered further down in this same run, no extra rerun
+                st.session_state.step = "approval"
+
+def batch_row(result):
+    return {
+        "Brand": result["brand"].upper(),
+        "City": result["city"],
+        "Status": "✅" if result["status"] == "ok" else "❌",
+        "Trigger": result.get("trigger", ""),
+        "Post": result.get("post_text") or result.get("error", ""),
+        "Impact": result.get("predicted_impact_rating", ""),
+        "Time (s)": round(sum(result["timings"].values()), 1),
+    }
+
+def render_batch_report(report):
+    st.subheader("📊 Batch Report")
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Pipelines", f"{report['succeeded']} / {report['pipelines']}")
+    col2.metric("Wall Time", f"{report['wall_time_s']}s")
+    col3.metric("Throughput", f"{report['throughput_per_min']}/min")
+    st.dataframe([{"Stage": stage, **timing} for stage, timing in report["stages"].items()], use_container_width=True)
+
+if batch_button:
+    pairs = batch.build_matrix(batch_brands, batch_cities)
+    runner = batch.BatchRunner(
+        keys, openai_client,
+        max_concurrency=batch_concurrency, openai_rpm=batch_rpm, with_images=batch_images, fast=fast_mode
+    )
+    st.session_state.step = "batch"
+    with main_content:
+        st.header("📦 Batch Campaign")
+        progress = st.progress(0.0, text=f"Running {len(pairs)} pipelines...")
+        table = st.empty()
+        rows = []
+        for result in runner.run(pairs):
+            rows.append(batch_row(result))
+            progress.progress(len(rows) / len(pairs), text=f"{len(rows)} / {len(pairs)} pipelines finished")
+            table.dataframe(rows, use_container_width=True)
+    st.session_state.batch_results = runner.results
+    st.session_state.batch_report = runner.report()
+    with main_content:
+        render_batch_report(st.session_state.batch_report)
+
+elif st.session_state.step == "batch":
+    with main_content:
+        st.header("📦 Batch Campaign")
+        st.dataframe([batch_row(r) for r in st.session_state.batch_results], use_container_width=True)
+        render_batch_report(st.session_state.batch_report)
+
+def render_publish_results(results):
+    st.dataframe([
+        {
+            "Channel": publishers.PUBLISHERS[r['channel']].label,
+            "Status": "✅ Sent" if r['ok'] else "❌ Failed",
+            "Attempts": r['attempts'],
+            "Latency (s)": round(r['latency_s'], 2),
+            "Details": r['message'],
+        }
+        for r in results.values()
+    ], use_container_width=True)
+
+def render_waterfall(trace_ids):
+    """
+    Gantt-style view of every span recorded for this run (signals, GPT-4o, DALL-E, publishing).
+    """
+    spans = [span for trace_id in trace_ids for span in tracing.tracer.get_trace(trace_id)]
+    if not spans:
+        st.caption("No timings recorded for this run yet.")
+        return
+    origin = min(span['start'] for span in spans)
+    rows, seen = [], {}
+    for span in sorted(spans, key=lambda span: span['start']):
+        seen[span['name']] = seen.get(span['name'], 0) + 1
+        label = span['name'] if seen[span['name']] == 1 else f"{span['name']} #{seen[span['name']]}"
+        start_s = span['start'] - origin
+        rows.append({
+            "Span": label,
+            "Kind": span['kind'],
+            "Start (s)": round(start_s, 3),
+            "End (s)": round(start_s + span['duration_s'], 3),
+            "Duration (s)": round(span['duration_s'], 3),
+            "Status": span['status'],
+            "Cache": "hit" if span.get('cache_hit') else "",
+            "Tokens": (span.get('prompt_tokens') or 0) + (span.get('completion_tokens') or 0),
+            "Cost ($)": round(span.get('cost_usd') or 0.0, 4),
+            "Retries": span.get('retries') or 0,
+        })
+    st.vega_lite_chart(rows, {
+        "mark": {"type": "bar", "cornerRadius": 2},
+        "encoding": {
+            "y": {"field": "Span", "type": "nominal", "sort": None, "title": None},
+            "x": {"field": "Start (s)", "type": "quantitative", "title": "seconds since the run started"},
+            "x2": {"field": "End (s)"},
+            "color": {"field": "Kind", "type": "nominal"},
+            "tooltip": [{"field": key} for key in ("Span", "Duration (s)", "Tokens", "Cost ($)", "Retries", "Cache", "Status")],
+        },
+    }, use_container_width=True)
+    calls = [row for row in rows if row["Kind"] not in ("run", "stage")]
+    st.caption(f"{len(calls)} external calls, ~${sum(row['Cost ($)'] for row in calls):.3f} estimated, "
+               f"{sum(row['Tokens'] for row in calls)} tokens")
+    st.dataframe(rows, use_container_width=True)
 
 # --- Step 2: Human-in-the-Loop (HITL) ---
+# Each step is a fragment: its widgets rerun only that step, not the sidebar and the rest of the page.
+@st.fragment
+def approval_step():
+    st.header(f"Step 2: Human-in-the-Loop (HITL) 🧠")
+    st.info(f"AI has analyzed **{st.session_state.city}** for **{st.session_state.company_profile['brand_name']}** and suggests these triggers. Please choose one.")
+
+    # A newer analysis scheduled by a material signal change
+    latest = change_scheduler.latest_job(brand_key, st.session_state.city) if auto_reanalyze else None
+    if latest and latest[0] != st.session_state.job_id:
+        changed_job = job_pool.queue.get(latest[0])
+        if changed_job and changed_job["status"] == "done":
+            reasons = ", ".join(f"{d['field']} {d['reason']}" for d in latest[1])
+            st.warning(f"📈 Signals changed since this analysis ({reasons}). Fresh triggers are ready.")
+            if st.button("🔄 Load fresh triggers"):
+                if st.session_state.speculation_round:
+                    speculator.cancel(st.session_state.speculation_round)
+                    st.session_state.speculation_round = None
+                st.session_state.job_id = latest[0]
+                st.query_params["job"] = latest[0]
+                st.session_state.run_traces = [latest[0]]
+                st.session_state.step = "analyzing"
+                st.rerun()
+
+    # Draft the top triggers while the user reads (skipped when the cache is bypassed anyway)
+    if speculative_mode and not fresh_creativity and st.session_state.speculation_round is None:
+        st.session_state.speculation_round = st.session_state.job_id
+        speculator.start(
+            st.session_state.speculation_round, st.session_state.city, st.session_state.ranked_triggers,
+            st.session_state.live_signals, st.session_state.company_profile,
+            fast=fast_mode, top_n=speculate_top_n
+        )
+    if st.session_state.speculation_round:
+        drafts = speculator.status(st.session_state.speculation_round)
+        if drafts:
+            st.caption("🔮 Pre-generating: " + ", ".join(f"{trigger} ({state})" for trigger, state in drafts.items()))
+
+    with st.expander("Show Live Signals Data"):
+        st.json(st.session_state.live_signals)
+        health = signal_health()
+        cache_stats = health["cache"]
+        st.caption(f"Signal cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+                   f"(hit rate {cache_stats['hit_rate']:.0%}, {cache_stats['entries']} entries)")
+        snapshot_ages = ", ".join(
+            f"{backend.SIGNAL_LABELS[p['provider']]} {p['oldest_age_s'] / 60:.0f} min"
+            for p in health["snapshots"]
+        )
+        st.caption(f"Signal snapshot v{health['snapshot_version']}: "
+                   f"{('oldest ' + snapshot_ages) if snapshot_ages else 'not refreshed yet'}")
+        breaker_icons = {"closed": "🟢 Closed", "half_open": "🟡 Probing", "open": "🔴 Open"}
+        st.markdown("**Provider health**")
+        st.dataframe([
+            {
+                "Provider": backend.SIGNAL_LABELS[b['provider']],
+                "Circuit": breaker_icons[b['state']],
+                "p95 (s)": b['p95_s'],
+                "Timeout (s)": b['read_timeout_s'],
+                "Failures in a row": b['consecutive_failures'],
+                "Skipped calls": b['short_circuited'],
+                "Retry in (s)": b['reopens_in_s'],
+                "Last error": b['last_error'] or "",
+            }
+            for b in health["breakers"]
+        ], use_container_width=True)
+    
+    trigger_options = []
+    for trigger in st.session_state.ranked_triggers:
+        option = f"**{trigger['trigger']}** (Tone: *{trigger['tone']}*) \n\n*AI Rationale: {trigger.get('reasoning', 'N/A')}*"
+        trigger_options.append(option)
+    
+    custom_option = "Other (Type your own trigger)"
+    trigger_options.append(custom_option)
+    
+    chosen_option = st.radio("Select the trigger to proceed:", trigger_options, index=0)
+    
+    chosen_trigger = ""
+    chosen_tone = ""
+    
+    if chosen_option == custom_option:
+        col1, col2 = st.columns(2)
+        with col1:
+            chosen_trigger = st.text_input("**Enter your custom trigger:**", "Mid-week blues")
+        with col2:
+            chosen_tone = st.text_input("**Enter your custom tone:**", "Playful and encouraging")
+    else:
+        for trigger in st.session_state.ranked_triggers:
+            if trigger['trigger'] in chosen_option:
+                chosen_trigger = trigger['trigger']
+                chosen_tone = trigger['tone']
+                break
+
+    st.markdown("---")
+    
+    if st.button("✍️ Generate Creative Assets", use_container_width=True, type="primary"):
+        if st.session_state.speculation_round:
+            speculator.resolve(st.session_state.speculation_round, chosen_trigger, chosen_tone)
+            st.session_state.speculation_round = None
+        st.session_state.step = "variants" if variant_count > 1 else "generation"
+        st.session_state.final_assets = {
+            "trigger": chosen_trigger,
+            "tone": chosen_tone
+        }
+        start_job("variants" if variant_count > 1 else "generate", {
+            "city": st.session_state.city,
+            "trigger": chosen_trigger,
+            "tone": chosen_tone,
+            "live_signals": st.session_state.live_signals,
+            "company_profile": st.session_state.company_profile,
+            "ranked_triggers": st.session_state.ranked_triggers,
+            "fast": fast_mode,
+            "stream": stream_mode,
+            "use_cache": not fresh_creativity,
+            "n": variant_count,
+            "draft_image": draft_images,
+            "reuse_image": reuse_images,
+            "reuse_threshold": reuse_threshold,
+        })
+        st.rerun()
+
 if st.session_state.step == "approval":
     with main_content:
-        st.header(f"Step 2: Human-in-the-Loop (HITL) 🧠")
-        st.info(f"AI has analyzed **{st.session_state.city}** for **{st.session_state.company_profile['brand_name']}** and suggests these triggers. Please choose one.")
+        approval_step()
+
+# --- Step 3a: Variants (pick one of the ranked candidates) ---
+@st.fragment
+def variants_step(job):
+    variants = job["result"]["variants"]
+    shown = [v for v in variants if v["duplicate_of"] is None][:compare_top_k]
+    st.info(f"Ranked {len(variants)} variants for **{st.session_state.final_assets['trigger']}**. "
+            "Pick one: only that one gets an image.")
+    for column, variant in zip(st.columns(len(shown)), shown):
+        with column:
+            st.subheader(f"#{variant['rank']} · {variant['score']:.2f}")
+            st.markdown(variant["post_text"])
+            st.code(" ".join(variant["hashtags"]))
+            checks = variant["checks"]
+            st.caption(f"Impact: {variant['predicted_impact_rating']} | length {checks['length']:.0%}, "
+                       f"hashtags {checks['hashtags']:.0%}, voice {checks['voice']:.0%}, "
+                       f"freshness {checks['freshness']:.0%}")
+            for issue in variant["issues"]:
+                st.caption(f"⚠️ {issue}")
+            if st.button("🎨 Use this one", key=f"variant_{variant['rank']}", use_container_width=True, type="primary"):
+                st.session_state.step = "generation"
+                start_job("generate", {**job["payload"], "variant": {key: variant[key] for key in backend.CREATIVE_KEYS}})
+                st.rerun()
+    hidden = len(variants) - len(shown)
+    if hidden:
+        st.caption(f"{hidden} lower-ranked or near-duplicate variants not shown.")
+
+if st.session_state.step == "variants":
+    with main_content:
+        st.header("Step 3: Pick a Variant ✨")
+        job = job_pool.queue.get(st.session_state.job_id)
+
+        if job_pending(job):
+            poll_job(GENERATE_STAGES)
+
+        elif job is None or job["status"] == "failed":
+            st.error(f"An error occurred while writing variants: {job['error'] if job else 'job not found'}")
+            st.session_state.step = "approval"
+            if st.button("Try Again"):
+                st.rerun()
 
-        with st.expander("Show Live Signals Data"):
-            st.json(st.session_state.live_signals)
-        
-        trigger_options = []
-        for trigger in st.session_state.ranked_triggers:
-            option = f"**{trigger['trigger']}** (Tone: *{trigger['tone']}*) \n\n*AI Rationale: {trigger.get('reasoning', 'N/A')}*"
-            trigger_options.append(option)
-        
-        custom_option = "Other (Type your own trigger)"
-        trigger_options.append(custom_option)
-        
-        chosen_option = st.radio("Select the trigger to proceed:", trigger_options, index=0)
-        
-        chosen_trigger = ""
-        chosen_tone = ""
-        
-        if chosen_option == custom_option:
-            col1, col2 = st.columns(2)
-            with col1:
-                chosen_trigger = st.text_input("**Enter your custom trigger:**", "Mid-week blues")
-            with col2:
-                chosen_tone = st.text_input("**Enter your custom tone:**", "Playful and encouraging")
         else:
-            for trigger in st.session_state.ranked_triggers:
-                if trigger['trigger'] in chosen_option:
-                    chosen_trigger = trigger['trigger']
-                    chosen_tone = trigger['tone']
-                    break
-
-        st.markdown("---")
-        
-        if st.button("✍️ Generate Creative Assets", use_container_width=True, type="primary"):
-            st.session_state.step = "generation"
-            st.session_state.final_assets = {
-                "trigger": chosen_trigger,
-                "tone": chosen_tone
-            }
-            st.rerun()
+            variants_step(job)
 
-# --- Step 3: Generation (Processing) (FIXED) ---
+# --- Step 3: Generation (background job) ---
 if st.session_state.step == "generation":
     with main_content:
-        st.header("Step 3: AI Creative Generation 🎨")
-        
-        try:
-            # Initialize asset variables
-            post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning = (None, None, None, None, None)
-            
-            with st.spinner("🤖 AI Creative is writing the post and analysis... (Call 2)"):
-                (
-                    post_text, 
-                    hashtags, 
-                    target_audience, 
-                    predicted_impact_rating,
-                    predicted_impact_reasoning
-                ) = backend.generate_creative_assets(
-                    openai_client,
-                    st.session_state.city,
-                    st.session_state.final_assets["trigger"],
-                    st.session_state.final_assets["tone"],
-                    st.session_state.live_signals,
-                    st.session_state.company_profile
-                )
-            
-            # --- THIS IS THE FIX ---
-            # We must check if the first call succeeded before trying the second
-            if not post_text:
-                st.error("❌ AI Creative (Call 2) failed to return valid text. This might be a temporary OpenAI issue. Please try again.")
-                st.session_state.step = "approval" # Go back a step
-                if st.button("Try Again"):
-                    st.rerun()
-            
-            else:
-                # --- If Call 2 succeeded, proceed to Call 3 ---
-                with st.spinner(f"🎨 AI Director is writing a safe image prompt... (Call 3)"):
-                    image_prompt = backend.generate_safe_image_prompt(
-                        openai_client,
-                        post_text,
-                        st.session_state.company_profile
-                    )
-                
-                if not image_prompt:
-                    st.error("❌ AI (Call 3) failed to generate a safe image prompt. Please try again.")
-                    st.session_state.step = "approval"
-                    if st.button("Try Again"):
-                        st.rerun()
-                else:
-                    # --- If Call 3 succeeded, proceed to Call 4 ---
-                    with st.spinner(f"🖼️ DALL-E is generating image for: *{image_prompt}* (Call 4)"):
-                        image_path = backend.generate_image_with_dalle(
-                            openai_client,
-                            image_prompt
-                        )
-                    
-                    # --- Save all 6 assets ---
-                    st.session_state.final_assets["post_text"] = post_text
-                    st.session_state.final_assets["image_path"] = image_path
-                    st.session_state.final_assets["hashtags"] = hashtags
-                    st.session_state.final_assets["target_audience"] = target_audience
-                    st.session_state.final_assets["predicted_impact_rating"] = predicted_impact_rating
-                    st.session_state.final_assets["predicted_impact_reasoning"] = predicted_impact_reasoning
-                    
-                    st.session_state.step = "review"
-                    st.rerun()
-            # --- END OF FIX ---
+        job = job_pool.queue.get(st.session_state.job_id)
+
+        if job_pending(job):
+            st.header("Step 3: AI Creative Generation 🎨")
+            payload = job["payload"]
+            poll_job(GENERATE_STAGES, STREAM_POLL_SECONDS if payload.get("stream") and not payload.get("fast") else JOB_POLL_SECONDS)
 
-        except Exception as e:
-            st.error(f"An error occurred during generation: {e}")
+        elif job is None or job["status"] == "failed":
+            st.header("Step 3: AI Creative Generation 🎨")
+            st.error(f"An error occurred during generation: {job['error'] if job else 'job not found'}")
             st.session_state.step = "approval" 
             if st.button("Try Again"):
                 st.rerun()
 
+        else:
+            # --- Save all 6 assets ---
+            st.session_state.final_assets.update(job["result"])
+            st.session_state.final_assets["image_bytes"] = job["image"]
+            st.session_state.publish_results = {}
+            # Rendered further down in this same run, no extra rerun
+            st.session_state.step = "review"
+
 # --- Step 4: Review & Publish (UPGRADED) ---
+@st.fragment
+def review_step():
+    st.header("Step 4: Review and Publish ✅")
+    
+    assets = st.session_state.final_assets
+    st.info(f"**Trigger:** {assets['trigger']} | **Tone:** {assets['tone']} | **Brand:** {st.session_state.company_profile['brand_name']}")
+    
+    # --- NEW: AI Analysis Dashboard ---
+    st.subheader("🤖 AI Analysis Dashboard")
+    col1_metric, col2_metric, col3_metric = st.columns(3)
+    with col1_metric:
+        st.metric(label="Predicted Impact", value=assets.get('predicted_impact_rating', 'N/A'))
+    with col2_metric:
+        st.markdown("**Target Audience**")
+        st.code(", ".join(assets.get('target_audience', [])))
+    with col3_metric:
+        st.markdown("**Hashtags**")
+        st.code(" ".join(assets.get('hashtags', [])))
+    
+    st.markdown(f"**Impact Rationale:** *{assets.get('predicted_impact_reasoning', 'N/A')}*")
+    st.markdown("---")
+    
+    # Side-by-side layout for review
+    col1_img, col2_cap = st.columns([0.55, 0.45]) # Adjust column ratios
+    
+    with col1_img:
+        st.subheader("Generated Post")
+        if assets.get('image_bytes'):
+            # A compressed, display-sized encode instead of the full DALL-E PNG
+            preview = backend.image_cache.get(assets['image_bytes'], "preview")
+            st.image(preview.data, caption="AI-Generated Image", use_column_width=True)
+            st.caption(f"Preview {len(preview.data) // 1024} KB {preview.extension.upper()} "
+                       f"(original {len(assets['image_bytes']) // 1024} KB PNG)")
+            reused = assets.get('reused_image')
+            if reused:
+                st.info(f"♻️ Reused a library image ({reused['similarity']:.0%} match with "
+                        f"*{reused['prompt']}*), no DALL-E call.")
+                if st.button("🎨 Generate a new image instead", use_container_width=True):
+                    job = job_pool.queue.get(st.session_state.job_id)
+                    st.session_state.step = "generation"
+                    st.session_state.publish_results = {}
+                    start_job("generate", {
+                        **job["payload"],
+                        "variant": {key: assets[key] for key in backend.CREATIVE_KEYS},
+                        "image_prompt": assets['image_prompt'],
+                        "reuse_image": False,
+                    })
+                    st.rerun()
+        else:
+            st.error("Image generation failed.")
+    
+    with col2_cap:
+        st.subheader("Generated Caption")
+        st.markdown(assets['post_text'])
+
+    st.markdown("---")
+    
+    # Publish Buttons
+    channels = publishers.configured_channels(keys)
+    # After a partial failure, only the channels that have not succeeded are retried
+    pending = [c for c in channels if not st.session_state.publish_results.get(c, {}).get('ok')]
+    channel_labels = " & ".join(publishers.PUBLISHERS[c].label for c in pending)
+    col1_pub, col2_pub = st.columns(2)
+    with col1_pub:
+        publish_disabled = assets.get('image_bytes') is None or not pending
+        publish_label = "🔁 RETRY FAILED CHANNELS" if st.session_state.publish_results else "🚀 PUBLISH POST"
+        if st.button(publish_label, use_container_width=True, type="primary", disabled=publish_disabled):
+            with st.spinner(f"Publishing to {channel_labels}..."), tracing.trace("publish") as publish_span:
+                results = publishers.publish_all(
+                    keys, assets['post_text'], assets['image_bytes'], assets['hashtags'], channels=pending
+                )
+            st.session_state.run_traces.append(publish_span.trace_id)
+            for result in results:
+                st.session_state.publish_results[result.channel] = result.to_dict()
+
+            if all(r['ok'] for r in st.session_state.publish_results.values()):
+                # Later variants are ranked down if they repeat this post
+                backend.recent_posts.add(st.session_state.company_profile['brand_name'], assets['post_text'])
+                st.balloons()
+                st.session_state.step = "done"
+                st.rerun()
+
+    if st.session_state.publish_results:
+        failed = [r['channel'] for r in st.session_state.publish_results.values() if not r['ok']]
+        if failed:
+            st.error(f"❌ Publishing failed for: {', '.join(publishers.PUBLISHERS[c].label for c in failed)}. "
+                     "You can retry just those channels.")
+        render_publish_results(st.session_state.publish_results)
+    
+    with st.expander("⏱️ Run timeline & cost"):
+        render_waterfall(st.session_state.run_traces)
+
+    with col2_pub:
+        if st.button("Start Over", use_container_width=True):
+            st.session_state.clear()
+            st.query_params.clear()
+            st.rerun()
+
 if st.session_state.step == "review":
     with main_content:
-        st.header("Step 4: Review and Publish ✅")
-        
-        assets = st.session_state.final_assets
-        st.info(f"**Trigger:** {assets['trigger']} | **Tone:** {assets['tone']} | **Brand:** {st.session_state.company_profile['brand_name']}")
-        
-        # --- NEW: AI Analysis Dashboard ---
-        st.subheader("🤖 AI Analysis Dashboard")
-        col1_metric, col2_metric, col3_metric = st.columns(3)
-        with col1_metric:
-            st.metric(label="Predicted Impact", value=assets.get('predicted_impact_rating', 'N/A'))
-        with col2_metric:
-            st.markdown("**Target Audience**")
-            st.code(", ".join(assets.get('target_audience', [])))
-        with col3_metric:
-            st.markdown("**Hashtags**")
-            st.code(" ".join(assets.get('hashtags', [])))
-        
-        st.markdown(f"**Impact Rationale:** *{assets.get('predicted_impact_reasoning', 'N/A')}*")
-        st.markdown("---")
-        
-        # Side-by-side layout for review
-        col1_img, col2_cap = st.columns([0.55, 0.45]) # Adjust column ratios
-        
-        with col1_img:
-            st.subheader("Generated Post")
-            if assets.get('image_path'):
-                st.image(assets['image_path'], caption="AI-Generated Image", use_column_width=True)
-            else:
-                st.error("Image generation failed.")
-        
-        with col2_cap:
-            st.subheader("Generated Caption")
-            st.markdown(assets['post_text'])
-
-        st.markdown("---")
-        
-        # Publish Buttons
-        col1_pub, col2_pub = st.columns(2)
-        with col1_pub:
-            publish_disabled = assets.get('image_path') is None
-            if st.button("🚀 PUBLISH POST", use_container_width=True, type="primary", disabled=publish_disabled):
-                with st.spinner("Publishing to Discord & Telegram..."):
-                    try:
-                        backend.publish_to_discord(
-                            keys, assets['post_text'], assets['image_path'], assets['hashtags']
-                        )
-                        backend.publish_to_telegram(
-                            keys, assets['post_text'], assets['image_path'], assets['hashtags']
-                        )
-                        
-                        st.success("🎉 Post published successfully to Discord & Telegram!")
-                        st.balloons()
-                        st.session_state.step = "done"
-                        if os.path.exists(assets['image_path']):
-                            os.remove(assets['image_path']) # Clean up
-                        st.rerun()
-
-                    except Exception as e:
-                        st.error(f"An error occurred during publishing: {e}")
-        
-        with col2_pub:
-            if st.button("Start Over", use_container_width=True):
-                if os.path.exists(st.session_state.final_assets.get('image_path', '')):
-                    os.remove(st.session_state.final_assets['image_path'])
-                st.session_state.clear()
-                st.rerun()
+        review_step()
 
 # --- Step 5: Done ---
 if st.session_state.step == "done":
     with main_content:
         st.success("🎉 Campaign Published Successfully!")
-        st.markdown("You can view the post in your configured Discord and Telegram channels.")
+        st.markdown("You can view the post in your configured channels.")
+        render_publish_results(st.session_state.publish_results)
+        with st.expander("⏱️ Run timeline & cost"):
+            render_waterfall(st.session_state.run_traces)
         if st.button("Generate Another Post", use_container_width=True, type="primary"):
             st.session_state.clear()
+            st.query_params.clear()
             st.rerun()
@@ -0,0 +1,211 @@
+"""
+Async variant of the OpenAI pipeline (Calls 1-4) built on AsyncOpenAI.
+
+Many pipelines can be overlapped in one event loop without a thread per
+request. Every call goes through a shared semaphore (concurrency limit), is
+retried with jittered exponential backoff on 429/5xx/connection errors, and
+has a deadline covering all of its attempts. Calls draw from the same
+cross-process rate buckets as backend.py (backend.rate_limiter). Prompts and
+parsing are shared with backend.py, so both paths send identical requests.
+"""
+import asyncio
+import base64
+import random
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+import backend
+import tracing
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Seconds each call may take, across all of its retries.
+DEFAULT_DEADLINES = {"strategist": 60, "creative": 60, "image_prompt": 30, "image": 120}
+
+
+def make_async_client(api_key, base_url=None, timeout=60):
+    """
+    AsyncOpenAI client with the SDK's own retries turned off; AsyncPipeline retries instead.
+    base_url points it at a local OpenAI-compatible mock, e.g. "http://127.0.0.1:8080/v1".
+    """
+    return AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+
+def _is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def _retry_after(error):
+    """
+    Seconds the server asked us to wait (Retry-After header), if any.
+    """
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncPipeline:
+    def __init__(self, client, max_concurrency=8, max_retries=4, base_delay=0.5, max_delay=8.0,
+                 deadlines=None):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self._semaphore = None  # created on first use, inside the running event loop
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadlines = dict(DEFAULT_DEADLINES)
+        if deadlines:
+            self.deadlines.update(deadlines)
+        self.retries = 0
+
+    @property
+    def semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def _call(self, stage, make_request, image_params=None):
+        """
+        Runs make_request() under the concurrency limit, retrying transient errors
+        with full-jitter backoff until it succeeds or the stage deadline is spent.
+        image_params are the DALL-E params of an image call, for its model and cost.
+        """
+        kind = "image" if stage == "image" else "llm"
+        attrs = {"model": image_params["model"], "size": image_params["size"]} if image_params else {}
+        with tracing.span(f"openai.{stage}", kind=kind, **attrs) as span:
+            cost = image_params.get("n", 1) if image_params else 1
+            response = await self._call_with_retries(stage, make_request, span, cost)
+            if kind == "llm":
+                span.record_usage(backend.OPENAI_TEXT_MODEL, getattr(response, "usage", None))
+            else:
+                span.set(cost_usd=backend.image_cost(image_params))
+            return response
+
+    async def _call_with_retries(self, stage, make_request, span, cost=1):
+        deadline = time.monotonic() + self.deadlines[stage]
+        endpoint = "images" if stage == "image" else "chat"
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"{stage} exceeded its {self.deadlines[stage]}s deadline")
+            # Same cross-process buckets as the sync path; RateLimited is not retried here
+            await backend.rate_limiter.acquire_async("openai", endpoint, self.client.api_key, cost,
+                                                     max_wait=min(remaining, backend.OPENAI_MAX_WAIT[endpoint]))
+            try:
+                async with self.semaphore:
+                    return await asyncio.wait_for(make_request(), timeout=remaining)
+            except Exception as e:
+                backend._openai_penalize(self.client, endpoint, e)
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = _retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                span.set(retries=attempt)
+                print(f"[Async] {stage} failed ({e.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(min(delay, max(0, deadline - time.monotonic())))
+
+    # --- Call 1 ---
+    async def get_dynamic_triggers_and_tone(self, live_signal, company_profile):
+        print(f"[Strategist] Analyzing signals for a {company_profile['industry']} brand (async Call 1)")
+        response = await self._call("strategist", lambda: self.client.chat.completions.create(
+            model=backend.OPENAI_TEXT_MODEL,
+            response_format={ "type": "json_object" },
+            messages=backend.build_strategist_messages(live_signal, company_profile)
+        ))
+        return backend.parse_strategist_response(response.choices[0].message.content)
+
+    # --- Call 2 ---
+    async def generate_creative_assets(self, city, trigger, tone, live_signal, company_profile):
+        print(f"[OpenAI] Asking GPT-4o for creative package for {city}... (async Call 2)")
+        response = await self._call("creative", lambda: self.client.chat.completions.create(
+            model=backend.OPENAI_TEXT_MODEL,
+            response_format={ "type": "json_object" },
+            messages=backend.build_creative_messages(city, trigger, tone, live_signal, company_profile)
+        ))
+        return backend.parse_creative_response(response.choices[0].message.content)
+
+    # --- Call 3 ---
+    async def generate_safe_image_prompt(self, post_text, company_profile):
+        print("[GenAI] Generating a SAFE image prompt... (async Call 3)")
+        response = await self._call("image_prompt", lambda: self.client.chat.completions.create(
+            model=backend.OPENAI_TEXT_MODEL,
+            messages=backend.build_image_prompt_messages(post_text, company_profile)
+        ))
+        return backend.parse_image_prompt_response(response.choices[0].message.content)
+
+    # --- Call 4 ---
+    async def generate_image_with_dalle(self, image_prompt, draft=False):
+        """
+        Returns PNG bytes; b64_json means the image arrives in the same response.
+        draft=True uses backend.DRAFT_DALLE_PARAMS, as in the sync version.
+        """
+        params = backend.DRAFT_DALLE_PARAMS if draft else backend.DALLE_PARAMS
+        if draft:
+            image_prompt = image_prompt[:backend.DALLE2_PROMPT_MAX_CHARS]
+        print(f"[DALL-E] Generating image with prompt: {image_prompt} (async Call 4)")
+        response = await self._call("image", lambda: self.client.images.generate(
+            prompt=image_prompt,
+            response_format="b64_json",
+            **params
+        ), image_params=params)
+        image_bytes = base64.b64decode(response.data[0].b64_json)
+        print(f"[DALL-E] ✅ Image generated ({len(image_bytes) // 1024} KB)")
+        return image_bytes
+
+    async def run(self, city, live_signal, company_profile, with_image=True):
+        """
+        Full auto-approved pipeline for one (brand, city): top trigger, creative,
+        image prompt and, with with_image, the image bytes.
+        Returns a result dict with per-stage timings.
+        """
+        result = {"brand": company_profile["brand_name"], "city": city, "timings": {}}
+        timings = result["timings"]
+
+        started = time.perf_counter()
+        triggers = await self.get_dynamic_triggers_and_tone(live_signal, company_profile)
+        timings["strategist"] = time.perf_counter() - started
+        if not triggers:
+            raise Exception("AI Strategist found no brand-safe triggers.")
+        result["trigger"], result["tone"] = triggers[0]["trigger"], triggers[0]["tone"]
+
+        started = time.perf_counter()
+        (result["post_text"], result["hashtags"], result["target_audience"],
+         result["predicted_impact_rating"], result["predicted_impact_reasoning"]) = await self.generate_creative_assets(
+            city, result["trigger"], result["tone"], live_signal, company_profile
+        )
+        timings["creative"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        result["image_prompt"] = await self.generate_safe_image_prompt(result["post_text"], company_profile)
+        timings["image_prompt"] = time.perf_counter() - started
+
+        if with_image:
+            started = time.perf_counter()
+            result["image_bytes"] = await self.generate_image_with_dalle(result["image_prompt"])
+            timings["image"] = time.perf_counter() - started
+        return result
+
+    async def run_many(self, jobs):
+        """
+        Overlaps many pipelines; jobs are (city, live_signal, company_profile, with_image) tuples.
+        Yields each result (or {"error": ...}) as soon as its pipeline finishes.
+        """
+        async def guarded(job):
+            try:
+                # Each pipeline runs in its own task, so it gets its own trace
+                with tracing.trace("async.pipeline", brand=job[2]["brand_name"], city=job[0]):
+                    return await self.run(*job)
+            except Exception as e:
+                return {"brand": job[2]["brand_name"], "city": job[0], "error": str(e)}
+
+        for next_done in asyncio.as_completed([guarded(job) for job in jobs]):
+            yield await next_done
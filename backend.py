@@ -2,170 +2,593 @@ import os
 import requests
 import urllib3
 import json 
+import re
+import math
 import time 
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import date
-from openai import OpenAI
-from PIL import Image 
-from io import BytesIO 
+from requests.adapters import HTTPAdapter
+import base64
+import tempfile
+from contextlib import contextmanager
+import image_derivatives
+import publishers
+import tracing
+from signal_cache import SignalCache
+from holiday_index import HolidayIndex
+from circuit_breaker import CircuitBreaker
+from city_registry import load_city_registry
+from profile_registry import ProfileRegistry
+from signal_changes import ChangeDetector
+from signal_snapshots import MAX_AGE_INTERVALS, SignalRefresher, SnapshotStore, quota_intervals
+from llm_cache import LLMResponseCache, make_key as llm_cache_key
+from json_stream import IncrementalJSONObjectParser
+from creative_ranker import RecentPosts, rank_variants
+from image_library import DEFAULT_MAX_REUSE, DEFAULT_THRESHOLD, ImageLibrary
+from rate_limiter import RateLimited, RateLimiter, tiers_from_env
 
 # --- 0. Disable Annoying Warnings ---
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# --- 1.5 COMPANY PROFILES ---
-CITIES = ["Delhi", "Mumbai", "Bengaluru", "Kolkata", "Chennai", "Hyderabad"]
-CITY_STATES = {
-    "Delhi": "Delhi", "Mumbai": "Maharashtra", "Bengaluru": "Karnataka",
-    "Kolkata": "West Bengal", "Chennai": "Tamil Nadu", "Hyderabad": "Telangana"
+# --- 0.5 SHARED HTTP SESSION & SIGNAL SETTINGS ---
+SIGNAL_ENDPOINTS = {
+    "weather": "https://api.openweathermap.org/data/2.5/weather",
+    "weather_group": "https://api.openweathermap.org/data/2.5/group",
+    "aqi": "https://api.iqair.com/v2/nearest_city",
+    "holiday": "https://calendarific.com/api/v2/holidays",
+    "news": "https://newsapi.org/v2/everything",
 }
-COMPANY_PROFILES = {
-    "Fashion": {
-        "h&m": { 
-            "industry": "Fashion",
-            "voice": "Trendy, affordable, inclusive, and fun. Focus on self-expression and seasonal styles. Use emojis. (e.g., #HM)",
-            "product_examples": ["graphic tees", "summer dresses", "denim jackets"]
-        },
-        "zara": { 
-            "industry": "Fashion",
-            "voice": "High-fashion, sophisticated, minimalist, and fast-moving. Less emojis.", 
-            "product_examples": ["blazers", "structured coats", "leather boots"] 
-        }
-    },
-    "Food & Q-Commerce": {
-        "zomato": { 
-            "industry": "Food & Q-Commerce",
-            "voice": "Witty, playful, relatable, and very food-centric. Uses humor, puns.", 
-            "product_examples": ["Biryani", "Pizza", "Restaurant deals"] 
-        },
-        "swiggy": { 
-            "industry": "Food & Q-Commerce",
-            "voice": "Fast, reliable, and convenient. Focus on speed ('Delivered in minutes').", 
-            "product_examples": ["Restaurant food", "Instamart groceries", "Snacks"] 
-        }
-    },
-    "Electronics": {
-        "croma": { 
-            "industry": "Electronics",
-            "voice": "Helpful, tech-savvy, and trustworthy. Focus on features, sales, offers.", 
-            "product_examples": ["Smartphones", "Laptops", "Air Conditioners"] 
-        },
-        "reliance digital": { 
-            "industry": "Electronics",
-            "voice": "Wide range, best prices, and cutting-edge technology. Focus on big deals.", 
-            "product_examples": ["New-launch TVs", "Gaming laptops", "Smart watches"] 
-        }
-    }
+SIGNAL_LABELS = {"weather": "Weather", "aqi": "AQI", "holiday": "Holiday", "news": "NewsAPI/Events"}
+# (connect, read) timeouts in seconds, per provider
+SIGNAL_TIMEOUTS = {"weather": (3.05, 5), "aqi": (3.05, 6), "holiday": (3.05, 6), "news": (3.05, 6)}
+# Wall-clock budget per provider, measured from the start of fetch_live_signals
+SIGNAL_DEADLINES = {"weather": 6, "aqi": 8, "holiday": 8, "news": 8}
+SIGNAL_FALLBACKS = {
+    "weather": {"temp": "N/A", "condition": "N/A"},
+    "aqi": {"aqi": "N/A"},
+    "holiday": {"holiday": "None"},
+    "news": {"top_event": "None"},
 }
 
+# Local state (caches, indexes) lives here; override with GEOPULSE_DATA_DIR
+DATA_DIR = os.environ.get("GEOPULSE_DATA_DIR", ".geopulse")
+# Shared across sessions so a brand switch in the same city reuses the city's signals.
+# Pass db_path=None to keep the cache in memory only.
+signal_cache = SignalCache(db_path=os.path.join(DATA_DIR, "signals.db"))
+# How old an expired cached value may be and still stand in for a provider that is down
+STALE_SIGNAL_MAX_AGE = 6 * 60 * 60
+# Every span (signal fetch, GPT-4o, DALL-E, publish) is appended here as one JSON line
+tracing.tracer.export_to(os.path.join(DATA_DIR, "traces.jsonl"))
+
+# --- 0.6 API RATE LIMITS & DAILY QUOTAS (shared by every process using DATA_DIR) ---
+# Pick provider tiers with GEOPULSE_API_TIERS, e.g. "openai=tier2,newsapi=business"
+rate_limiter = RateLimiter(os.path.join(DATA_DIR, "ratelimits.db"), tiers_from_env())
+# Vendor behind each signal endpoint, and the request parameter that carries its key
+SIGNAL_VENDORS = {"weather": "openweather", "weather_group": "openweather", "aqi": "iqair",
+                  "holiday": "calendarific", "news": "newsapi"}
+SIGNAL_KEY_PARAMS = {"weather": "appid", "weather_group": "appid", "aqi": "key", "holiday": "api_key", "news": "apiKey"}
+VENDOR_KEY_NAMES = {"openweather": "OPENWEATHER_API_KEY", "iqair": "IQAIR_API_KEY", "calendarific": "CALENDARIFIC_API_KEY",
+                    "newsapi": "NEWS_API_KEY", "openai": "OPENAI_API_KEY"}
+# Longest a call queues for a token before degrading. Signal waits stay well inside SIGNAL_DEADLINES.
+SIGNAL_MAX_WAIT = 1.0
+OPENAI_MAX_WAIT = {"chat": 30.0, "images": 60.0}
+
+def retry_after(headers):
+    """
+    Seconds from a Retry-After header, or None.
+    """
+    try:
+        return float(headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def quota_status(keys):
+    """
+    Tokens left and today's quota use, per vendor endpoint, for the keys in use.
+    """
+    return [row for vendor, name in VENDOR_KEY_NAMES.items() for row in rate_limiter.status(vendor, keys.get(name))]
+
+_http_session = None
+_http_session_lock = threading.Lock()
+# Shared by every city fetch; sized so a provider that hangs past its deadline
+# does not starve the next request of workers.
+_signal_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="signal")
+
+def get_http_session():
+    """
+    Returns the process-wide keep-alive session used for the signal APIs.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.verify = False
+            _http_session = session
+    return _http_session
+
+# --- 1.5 COMPANY PROFILES ---
+# Coordinates, state, timezone and OpenWeather id per city (data/cities.json)
+city_registry = load_city_registry()
+CITIES = city_registry.names()
+CITY_STATES = city_registry.states()
+# One file per brand (profiles/*.json), validated, indexed and hot-reloaded on change.
+# Override the directory with GEOPULSE_PROFILES_DIR.
+PROFILES_DIR = os.environ.get(
+    "GEOPULSE_PROFILES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+)
+profile_registry = ProfileRegistry(PROFILES_DIR)
+
+# --- 1.6 KEY & PROFILE HELPERS ---
+KEY_NAMES = [
+    "OPENWEATHER_API_KEY", "IQAIR_API_KEY", "CALENDARIFIC_API_KEY", "NEWS_API_KEY",
+    "TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID", "DISCORD_WEBHOOK_URL", "OPENAI_API_KEY"
+]
+
+SIGNAL_KEY_NAMES = ["OPENWEATHER_API_KEY", "IQAIR_API_KEY", "CALENDARIFIC_API_KEY", "NEWS_API_KEY"]
+
+def load_keys(secrets_path=os.path.join(".streamlit", "secrets.toml"), required=None):
+    """
+    Loads API keys outside Streamlit: environment variables win over secrets.toml.
+    Raises KeyError naming the first missing key in `required` (default: all of
+    KEY_NAMES), like st.secrets does; other missing keys are left out.
+    """
+    required = KEY_NAMES if required is None else required
+    secrets = {}
+    if os.path.exists(secrets_path):
+        try:
+            import tomllib
+            with open(secrets_path, 'rb') as f:
+                secrets = tomllib.load(f)
+        except ImportError:
+            import toml
+            secrets = toml.load(secrets_path)
+    keys = {}
+    for name in KEY_NAMES:
+        value = os.environ.get(name) or secrets.get(name)
+        if value:
+            keys[name] = value
+        elif name in required:
+            raise KeyError(name)
+    return keys
+
+def get_company_profile(brand: str):
+    """
+    Returns the profile dict the pipeline expects (with brand_name and industry)
+    for a brand key from the profile registry, e.g. "zomato".
+    """
+    return profile_registry.get(brand)
+
+def all_brands():
+    return profile_registry.brands()
+
 # --- 2. PUBLISHER FUNCTIONS ---
-def publish_to_telegram(keys, message_text, image_path, hashtags):
-    print(f"[Publisher] Attempting to post to Telegram...")
-    url = f"https://api.telegram.org/bot{keys['TELEGRAM_BOT_TOKEN']}/sendPhoto"
+# The channels themselves live in publishers.py; use publishers.publish_all() to
+# fan out to every channel at once. These wrappers keep the (ok, message) API.
+def publish_to_telegram(keys, message_text, image_bytes, hashtags):
+    result = publishers.publish_one("telegram", keys, message_text, image_bytes, hashtags)
+    return result.ok, result.message
+
+def publish_to_discord(keys, message_text, image_bytes, hashtags):
+    result = publishers.publish_one("discord", keys, message_text, image_bytes, hashtags)
+    return result.ok, result.message
+
+@contextmanager
+def spill_image(image_bytes, suffix=".png"):
+    """
+    For the rare consumer that needs a file path rather than bytes: writes the image
+    to a uniquely named temp file (so concurrent sessions never collide) and removes
+    it when the with-block exits, even on error.
+    """
+    fd, path = tempfile.mkstemp(prefix="geopulse-", suffix=suffix)
     try:
-        hashtag_string = " ".join(hashtags)
-        full_caption = f"{message_text}\n\n{hashtag_string}"
-        
-        with open(image_path, 'rb') as photo_file:
-            payload_data = {'chat_id': keys['TELEGRAM_CHAT_ID'], 'caption': full_caption, 'parse_mode': 'Markdown'}
-            files_to_send = {'photo': photo_file}
-            response = requests.post(url, data=payload_data, files=files_to_send)
-            response.raise_for_status() 
-            print("[Publisher] ✅ SUCCESS! Post sent to your Telegram channel.")
-            return True, "Success"
-    except Exception as e:
-        print(f"[Publisher] ❌ FAILED to post to Telegram: {e}")
-        return False, str(e)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image_bytes)
+        yield path
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# --- 2.5 PROMPT BUILDERS (shared by the sync and async pipelines) ---
+# System prompts are compiled once per brand by profile_registry (byte-for-byte
+# what each call has always sent); only the per-call parts are assembled here.
+OPENAI_TEXT_MODEL = "gpt-4o"
+DALLE_PARAMS = {"model": "dall-e-3", "n": 1, "size": "1024x1024", "quality": "standard"}
+# Draft images: less than half the price and faster; upscaled per channel only on publish
+DRAFT_DALLE_PARAMS = {"model": "dall-e-2", "n": 1, "size": "512x512"}
+DALLE2_PROMPT_MAX_CHARS = 1000
+
+def build_image_prompt_messages(post_text, company_profile):
+    prompts = profile_registry.prompts_for(company_profile)
+    system_prompt = prompts.image_prompt_head + post_text + prompts.image_prompt_tail
+    return [ {"role": "system", "content": system_prompt} ]
+
+def parse_image_prompt_response(content):
+    return content.strip().replace('"', '')
+
+def build_creative_messages(city, trigger, tone, live_signal, company_profile):
+    signal_summary = (
+        f"Current conditions in {city}: "
+        f"Weather is {live_signal.get('condition')} ({live_signal.get('temp')}°C), "
+        f"AQI is {live_signal.get('aqi')}. "
+        f"Today's Holiday: {live_signal.get('holiday', 'None')}. "
+        f"Top Event/News: {live_signal.get('top_event', 'None')}."
+    )
+    
+    system_prompt = profile_registry.prompts_for(company_profile).creative_system
+    
+    user_prompt = f"""
+        **City:** {city}
+        **Live Data:** {signal_summary}
+        **Chosen Trigger:** "{trigger}"
+        **Chosen Tone:** "{tone}"
+        """
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def parse_creative_response(content):
+    """
+    Returns (post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning).
+    Raises if any of the five keys is missing.
+    """
+    data = json.loads(content)
+    final_post_text = data.get("post_text")
+    hashtags = data.get("hashtags")
+    target_audience = data.get("target_audience") 
+    predicted_impact_rating = data.get("predicted_impact_rating")
+    predicted_impact_reasoning = data.get("predicted_impact_reasoning")
+    
+    if not all([final_post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning]):
+        print(f"[OpenAI] ERROR: LLM JSON was missing one or more required keys. Got: {data}")
+        raise Exception("LLM JSON was missing required keys.")
+    return final_post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning
+
+def build_strategist_messages(live_signal, company_profile):
+    system_prompt = profile_registry.prompts_for(company_profile).strategist_system
+    user_prompt = f"Here is the live data: {live_signal}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+def parse_strategist_response(content):
+    data = json.loads(content)
+    return data.get("triggers", [])
+
+# --- 2.6 FAST PIPELINE (Call 2 + Call 3 in one structured round-trip) ---
+# The same guardrail Call 3 is prompted with, checked locally on the fast path.
+IMAGE_PROMPT_BANNED_TERMS = [
+    "haze", "hazy", "pollution", "polluted", "rain", "rainy", "bad weather", "smog", "smoggy", "unhealthy"
+]
+IMAGE_PROMPT_BANNED_METAPHORS = ["explosion of flavor", "explosion of flavour", "killer deal"]
+
+FAST_CREATIVE_SCHEMA = {
+    "name": "creative_package",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "post_text": {"type": "string"},
+            "hashtags": {"type": "array", "items": {"type": "string"}},
+            "target_audience": {"type": "array", "items": {"type": "string"}},
+            "predicted_impact_rating": {"type": "string", "enum": ["High", "Medium", "Low"]},
+            "predicted_impact_reasoning": {"type": "string"},
+            "image_prompt": {"type": "string"},
+        },
+        "required": [
+            "post_text", "hashtags", "target_audience",
+            "predicted_impact_rating", "predicted_impact_reasoning", "image_prompt"
+        ],
+        "additionalProperties": False,
+    },
+}
 
-def publish_to_discord(keys, message_text, image_path, hashtags):
-    print(f"[Publisher] Attempting to post to Discord...")
+def validate_image_prompt(image_prompt):
+    """
+    Returns the guardrail violations in an image prompt (empty list if it is safe).
+    """
+    lowered = image_prompt.lower()
+    violations = [term for term in IMAGE_PROMPT_BANNED_TERMS if re.search(rf"\b{re.escape(term)}\b", lowered)]
+    violations += [metaphor for metaphor in IMAGE_PROMPT_BANNED_METAPHORS if metaphor in lowered]
+    return violations
+
+def build_fast_creative_messages(city, trigger, tone, live_signal, company_profile):
+    messages = build_creative_messages(city, trigger, tone, live_signal, company_profile)
+    system_prompt = profile_registry.prompts_for(company_profile).fast_creative_system
+    return [{"role": "system", "content": system_prompt}, messages[1]]
+
+def parse_fast_creative_response(content):
+    """
+    Returns the five creative values plus the image prompt.
+    """
+    creative = parse_creative_response(content)
+    image_prompt = json.loads(content).get("image_prompt") or ""
+    return (*creative, parse_image_prompt_response(image_prompt))
+
+# --- 2.65 CREATIVE VARIANTS (N candidate posts in one round-trip) ---
+MAX_VARIANTS = 6
+CREATIVE_KEYS = ("post_text", "hashtags", "target_audience", "predicted_impact_rating", "predicted_impact_reasoning")
+# Published posts per brand, for the ranker's duplicate check
+recent_posts = RecentPosts(os.path.join(DATA_DIR, "recent_posts.jsonl"))
+
+def build_variant_messages(city, trigger, tone, live_signal, company_profile, n):
+    messages = build_creative_messages(city, trigger, tone, live_signal, company_profile)
+    system_prompt = profile_registry.prompts_for(company_profile).variants_creative_system
+    user_prompt = messages[1]["content"] + f"**Variants:** {n}\n"
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_prompt}]
+
+def parse_variant_response(content, n=None):
+    """
+    Returns the variants as dicts with the five creative keys. A variant missing a
+    key is dropped; raises only if none of them is complete.
+    """
+    data = json.loads(content)
+    variants = data.get("variants") if isinstance(data, dict) else data
+    complete = []
+    for variant in variants or []:
+        try:
+            creative = parse_creative_response(json.dumps(variant))
+        except Exception:
+            continue
+        complete.append(dict(zip(CREATIVE_KEYS, creative)))
+    if not complete:
+        raise Exception("LLM JSON had no complete variants.")
+    return complete[:n] if n else complete
+
+# --- 2.7 CACHED CHAT COMPLETIONS ---
+# Identical requests (same model, prompts and response_format) are answered from here.
+llm_cache = LLMResponseCache(db_path=os.path.join(DATA_DIR, "llm_cache.db"))
+
+def llm_cache_ttl():
+    """
+    Cached replies live as long as the freshest signal they were built from: the
+    prompts embed live signals, so past that window we would re-fetch them anyway.
+    """
+    return min(signal_cache.ttl_for(p) for p in SIGNAL_PROVIDERS if p not in LOCAL_PROVIDERS)
+
+# Identical requests already on the wire (e.g. a speculative pre-generation the
+# user has just picked) are joined instead of being sent twice.
+_inflight_calls = {}
+_inflight_lock = threading.Lock()
+
+def _join_inflight(key):
+    """
+    Returns the reply of an identical in-flight request once it lands, or None if there is none.
+    """
+    with _inflight_lock:
+        pending = _inflight_calls.get(key)
+    if pending is None:
+        return None
+    print("[OpenAI] ⏳ Joining identical in-flight request")
+    return pending.result()
+
+def _openai_acquire(openai_client, endpoint, cost=1):
+    """
+    Queues for an OpenAI token (up to OPENAI_MAX_WAIT); raises RateLimited past that.
+    """
+    rate_limiter.acquire("openai", endpoint, getattr(openai_client, "api_key", None), cost,
+                         max_wait=OPENAI_MAX_WAIT[endpoint])
+
+def _openai_penalize(openai_client, endpoint, error):
+    if getattr(error, "status_code", None) == 429:
+        response = getattr(error, "response", None)
+        rate_limiter.penalize("openai", endpoint, getattr(openai_client, "api_key", None),
+                              retry_after(response.headers) if response is not None else None)
+
+def _chat_completion(openai_client, messages, response_format=None, use_cache=True, stage="chat"):
+    """
+    Runs one chat completion and returns the reply text, going through llm_cache.
+    use_cache=False skips the lookup (fresh creativity) but still stores the new reply.
+    stage names the tracing span (openai.<stage>).
+    """
+    with tracing.span(f"openai.{stage}", kind="llm", model=OPENAI_TEXT_MODEL) as span:
+        return _traced_chat_completion(span, openai_client, messages, response_format, use_cache)
+
+def _traced_chat_completion(span, openai_client, messages, response_format, use_cache):
+    key = llm_cache_key(OPENAI_TEXT_MODEL, messages, response_format)
+    pending = None
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            print("[OpenAI] ⚡ Served from LLM response cache")
+            span.set(cache_hit=True, bytes_in=len(cached))
+            return cached
+        with _inflight_lock:
+            joined = _inflight_calls.get(key)
+            if joined is None:
+                pending = _inflight_calls[key] = Future()
+        if joined is not None:
+            print("[OpenAI] ⏳ Joining identical in-flight request")
+            span.set(joined=True)
+            return joined.result()
+    else:
+        llm_cache.record_bypass()
+
+    request = {"model": OPENAI_TEXT_MODEL, "messages": messages}
+    if response_format is not None:
+        request["response_format"] = response_format
+    started = time.perf_counter()
     try:
-        hashtag_string = " ".join(hashtags)
-        full_message = f"{message_text}\n\n{hashtag_string}"
-        
-        payload_json = json.dumps({'content': full_message})
-        with open(image_path, 'rb') as image_file:
-            files_to_send = {
-                'file1': (os.path.basename(image_path), image_file, 'image/png'),
-                'payload_json': (None, payload_json)
-            }
-            response = requests.post(keys['DISCORD_WEBHOOK_URL'], files=files_to_send)
-            response.raise_for_status() 
-            print("[Publisher] ✅ SUCCESS! Post sent to your Discord channel.")
-            return True, "Success"
+        _openai_acquire(openai_client, "chat")
+        try:
+            response = openai_client.chat.completions.create(**request)
+        except Exception as e:
+            _openai_penalize(openai_client, "chat", e)
+            raise
+        content = response.choices[0].message.content
+        span.record_usage(OPENAI_TEXT_MODEL, getattr(response, "usage", None))
+        span.set(cache_hit=False, bytes_in=len(content or ""), bytes_out=sum(len(m["content"]) for m in messages))
+        llm_cache.put(key, content, time.perf_counter() - started, llm_cache_ttl())
     except Exception as e:
-        print(f"[Publisher] ❌ FAILED to post to Discord: {e}")
-        return False, str(e)
+        if pending is not None:
+            pending.set_exception(e)
+        raise
+    finally:
+        if pending is not None:
+            with _inflight_lock:
+                _inflight_calls.pop(key, None)
+    if pending is not None:
+        pending.set_result(content)
+    return content
 
+def _chat_completion_stream(openai_client, messages, response_format=None, use_cache=True, stage="chat"):
+    """
+    Streaming twin of _chat_completion: yields reply text deltas as they arrive.
+    Shares the same cache key, so a streamed reply also serves non-streamed callers.
+    A cache hit yields the whole reply as a single delta.
+    """
+    # activate=False: the span stays open across yields, so it must not become the caller's parent span
+    with tracing.span(f"openai.{stage}", kind="llm", activate=False, model=OPENAI_TEXT_MODEL, stream=True) as span:
+        key = llm_cache_key(OPENAI_TEXT_MODEL, messages, response_format)
+        if use_cache:
+            cached = llm_cache.get(key)
+            if cached is not None:
+                print("[OpenAI] ⚡ Served from LLM response cache")
+                span.set(cache_hit=True, bytes_in=len(cached))
+                yield cached
+                return
+            joined = _join_inflight(key)
+            if joined is not None:
+                span.set(joined=True)
+                yield joined
+                return
+        else:
+            llm_cache.record_bypass()
+
+        request = {"model": OPENAI_TEXT_MODEL, "messages": messages, "stream": True,
+                   "stream_options": {"include_usage": True}}
+        if response_format is not None:
+            request["response_format"] = response_format
+        _openai_acquire(openai_client, "chat")
+        started = time.perf_counter()
+        parts = []
+        try:
+            chunks = openai_client.chat.completions.create(**request)
+        except Exception as e:
+            _openai_penalize(openai_client, "chat", e)
+            raise
+        for chunk in chunks:
+            if getattr(chunk, "usage", None) is not None:
+                span.record_usage(OPENAI_TEXT_MODEL, chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    span.set(first_token_s=round(time.perf_counter() - started, 4))
+                parts.append(delta)
+                yield delta
+        content = "".join(parts)
+        span.set(cache_hit=False, bytes_in=len(content), bytes_out=sum(len(m["content"]) for m in messages))
+        llm_cache.put(key, content, time.perf_counter() - started, llm_cache_ttl())
 
 # --- 3. CREATIVE ASSETS GENERATOR (OpenAI) ---
 
-def generate_image_with_dalle(openai_client, image_prompt):
+def generate_image_with_dalle(openai_client, image_prompt, draft=False):
     """
-    Uses DALL-E 3 to generate an image, download it, and save it to a temp file.
+    Uses DALL-E 3 to generate an image and returns it as PNG bytes.
+    The image comes back as b64_json in the same response, so there is no second
+    download, no decode/re-encode and no shared temp file on disk.
+    draft=True uses DRAFT_DALLE_PARAMS (DALL-E 2, 512px) for a cheaper preview.
     """
-    print(f"[DALL-E] Generating image with prompt: {image_prompt} (Call 4)")
+    params = DRAFT_DALLE_PARAMS if draft else DALLE_PARAMS
+    if draft:
+        image_prompt = image_prompt[:DALLE2_PROMPT_MAX_CHARS]
+    print(f"[DALL-E] Generating {'draft ' if draft else ''}image with prompt: {image_prompt} (Call 4)")
     try:
-        response = openai_client.images.generate(
-            model="dall-e-3",
-            prompt=image_prompt,
-            n=1,
-            size="1024x1024",
-            quality="standard",
-            response_format="url" 
-        )
-        image_url = response.data[0].url
-        print(f"[DALL-E] ✅ Image generated: {image_url}")
-        
-        print("[DALL-E] Downloading image...")
-        image_response = requests.get(image_url)
-        image_response.raise_for_status()
-        
-        image = Image.open(BytesIO(image_response.content))
-        temp_image_path = "temp_image.png"
-        image.save(temp_image_path)
-        
-        print(f"[DALL-E] ✅ Image saved to {temp_image_path}")
-        return temp_image_path
+        with tracing.span("openai.image", kind="image", model=params["model"], size=params["size"]) as span:
+            _openai_acquire(openai_client, "images", cost=params.get("n", 1))
+            try:
+                response = openai_client.images.generate(
+                    prompt=image_prompt,
+                    response_format="b64_json",
+                    **params
+                )
+            except Exception as e:
+                _openai_penalize(openai_client, "images", e)
+                raise
+            image_bytes = base64.b64decode(response.data[0].b64_json)
+            span.set(bytes_in=len(image_bytes), bytes_out=len(image_prompt),
+                     cost_usd=image_cost(params))
+        print(f"[DALL-E] ✅ Image generated ({len(image_bytes) // 1024} KB)")
+        return image_bytes
         
     except Exception as e:
         print(f"[DALL-E] ❌ FAILED to generate image: {e}")
         raise e
 
+def image_cost(params):
+    return tracing.image_cost(params["model"], params["size"], params.get("quality"), params.get("n", 1))
+
+# Per-target encodes (review preview, one per channel), cached on disk by content hash
+image_cache = image_derivatives.ensure_cache(
+    os.path.join(DATA_DIR, "images"), max_bytes=int(os.environ.get("GEOPULSE_IMAGE_CACHE_MB", "256")) * 1024 * 1024
+)
+
+# Past DALL-E images by brand and image prompt; a close enough prompt reuses the image
+image_library = ImageLibrary(
+    os.path.join(DATA_DIR, "library"),
+    threshold=float(os.environ.get("GEOPULSE_IMAGE_REUSE_THRESHOLD", DEFAULT_THRESHOLD)),
+    max_reuse=int(os.environ.get("GEOPULSE_IMAGE_REUSE_MAX", DEFAULT_MAX_REUSE)),
+)
+
+# Lowest prompt similarity accepted when DALL-E is rate limited or out of quota
+RATE_LIMITED_REUSE_THRESHOLD = 0.5
+
+def generate_or_reuse_image(openai_client, image_prompt, company_profile, draft=False, reuse=True, threshold=None):
+    """
+    Call 4 with a library lookup in front of it. Returns (image_bytes, match):
+    match is the image_library.Match that was reused, or None when DALL-E made a
+    new image (which is then added to the library for next time). If DALL-E is
+    rate limited, a looser match (RATE_LIMITED_REUSE_THRESHOLD) is used instead.
+    """
+    brand = company_profile["brand_name"]
+    if reuse:
+        with tracing.span("image.library_lookup", brand=brand) as span:
+            match = image_library.find(brand, image_prompt, allow_draft=draft, threshold=threshold)
+            span.set(hit=match is not None, similarity=match.similarity if match else None)
+        image_bytes = image_library.use(match) if match else None
+        if image_bytes is not None:
+            print(f"[Library] ♻️ Reusing image #{match.id} ({match.similarity:.0%} match): {match.prompt}")
+            return image_bytes, match
+    try:
+        image_bytes = generate_image_with_dalle(openai_client, image_prompt, draft=draft)
+    except RateLimited:
+        match = image_library.find(brand, image_prompt, allow_draft=True, threshold=RATE_LIMITED_REUSE_THRESHOLD) if reuse else None
+        image_bytes = image_library.use(match) if match else None
+        if image_bytes is None:
+            raise
+        print(f"[Library] ♻️ DALL-E is rate limited, reusing image #{match.id} ({match.similarity:.0%} match)")
+        return image_bytes, match
+    try:
+        image_library.add(brand, image_prompt, image_bytes, draft=draft)
+    except Exception as e:  # OSError, sqlite3.Error: the image itself is fine
+        print(f"[Library] ❌ Could not add the image to the library: {e}")
+    return image_bytes, None
+
 # --- NEW: DECOUPLED IMAGE PROMPT FUNCTION (Call 3) ---
-def generate_safe_image_prompt(openai_client, post_text, company_profile):
+def generate_safe_image_prompt(openai_client, post_text, company_profile, use_cache=True):
     """
     This function ONLY generates the image prompt.
     It focuses on the POSITIVE SOLUTION, not the negative trigger.
     """
     print("[GenAI] Generating a SAFE image prompt... (Call 3)")
     try:
-        system_prompt = f"""
-        You are a creative director for the brand *{company_profile['brand_name']}*.
-        Your brand voice is: *{company_profile['voice']}*
-
-        **TASK:** Read the following social media post. Your job is to create a single, visually descriptive DALL-E prompt for a photorealistic image to accompany it.
-
-        **CRITICAL SAFETY GUARDRAIL:**
-        The image prompt MUST be 100% positive and focus *only* on the *solution* or *product* mentioned in the post.
-        - **DO NOT** mention the negative problem (e.g., "haze", "pollution", "rain", "bad weather", "smog", "unhealthy").
-        - **DO** focus on the positive outcome (e.g., "delicious food", "cozy indoors", "happy person", "new fashion").
-        - **BE LITERAL.** Avoid metaphors like "explosion of flavor" or "killer deal".
-        
-        **Post Text:**
-        "{post_text}"
-
-        Respond *ONLY* with the final, safe image prompt.
-        
-        **Example:**
-        If the post is "Delhi's haze is bad! Stay in and order our delicious biryani."
-        Your prompt should be: "A vibrant, top-down photorealistic shot of a steaming, aromatic bowl of biryani and a raita on a modern dining table."
-        (Notice: No mention of "haze" or "Delhi").
-        """
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[ {"role": "system", "content": system_prompt} ]
+        content = _chat_completion(
+            openai_client,
+            build_image_prompt_messages(post_text, company_profile),
+            use_cache=use_cache,
+            stage="image_prompt"
         )
-        image_prompt = response.choices[0].message.content.strip().replace('"', '')
+        image_prompt = parse_image_prompt_response(content)
         print(f"[GenAI] ✅ Safe Image Prompt: {image_prompt}")
         return image_prompt
 
@@ -173,119 +596,142 @@ def generate_safe_image_prompt(openai_client, post_text, company_profile):
         print(f"[GenAI] ❌ FAILED to generate safe image prompt: {e}")
         raise e
 
-def generate_creative_assets(openai_client, city, trigger, tone, live_signal, company_profile):
+def generate_creative_assets(openai_client, city, trigger, tone, live_signal, company_profile, use_cache=True):
     """
     This is the new master function.
     It generates post text, hashtags, AND Audience/Impact analysis.
     (It NO LONGER generates the image prompt directly).
+    use_cache=False bypasses the LLM response cache for a fresh take.
     """
     print(f"--- Generating Creative Assets for {city} ---")
     try:
-        signal_summary = (
-            f"Current conditions in {city}: "
-            f"Weather is {live_signal.get('condition')} ({live_signal.get('temp')}°C), "
-            f"AQI is {live_signal.get('aqi')}. "
-            f"Today's Holiday: {live_signal.get('holiday', 'None')}. "
-            f"Top Event/News: {live_signal.get('top_event', 'None')}."
-        )
-        
-        system_prompt = f"""
-        You are an expert social media manager and marketing strategist for the brand *{company_profile['brand_name']}*.
-        Your brand voice is: *{company_profile['voice']}*
-        Your relevant products are: *{", ".join(company_profile['product_examples'])}*
-        
-        You MUST generate **five** things in a JSON format:
-        1.  `post_text`: A short, ready-to-publish social media post (under 500 characters).
-        2.  `hashtags`: A JSON array of 3-5 relevant and trending hashtags.
-        3.  `target_audience`: A JSON array of 2-3 specific audience segments this post will appeal to.
-        4.  `predicted_impact_rating`: A single rating ("High", "Medium", or "Low") of this post's potential.
-        5.  `predicted_impact_reasoning`: A 1-sentence analysis of *why* this post will perform well.
-        
-        Respond *ONLY* with a valid JSON object. (Do NOT include `image_prompt`).
-        """
-        
-        user_prompt = f"""
-        **City:** {city}
-        **Live Data:** {signal_summary}
-        **Chosen Trigger:** "{trigger}"
-        **Chosen Tone:** "{tone}"
-        """
-
         print("[OpenAI] Asking GPT-4o for creative package... (Call 2)")
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            response_format={ "type": "json_object" }, 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        content = _chat_completion(
+            openai_client,
+            build_creative_messages(city, trigger, tone, live_signal, company_profile),
+            response_format={ "type": "json_object" },
+            use_cache=use_cache,
+            stage="creative"
         )
         
-        data = json.loads(response.choices[0].message.content)
-        final_post_text = data.get("post_text")
-        hashtags = data.get("hashtags")
-        target_audience = data.get("target_audience") 
-        predicted_impact_rating = data.get("predicted_impact_rating")
-        predicted_impact_reasoning = data.get("predicted_impact_reasoning")
-        
-        if not all([final_post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning]):
-            print(f"[OpenAI] ERROR: LLM JSON was missing one or more required keys. Got: {data}")
-            raise Exception("LLM JSON was missing required keys.")
-            
+        creative = parse_creative_response(content)
         print("[OpenAI] ✅ Full creative package generated.")
         
         # --- Return all 5 values ---
-        return final_post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning
+        return creative
 
     except Exception as e:
         print(f"[OpenAI] ERROR generating creative assets: {e}")
         raise e
 
+def stream_creative_assets(openai_client, city, trigger, tone, live_signal, company_profile, use_cache=True):
+    """
+    Streaming version of generate_creative_assets (Call 2).
+    Yields ("partial", "post_text", text_so_far) while the post is being written,
+    ("value", key, value) as each JSON key closes, and finally ("done", None, creative)
+    with the same 5-tuple generate_creative_assets returns.
+    """
+    print(f"--- Streaming Creative Assets for {city} ---")
+    try:
+        print("[OpenAI] Streaming creative package from GPT-4o... (Call 2)")
+        parser = IncrementalJSONObjectParser()
+        parts = []
+        for delta in _chat_completion_stream(
+            openai_client,
+            build_creative_messages(city, trigger, tone, live_signal, company_profile),
+            response_format={ "type": "json_object" },
+            use_cache=use_cache,
+            stage="creative"
+        ):
+            parts.append(delta)
+            for event in parser.feed(delta):
+                yield event
+
+        creative = parse_creative_response("".join(parts))
+        print("[OpenAI] ✅ Full creative package streamed.")
+        yield ("done", None, creative)
+
+    except Exception as e:
+        print(f"[OpenAI] ERROR streaming creative assets: {e}")
+        raise e
+
+def generate_creative_package_fast(openai_client, city, trigger, tone, live_signal, company_profile, use_cache=True):
+    """
+    Fast pipeline: post text, hashtags, audience, impact AND the image prompt from a
+    single JSON-schema-constrained call (Calls 2 + 3 merged).
+    The image prompt is checked locally against the Call 3 guardrail; if it fails,
+    we fall back to the dedicated safe-image-prompt call.
+    Returns the same five values as generate_creative_assets, plus image_prompt.
+    """
+    print(f"--- Generating Creative Assets for {city} (fast pipeline) ---")
+    try:
+        print("[OpenAI] Asking GPT-4o for creative package + image prompt... (Call 2+3)")
+        content = _chat_completion(
+            openai_client,
+            build_fast_creative_messages(city, trigger, tone, live_signal, company_profile),
+            response_format={ "type": "json_schema", "json_schema": FAST_CREATIVE_SCHEMA },
+            use_cache=use_cache,
+            stage="creative_fast"
+        )
+        *creative, image_prompt = parse_fast_creative_response(content)
+
+        violations = validate_image_prompt(image_prompt) if image_prompt else ["empty prompt"]
+        if violations:
+            print(f"[GenAI] Fast image prompt failed the guardrail ({', '.join(violations)}), falling back to Call 3")
+            image_prompt = generate_safe_image_prompt(openai_client, creative[0], company_profile, use_cache=use_cache)
+        else:
+            print(f"[GenAI] ✅ Safe Image Prompt: {image_prompt}")
+
+        print("[OpenAI] ✅ Full creative package generated (fast pipeline).")
+        return (*creative, image_prompt)
+
+    except Exception as e:
+        print(f"[OpenAI] ERROR generating creative assets (fast pipeline): {e}")
+        raise e
+
+def generate_creative_variants(openai_client, city, trigger, tone, live_signal, company_profile, n=3, use_cache=True):
+    """
+    Variants mode: n candidate creative packages (Call 2) from one request, ranked
+    locally by creative_ranker against the brand's voice and recent posts.
+    Returns the ranked variant dicts, best first; no image prompt or image yet,
+    those are made only for the variant that gets picked.
+    """
+    n = max(1, min(n, MAX_VARIANTS))
+    print(f"--- Generating {n} Creative Variants for {city} ---")
+    try:
+        print(f"[OpenAI] Asking GPT-4o for {n} creative variants... (Call 2)")
+        content = _chat_completion(
+            openai_client,
+            build_variant_messages(city, trigger, tone, live_signal, company_profile, n),
+            response_format={ "type": "json_object" },
+            use_cache=use_cache,
+            stage="creative_variants"
+        )
+        variants = parse_variant_response(content, n)
+        with tracing.span("variants.rank", candidates=len(variants)):
+            ranked = rank_variants(variants, company_profile, recent_posts.get(company_profile["brand_name"]))
+        print(f"[OpenAI] ✅ {len(variants)} variants generated, best score {ranked[0]['score']:.2f}")
+        return ranked
+
+    except Exception as e:
+        print(f"[OpenAI] ERROR generating creative variants: {e}")
+        raise e
+
 # --- 4. DYNAMIC STRATEGIST FUNCTION (OpenAI) ---
-def get_dynamic_triggers_and_tone(openai_client, live_signal: dict, company_profile: dict):
+def get_dynamic_triggers_and_tone(openai_client, live_signal: dict, company_profile: dict, use_cache: bool = True):
     industry = company_profile['industry']
     print(f"[Strategist] Analyzing signals for a {industry} brand: {live_signal} (Call 1)")
     
     try:
-        system_prompt = f"""
-        You are a marketing strategist for a *{industry}* brand with this voice: *{company_profile['voice']}*.
-        Your task is to analyze live data and identify *all* commercially-valuable triggers.
-        
-        Priority Guide:
-        1.  **High Priority:** Mass Cultural Events (Holidays, Sports) and Safety/Urgency Triggers (Heavy Rain, AQI > 200).
-        2.  **Low Priority:** Ambient Triggers (e.g., Clear Skies, Haze, regular news).
-        
-        **BRAND SAFETY GUARDRAIL:**
-        You MUST ignore any triggers that are negative, tragic, or politically sensitive. Focus only on positive or neutral events.
-
-        **FALLBACK RULE:**
-        If no High Priority triggers are found, you MUST identify and return at least one Low Priority 'Ambient' trigger.
-        
-        **TASK:**
-        Return a JSON object with a key "triggers", which is a JSON list of all *brand-safe* triggers, ranked by priority.
-        For each trigger, provide a 'trigger', 'tone', and 'reasoning'.
-        
-        Respond *ONLY* with a valid JSON object.
-        Example:
-        {{"triggers": [
-          {{"trigger": "India Cricket Match", "tone": "Passionate and exciting", "reasoning": "High-priority cultural event."}},
-          {{"trigger": "Hazy Day", "tone": "Cozy and relaxed", "reasoning": "Low-priority ambient trigger."}}
-        ]}}
-        """
-        user_prompt = f"Here is the live data: {live_signal}"
-        
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            response_format={ "type": "json_object" }, 
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
+        content = _chat_completion(
+            openai_client,
+            build_strategist_messages(live_signal, company_profile),
+            response_format={ "type": "json_object" },
+            use_cache=use_cache,
+            stage="strategist"
         )
         
-        response_text = response.choices[0].message.content
-        data = json.loads(response_text)
-        ranked_triggers = data.get("triggers", []) 
+        ranked_triggers = parse_strategist_response(content)
         
         if not ranked_triggers:
              print("[Strategist] Error: LLM returned an empty list, but should have used fallback.")
@@ -298,62 +744,470 @@ def get_dynamic_triggers_and_tone(openai_client, live_signal: dict, company_prof
         raise e
 
 # --- 5. SIGNAL FETCHER (API Calls) ---
-def fetch_live_signals(keys, city: str):
+def _signal_get(session, provider, params, endpoint=None):
+    """
+    GETs one signal endpoint and returns the decoded JSON, noting the response size on the current span.
+    endpoint picks another of the provider's URLs (e.g. "weather_group"); the timeout is the provider's.
+    """
+    endpoint = endpoint or provider
+    vendor, api_key = SIGNAL_VENDORS[endpoint], params.get(SIGNAL_KEY_PARAMS[endpoint])
+    rate_limiter.acquire(vendor, endpoint, api_key, max_wait=SIGNAL_MAX_WAIT)
+    res = session.get(SIGNAL_ENDPOINTS[endpoint], params=params, timeout=signal_timeout(provider))
+    tracing.annotate(status_code=res.status_code, bytes_in=len(res.content))
+    if res.status_code == 429:
+        rate_limiter.penalize(vendor, endpoint, api_key, retry_after(res.headers))
+    res.raise_for_status()
+    return res.json()
+
+def _parse_weather(weather_data):
+    return {'temp': weather_data['main']['temp'], 'condition': weather_data['weather'][0]['main']}
+
+def _fetch_weather(session, keys, city, today):
+    entry = city_registry.get(city)
+    # A city outside the registry is looked up by name, as OpenWeather always allowed
+    location = {'lat': entry.lat, 'lon': entry.lon} if entry else {'q': city}
+    return _parse_weather(_signal_get(session, 'weather', {**location, 'appid': keys['OPENWEATHER_API_KEY'],
+                                                           'units': 'metric'}))
+
+def _fetch_aqi(session, keys, city, today):
+    # Registry cities only: fetch_live_signals skips AQI for the others (COORDINATE_PROVIDERS)
+    entry = city_registry.get(city)
+    data = _signal_get(session, 'aqi', {'lat': entry.lat, 'lon': entry.lon, 'key': keys['IQAIR_API_KEY']})
+    return {'aqi': data['data']['current']['pollution']['aqius']}
+
+def _download_holiday_year(keys, country, year):
+    with tracing.span("signal.holiday_download", kind="signal", year=year):
+        data = _signal_get(get_http_session(), 'holiday',
+                           {'api_key': keys['CALENDARIFIC_API_KEY'], 'country': country, 'year': year})
+    return data.get('response', {}).get('holidays', [])
+
+# One yearly Calendarific download (cached to DATA_DIR) serves every city and day.
+holiday_index = HolidayIndex(_download_holiday_year, cache_dir=DATA_DIR)
+
+def _fetch_holiday(session, keys, city, today):
+    entry = city_registry.get(city)
+    holidays = holiday_index.lookup(keys, today, state=entry.state if entry else None)
+    return {'holiday': holidays[0] if holidays else "None"}
+
+def _fetch_news(session, keys, city, today):
+    data = _signal_get(session, 'news', {'q': f"({city} AND (sports OR event OR match))", 'apiKey': keys['NEWS_API_KEY'],
+                                         'sortBy': 'relevancy', 'pageSize': 1})
+    articles = data.get('articles', [])
+    return {'top_event': articles[0]['title'] if articles else "None"}
+
+# --- 5.1 GROUP FETCHERS (many cities per call, used by fetch_signals_bulk) ---
+# OpenWeather's group endpoint takes up to 20 city ids; NewsAPI caps q at 500 characters.
+OWM_GROUP_SIZE = 20
+NEWS_QUERY_MAX_CHARS = 500
+NEWS_TOPICS = "(sports OR event OR match)"
+
+def _fetch_weather_group(session, keys, cities):
+    by_id = {entry.owm_id: entry.name for entry in cities}
+    data = _signal_get(session, 'weather', {'id': ",".join(str(i) for i in by_id), 'appid': keys['OPENWEATHER_API_KEY'],
+                                            'units': 'metric'}, endpoint='weather_group')
+    return {by_id[item['id']]: _parse_weather(item) for item in data.get('list', []) if item.get('id') in by_id}
+
+def _news_term(name):
+    return f'"{name}"' if " " in name else name
+
+def _news_group_query(cities):
+    return f"({' OR '.join(_news_term(entry.name) for entry in cities)}) AND {NEWS_TOPICS}"
+
+def _news_chunks(cities):
+    """
+    Splits the cities into groups whose OR-query fits in NEWS_QUERY_MAX_CHARS.
+    """
+    chunks, chunk = [], []
+    for entry in cities:
+        if chunk and len(_news_group_query(chunk + [entry])) > NEWS_QUERY_MAX_CHARS:
+            chunks.append(chunk)
+            chunk = []
+        chunk.append(entry)
+    return chunks + [chunk] if chunk else chunks
+
+def _fetch_news_group(session, keys, cities):
+    """
+    One OR-query for several cities; each city gets the most relevant article that
+    names it (or one of its aliases) in the title or description.
+    """
+    data = _signal_get(session, 'news', {'q': _news_group_query(cities), 'apiKey': keys['NEWS_API_KEY'],
+                                         'sortBy': 'relevancy', 'pageSize': 100})
+    patterns = {entry.name: re.compile(r"\b(" + "|".join(re.escape(n) for n in (entry.name, *entry.aliases)) + r")\b", re.I)
+                for entry in cities}
+    results = {}
+    for article in data.get('articles', []):
+        text = f"{article.get('title') or ''} {article.get('description') or ''}"
+        for name, pattern in patterns.items():
+            if name not in results and pattern.search(text):
+                results[name] = {'top_event': article['title']}
+    return {entry.name: results.get(entry.name, {'top_event': "None"}) for entry in cities}
+
+# Provider order here is also the key order of the returned signals dict.
+# LOCAL_PROVIDERS are answered from an in-process index: no cache, and no thread
+# hop once LOCAL_PROVIDER_READY says the index is loaded.
+SIGNAL_PROVIDERS = {
+    "weather": _fetch_weather,
+    "aqi": _fetch_aqi,
+    "holiday": _fetch_holiday,
+    "news": _fetch_news,
+}
+LOCAL_PROVIDERS = {"holiday"}
+# A cold index (e.g. the first call of the year) means a download, which then
+# runs on the executor next to the remote providers, under its own deadline
+LOCAL_PROVIDER_READY = {"holiday": lambda today: holiday_index.is_loaded(today.year)}
+# Providers that need registry coordinates; a city outside the registry gets their fallback
+COORDINATE_PROVIDERS = {"aqi"}
+
+# One breaker per remote provider, shared by every city and session in this process.
+# A call slower than half the provider's deadline counts as a failure.
+signal_breakers = {
+    provider: CircuitBreaker(provider, default_timeout=SIGNAL_TIMEOUTS[provider],
+                             slow_call_s=SIGNAL_DEADLINES[provider] / 2)
+    for provider in SIGNAL_PROVIDERS if provider not in LOCAL_PROVIDERS
+}
+
+def signal_timeout(provider):
+    """
+    (connect, read) timeout for the next call: adaptive once the breaker has seen enough calls.
+    """
+    breaker = signal_breakers.get(provider)
+    return breaker.timeout() if breaker else SIGNAL_TIMEOUTS[provider]
+
+def signal_breaker_status():
+    return [breaker.status() for breaker in signal_breakers.values()]
+
+def _signal_fallback(city, provider, use_cache=True):
+    """
+    Value for a provider that was skipped or failed: the last cached value if it is
+    recent enough, otherwise the provider's "N/A"/"None" fallback.
+    """
+    stale = signal_cache.get_stale(city, provider, max_age=STALE_SIGNAL_MAX_AGE) if use_cache else None
+    if stale is not None:
+        value, age = stale
+        print(f"[Signal] Using last known {SIGNAL_LABELS[provider]} value ({age / 60:.0f} min old)")
+        return value
+    return dict(SIGNAL_FALLBACKS[provider])
+
+def _fetch_provider(provider, session, keys, city, today):
+    """
+    Runs one provider fetcher. Returns (values, ok); on any failure the values
+    are the provider's fallbacks and ok is False.
+    """
+    breaker = signal_breakers.get(provider)
+    with tracing.span(f"signal.{provider}", kind="signal", city=city) as span:
+        started = time.perf_counter()
+        try:
+            values = SIGNAL_PROVIDERS[provider](session, keys, city, today)
+        except RateLimited as e:
+            # Our own limiter said no before any request went out: not the provider's fault
+            print(f"[Signal] ⏳ {SIGNAL_LABELS[provider]} rate limited, using the fallback: {e}")
+            span.set(rate_limited=e.reason)
+            if breaker:
+                breaker.release_probe()
+            return dict(SIGNAL_FALLBACKS[provider]), False
+        except Exception as e:
+            print(f"[Signal] FAILED to fetch {SIGNAL_LABELS[provider]}: {tracing.redact(str(e))}")
+            span.fail(e)
+            if breaker:
+                breaker.record_failure(e)
+            return dict(SIGNAL_FALLBACKS[provider]), False
+        if breaker:
+            breaker.record_success(time.perf_counter() - started)
+        return values, True
+
+@tracing.traced("signals", kind="stage")
+def fetch_live_signals(keys, city: str, parallel: bool = True, use_cache: bool = True, use_snapshot: bool = True):
+    """
+    Fetches weather, AQI, holiday and news signals for a city, by its registry coordinates.
+    Holidays come from the local holiday_index; while its year is still downloading,
+    the lookup runs next to the remote providers. Remote providers are read from the
+    refresher's snapshot store while it is fresh (SNAPSHOT_MAX_AGES), then from signal_cache.
+    The remaining providers run concurrently over the shared session, each with its
+    own (adaptive) timeout and deadline. Providers whose circuit breaker is open are
+    skipped. A skipped or failed provider falls back to its last cached value, or
+    to "N/A"/"None". Fallback values are never cached. A city outside the registry
+    gets weather by name and no AQI; that never counts against a breaker.
+    """
     print(f"[Signal] Fetching all signals for: {city}")
-    signals = {}
-    today = date.today()
-    
-    # 1. Fetch Weather
-    try:
-        weather_url = f"https://api.openweathermap.org/data/2.5/weather?q={city}&appid={keys['OPENWEATHER_API_KEY']}&units=metric"
-        weather_res = requests.get(weather_url, verify=False)
-        weather_res.raise_for_status()
-        weather_data = weather_res.json()
-        signals['temp'] = weather_data['main']['temp']
-        signals['condition'] = weather_data['weather'][0]['main']
-    except Exception as e:
-        print(f"[Signal] FAILED to fetch Weather: {e}")
-        signals['temp'] = "N/A"
-        signals['condition'] = "N/A"
+    session = get_http_session()
+    entry = city_registry.get(city)
+    # Cache and snapshot entries are keyed by the registry name, so an alias ("Bangalore") shares them
+    city = entry.name if entry else city
+    today = entry.today() if entry else date.today()
+    results = {}
+    if entry is None:
+        print(f"[Signal] {city} is not in the city registry, skipping {', '.join(sorted(COORDINATE_PROVIDERS))}")
+        tracing.annotate(unregistered_city=True)
+        for provider in COORDINATE_PROVIDERS:
+            results[provider] = _signal_fallback(city, provider, use_cache)
 
-    # 2. Fetch AQI
-    try:
-        state = CITY_STATES.get(city) 
-        if not state: raise Exception(f"City state not found for {city}")
-        aqi_url = f"https://api.iqair.com/v2/city?city={city}&state={state}&country=India&key={keys['IQAIR_API_KEY']}"
-        aqi_res = requests.get(aqi_url, verify=False)
-        aqi_res.raise_for_status()
-        aqi_data = aqi_res.json()
-        signals['aqi'] = aqi_data['data']['current']['pollution']['aqius']
-    except Exception as e:
-        print(f"[Signal] FAILED to fetch AQI: {e}")
-        signals['aqi'] = "N/A"
+    for provider in LOCAL_PROVIDERS:
+        if LOCAL_PROVIDER_READY[provider](today):
+            results[provider], _ = _fetch_provider(provider, session, keys, city, today)
+        else:
+            print(f"[Signal] {SIGNAL_LABELS[provider]} index is not loaded yet, fetching it with the remote providers")
 
-    # 3. Fetch Holiday / Festival
-    signals['holiday'] = "None" 
-    try:
-        cal_url = (f"https://calendarific.com/api/v2/holidays"
-                   f"?api_key={keys['CALENDARIFIC_API_KEY']}&country=IN&year={today.year}"
-                   f"&month={today.month}&day={today.day}")
-        cal_res = requests.get(cal_url, verify=False)
-        cal_res.raise_for_status()
-        holidays = cal_res.json().get('response', {}).get('holidays', [])
-        if holidays: signals['holiday'] = holidays[0]['name']
-    except Exception as e:
-        print(f"[Signal] FAILED to fetch Holiday: {e}")
+    snapshot = {}
+    if use_snapshot:
+        snapshot = snapshot_store.read(city, SNAPSHOT_MAX_AGES)
+        snapshot = {p: v for p, v in snapshot.items() if p in SIGNAL_PROVIDERS and p not in LOCAL_PROVIDERS}
+        if snapshot:
+            print(f"[Signal] Snapshot hit for {city}: {', '.join(snapshot)}")
+            tracing.annotate(snapshot_hits=list(snapshot))
+            results.update(snapshot)
+
+    if use_cache:
+        cached_providers = []
+        for provider in SIGNAL_PROVIDERS:
+            if provider in LOCAL_PROVIDERS or provider in results:
+                continue
+            cached = signal_cache.get(city, provider)
+            if cached is not None:
+                results[provider] = cached
+                cached_providers.append(provider)
+        if cached_providers:
+            print(f"[Signal] Cache hit for {city}: {', '.join(cached_providers)}")
+            tracing.annotate(cache_hits=cached_providers)
+    pending = [provider for provider in SIGNAL_PROVIDERS if provider not in results]
+
+    # Providers whose breaker is open are not called at all
+    skipped = [p for p in pending if p in signal_breakers and not signal_breakers[p].allow()]
+    for provider in skipped:
+        print(f"[Signal] ⚡ {SIGNAL_LABELS[provider]} circuit is open, skipping the call")
+        results[provider] = _signal_fallback(city, provider, use_cache)
+    if skipped:
+        tracing.annotate(short_circuited=skipped)
+    pending = [provider for provider in pending if provider not in skipped]
+
+    fetched = {}
+    if not parallel:
+        for provider in pending:
+            fetched[provider] = _fetch_provider(provider, session, keys, city, today)
+    else:
+        started = time.monotonic()
+        futures = {
+            provider: _signal_executor.submit(tracing.wrap(_fetch_provider), provider, session, keys, city, today)
+            for provider in pending
+        }
+        for provider, future in futures.items():
+            remaining = SIGNAL_DEADLINES[provider] - (time.monotonic() - started)
+            try:
+                fetched[provider] = future.result(timeout=max(0, remaining))
+            except FutureTimeoutError:
+                print(f"[Signal] FAILED to fetch {SIGNAL_LABELS[provider]}: deadline of {SIGNAL_DEADLINES[provider]}s exceeded")
+                fetched[provider] = (dict(SIGNAL_FALLBACKS[provider]), False)
+
+    for provider, (values, ok) in fetched.items():
+        if not ok:
+            results[provider] = _signal_fallback(city, provider, use_cache)
+            continue
+        results[provider] = values
+        if use_cache and provider not in LOCAL_PROVIDERS:
+            signal_cache.put(city, provider, values)
+
+    signals = {}
+    for provider in SIGNAL_PROVIDERS:
+        signals.update(results[provider])
 
-    # 4. Fetch Sports / Event News
-    signals['top_event'] = "None" 
-    try:
-        news_url = (f"https://newsapi.org/v2/everything"
-                    f"?q=({city} AND (sports OR event OR match))"
-                    f"&apiKey={keys['NEWS_API_KEY']}&sortBy=relevancy&pageSize=1")
-        news_res = requests.get(news_url, verify=False)
-        news_res.raise_for_status()
-        articles = news_res.json().get('articles', [])
-        if articles: signals['top_event'] = articles[0]['title']
-    except Exception as e:
-        print(f"[Signal] FAILED to fetch NewsAPI/Events: {e}")
-        
     print(f"[Signal] Completed signal fetch: {signals}")
     return signals
+
+
+def _fetch_group(provider, fetcher, session, keys, chunk):
+    """
+    One group call through the provider's breaker. Returns {city: values or None}; None means fall back.
+    """
+    names = [entry.name for entry in chunk]
+    breaker = signal_breakers[provider]
+    if not breaker.allow():
+        print(f"[Signal] ⚡ {SIGNAL_LABELS[provider]} circuit is open, skipping a group call for {len(chunk)} cities")
+        return dict.fromkeys(names)
+    with tracing.span(f"signal.{provider}_group", kind="signal", cities=len(chunk)) as span:
+        started = time.perf_counter()
+        try:
+            values = fetcher(session, keys, chunk)
+        except RateLimited as e:
+            print(f"[Signal] ⏳ {SIGNAL_LABELS[provider]} rate limited for {len(chunk)} cities: {e}")
+            span.set(rate_limited=e.reason)
+            breaker.release_probe()
+            return dict.fromkeys(names)
+        except Exception as e:
+            print(f"[Signal] FAILED to fetch {SIGNAL_LABELS[provider]} for {len(chunk)} cities: {tracing.redact(str(e))}")
+            span.fail(e)
+            breaker.record_failure(e)
+            return dict.fromkeys(names)
+        breaker.record_success(time.perf_counter() - started)
+    return {name: values.get(name) for name in names}
+
+def _fetch_single(provider, session, keys, city, today):
+    breaker = signal_breakers.get(provider)
+    if breaker and not breaker.allow():
+        return {city: None}
+    values, ok = _fetch_provider(provider, session, keys, city, today)
+    return {city: values if ok else None}
+
+def _fetch_paced(provider, session, keys, entries, max_wait):
+    """
+    One-city calls for a provider without a group endpoint, made in turn and each
+    started only once the rate limiter has a token for it, so a round of more
+    cities than the bucket's burst still completes. The wait happens before the
+    breaker probe and the call timer. Cities still waiting after max_wait seconds
+    (or past the daily quota) come back as None.
+    """
+    vendor = SIGNAL_VENDORS[provider]
+    api_key = keys.get(VENDOR_KEY_NAMES[vendor])
+    deadline = time.monotonic() + max_wait
+    results = {}
+    for i, entry in enumerate(entries):
+        wait, reason = rate_limiter.wait_time(vendor, provider, api_key)
+        if reason == "quota" or time.monotonic() + wait > deadline:
+            print(f"[Signal] ⏳ {SIGNAL_LABELS[provider]}: no token within {max_wait:.0f}s, "
+                  f"{len(entries) - i} cities left for the next round")
+            results.update(dict.fromkeys(entry.name for entry in entries[i:]))
+            break
+        if wait > 0:
+            time.sleep(wait + 0.01)
+        results.update(_fetch_single(provider, session, keys, entry.name, entry.today()))
+    return results
+
+def fetch_providers_bulk(keys, cities, providers, use_cache: bool = True, known=None, max_wait=None):
+    """
+    Group-fetches remote providers for many cities: weather from OpenWeather's
+    group endpoint (20 cities per call), news from one OR-query per ~500
+    characters of city names. IQAir has no multi-city endpoint, so AQI stays one
+    coordinate call per city. Values in known ({city: {provider: values}}) and fresh
+    cached values are used first; new values are cached. With max_wait, the AQI
+    calls are paced to IQAir's rate limit (see _fetch_paced) for up to that many
+    seconds instead of being sent at once and degrading past SIGNAL_MAX_WAIT.
+    Returns {city: {provider: values or None}}; None means the call failed or its
+    breaker was open, and no fallback has been applied.
+    """
+    # Keyed by registry name below, like the snapshots and the group calls; an alias gets its city's values
+    requested = {}
+    for name in cities:
+        entry = city_registry.get(name)
+        requested[name] = entry.name if entry else name
+    cities = list(dict.fromkeys(requested.values()))
+    entries = {name: city_registry.get(name) for name in cities}
+    session = get_http_session()
+    results = {name: {p: v for p, v in (known or {}).get(name, {}).items() if p in providers} for name in cities}
+    if use_cache:
+        for name in cities:
+            for provider in providers:
+                if provider in results[name]:
+                    continue
+                cached = signal_cache.get(name, provider)
+                if cached is not None:
+                    results[name][provider] = cached
+
+    def missing(provider):
+        if provider not in providers:
+            return []
+        return [entries[name] for name in cities if provider not in results[name] and entries[name]]
+
+    calls = []
+    weather = missing("weather")
+    grouped = [entry for entry in weather if entry.owm_id]
+    for i in range(0, len(grouped), OWM_GROUP_SIZE):
+        calls.append(("weather", _fetch_group, ("weather", _fetch_weather_group, session, keys, grouped[i:i + OWM_GROUP_SIZE])))
+    for entry in weather:
+        if not entry.owm_id:
+            calls.append(("weather", _fetch_single, ("weather", session, keys, entry.name, entry.today())))
+    if max_wait is None:
+        for entry in missing("aqi"):
+            calls.append(("aqi", _fetch_single, ("aqi", session, keys, entry.name, entry.today())))
+    elif missing("aqi"):
+        calls.append(("aqi", _fetch_paced, ("aqi", session, keys, missing("aqi"), max_wait)))
+    for chunk in _news_chunks(missing("news")):
+        calls.append(("news", _fetch_group, ("news", _fetch_news_group, session, keys, chunk)))
+    tracing.annotate(cities=len(cities), calls=len(calls))
+
+    futures = [(provider, _signal_executor.submit(tracing.wrap(fn), *args)) for provider, fn, args in calls]
+    for provider, future in futures:
+        for name, values in future.result().items():
+            results[name][provider] = values
+            if use_cache and values is not None:
+                signal_cache.put(name, provider, values)
+    for name in cities:
+        for provider in providers:
+            results[name].setdefault(provider, None)
+    print(f"[Signal] Bulk fetched {', '.join(providers)} for {len(cities)} cities in {len(calls)} calls")
+    return {name: dict(results[canonical]) for name, canonical in requested.items()}
+
+@tracing.traced("signals.bulk", kind="stage")
+def fetch_signals_bulk(keys, cities=None, use_cache: bool = True, use_snapshot: bool = True):
+    """
+    Signals for many cities (default: the whole registry) with a few group calls
+    instead of one call per city and provider (see fetch_providers_bulk);
+    fresh snapshot values are used first and holidays come from the local index. Breaker and fallback behaviour match
+    fetch_live_signals. Returns {city: signals}.
+    """
+    names = list(dict.fromkeys(cities or CITIES))
+    print(f"[Signal] Bulk fetching signals for {len(names)} cities")
+    session = get_http_session()
+    remote = [provider for provider in SIGNAL_PROVIDERS if provider not in LOCAL_PROVIDERS]
+    known = snapshot_store.read_all(SNAPSHOT_MAX_AGES) if use_snapshot else None
+    results = fetch_providers_bulk(keys, names, remote, use_cache, known=known)
+
+    signals = {}
+    for name in names:
+        entry = city_registry.get(name)
+        city = entry.name if entry else name
+        today = entry.today() if entry else date.today()
+        for provider in LOCAL_PROVIDERS:
+            results[name][provider], _ = _fetch_provider(provider, session, keys, city, today)
+        signals[name] = {}
+        for provider in SIGNAL_PROVIDERS:
+            if results[name][provider] is None:
+                results[name][provider] = _signal_fallback(city, provider, use_cache)
+            signals[name].update(results[name][provider])
+    return signals
+
+# --- 5.2 SIGNAL SNAPSHOTS (always-on refresher) ---
+# Written by one SignalRefresher per data directory, read by every process.
+snapshot_store = SnapshotStore(os.path.join(DATA_DIR, "snapshots.db"))
+
+def refresh_calls_per_round(cities=None):
+    """
+    {provider: calls} one refresh round of every registered city makes, with the bulk group calls.
+    """
+    entries = [city_registry.get(name) for name in (cities or CITIES)]
+    grouped = sum(1 for entry in entries if entry.owm_id)
+    return {"weather": math.ceil(grouped / OWM_GROUP_SIZE) + len(entries) - grouped,
+            "aqi": len(entries), "news": len(_news_chunks(entries))}
+
+# The refresher's intervals, lengthened to fit the configured tiers' daily quotas
+# (see signal_snapshots.quota_intervals); snapshots go stale after two of them
+REFRESH_INTERVALS = quota_intervals(
+    refresh_calls_per_round(),
+    {provider: rate_limiter.tier(SIGNAL_VENDORS[provider]).daily for provider in ("weather", "aqi", "news")}
+)
+SNAPSHOT_MAX_AGES = {provider: MAX_AGE_INTERVALS * interval for provider, interval in REFRESH_INTERVALS.items()}
+_signal_refresher = None
+_signal_refresher_lock = threading.Lock()
+# How long one refresh round may queue for rate-limit tokens (IQAir's free tier
+# allows 5 calls a minute); kept under the refresher's lease of 3 ticks
+REFRESH_MAX_WAIT = 60
+# Material signal deltas per city (see signal_changes.py); every delta is appended here for tuning
+change_detector = ChangeDetector(log_path=os.path.join(DATA_DIR, "signal_deltas.jsonl"))
+
+def _refresh_providers(keys, cities, providers):
+    with tracing.trace("signals.refresh", providers=providers):
+        return fetch_providers_bulk(keys, cities, providers, use_cache=False, max_wait=REFRESH_MAX_WAIT)
+
+def make_signal_refresher(keys, **options):
+    options.setdefault("intervals", REFRESH_INTERVALS)
+    return SignalRefresher(_refresh_providers, keys, snapshot_store, CITIES, **options)
+
+def ensure_signal_refresher(keys, **options):
+    """
+    Starts the process-wide background refresher on first call (survives Streamlit reruns).
+    Set GEOPULSE_SIGNAL_REFRESH=0 to leave refreshing to a separate `python signal_snapshots.py`.
+    """
+    global _signal_refresher
+    if os.environ.get("GEOPULSE_SIGNAL_REFRESH", "1") == "0":
+        return None
+    with _signal_refresher_lock:
+        if _signal_refresher is None:
+            _signal_refresher = make_signal_refresher(keys, **options).start()
+    return _signal_refresher
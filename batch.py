@@ -0,0 +1,255 @@
+"""
+Batch campaign runner: every (brand, city) pair through the full pipeline.
+
+Signals for every city are fetched up front in one bulk refresh (a few group
+calls, see backend.fetch_signals_bulk) and shared by all brands in each city.
+Pipelines run concurrently under a concurrency limit, every OpenAI call draws
+from a shared per-minute rate budget, and results are yielded as each
+pipeline finishes.
+
+Usage:
+    python batch.py                                  # all brands x all cities
+    python batch.py --brands zomato swiggy --cities Delhi Mumbai --concurrency 4 --rpm 30
+    python batch.py --no-images --jsonl results.jsonl
+    python batch.py --fast                           # Calls 2+3 merged into one
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import backend
+import tracing
+
+STAGES = ["signals", "strategist", "creative", "image_prompt", "image"]
+
+
+class RateBudget:
+    """
+    Thread-safe token bucket: acquire() blocks until a call fits in the per-minute budget.
+    """
+    def __init__(self, per_minute, burst=None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or max(1, per_minute // 6)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def build_matrix(brands=None, cities=None):
+    """
+    Returns the (brand, city) pairs to run, in city-major order.
+    """
+    brands = brands or backend.all_brands()
+    cities = cities or backend.CITIES
+    return [(brand, city) for city in cities for brand in brands]
+
+
+class BatchRunner:
+    def __init__(self, keys, openai_client, max_concurrency=4, openai_rpm=60,
+                 with_images=True, fast=False, output_dir=None):
+        self.keys = keys
+        self.openai_client = openai_client
+        self.max_concurrency = max_concurrency
+        self.budget = RateBudget(openai_rpm)
+        self.with_images = with_images
+        self.fast = fast
+        self.output_dir = output_dir or os.path.join(
+            backend.DATA_DIR, "batch", datetime.now().strftime("%Y%m%d-%H%M%S")
+        )
+        self.results = []
+        self.wall_time = 0.0
+        self._signals_future = None
+        self._signal_timings = {}
+
+    # --- Shared signals ---
+    def _fetch_cities(self, cities):
+        started = time.perf_counter()
+        with tracing.trace("batch.signals", cities=len(cities)):
+            signals = backend.fetch_signals_bulk(self.keys, cities)
+        elapsed = time.perf_counter() - started
+        self._signal_timings = dict.fromkeys(cities, elapsed)
+        return signals
+
+    # --- One pipeline ---
+    def _openai_call(self, fn, *args):
+        self.budget.acquire()
+        return fn(self.openai_client, *args)
+
+    def _run_traced_pipeline(self, brand, city):
+        with tracing.trace("batch.pipeline", brand=brand, city=city) as root:
+            result = self._run_pipeline(brand, city)
+            result["trace_id"] = root.trace_id
+            return result
+
+    def _run_pipeline(self, brand, city):
+        result = {"brand": brand, "city": city, "status": "ok", "timings": {}}
+        timings = result["timings"]
+        try:
+            profile = backend.get_company_profile(brand)
+
+            started = time.perf_counter()
+            live_signal = self._signals_future.result()[city]
+            timings["signals"] = self._signal_timings.get(city, time.perf_counter() - started)
+            result["live_signal"] = live_signal
+
+            started = time.perf_counter()
+            triggers = self._openai_call(backend.get_dynamic_triggers_and_tone, live_signal, profile)
+            timings["strategist"] = time.perf_counter() - started
+            if not triggers:
+                raise Exception("AI Strategist found no brand-safe triggers.")
+            result["trigger"] = triggers[0]["trigger"]
+            result["tone"] = triggers[0]["tone"]
+
+            started = time.perf_counter()
+            if self.fast:
+                (result["post_text"], result["hashtags"], result["target_audience"],
+                 result["predicted_impact_rating"], result["predicted_impact_reasoning"],
+                 result["image_prompt"]) = self._openai_call(
+                    backend.generate_creative_package_fast, city, result["trigger"], result["tone"], live_signal, profile
+                )
+            else:
+                (result["post_text"], result["hashtags"], result["target_audience"],
+                 result["predicted_impact_rating"], result["predicted_impact_reasoning"]) = self._openai_call(
+                    backend.generate_creative_assets, city, result["trigger"], result["tone"], live_signal, profile
+                )
+            timings["creative"] = time.perf_counter() - started
+
+            if self.with_images:
+                if not result.get("image_prompt"):
+                    started = time.perf_counter()
+                    result["image_prompt"] = self._openai_call(
+                        backend.generate_safe_image_prompt, result["post_text"], profile
+                    )
+                    timings["image_prompt"] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                image_bytes = self._openai_call(backend.generate_image_with_dalle, result["image_prompt"])
+                timings["image"] = time.perf_counter() - started
+                # Batch images are deliverables, so they are kept on disk (one file per pair)
+                os.makedirs(self.output_dir, exist_ok=True)
+                slug = re.sub(r"[^a-z0-9]+", "-", f"{brand}-{city}".lower()).strip("-")
+                result["image_path"] = os.path.join(self.output_dir, f"{slug}.png")
+                with open(result["image_path"], "wb") as f:
+                    f.write(image_bytes)
+        except Exception as e:
+            print(f"[Batch] ❌ {brand} / {city} failed: {e}")
+            result["status"] = "failed"
+            result["error"] = str(e)
+        return result
+
+    def run(self, pairs=None):
+        """
+        Runs every (brand, city) pair and yields each result dict as soon as it finishes.
+        """
+        pairs = pairs or build_matrix()
+        cities = list(dict.fromkeys(city for _, city in pairs))
+        print(f"[Batch] Running {len(pairs)} pipelines across {len(cities)} cities "
+              f"(concurrency={self.max_concurrency})")
+        self.results = []
+        started = time.perf_counter()
+        # Separate pools so pipelines waiting on the signals can never starve the fetch.
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-signals") as signal_pool, \
+                ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="batch") as pipeline_pool:
+            self._signals_future = signal_pool.submit(self._fetch_cities, cities)
+            futures = [pipeline_pool.submit(self._run_traced_pipeline, brand, city) for brand, city in pairs]
+            for future in as_completed(futures):
+                result = future.result()
+                self.results.append(result)
+                self.wall_time = time.perf_counter() - started
+                yield result
+        self.wall_time = time.perf_counter() - started
+
+    def report(self):
+        """
+        Summarises the last run: throughput and per-stage timing.
+        """
+        ok = [r for r in self.results if r["status"] == "ok"]
+        stages = {}
+        for stage in STAGES:
+            samples = [r["timings"][stage] for r in self.results if stage in r["timings"]]
+            if stage == "signals":
+                # Shared per city, so count each city once
+                samples = list(self._signal_timings.values())
+            if samples:
+                stages[stage] = {
+                    "count": len(samples),
+                    "mean_s": round(statistics.mean(samples), 3),
+                    "p50_s": round(statistics.median(samples), 3),
+                    "max_s": round(max(samples), 3),
+                }
+        return {
+            "pipelines": len(self.results),
+            "succeeded": len(ok),
+            "failed": len(self.results) - len(ok),
+            "wall_time_s": round(self.wall_time, 2),
+            "throughput_per_min": round(len(ok) / self.wall_time * 60, 2) if self.wall_time else 0.0,
+            "stages": stages,
+        }
+
+
+def format_report(report):
+    lines = [
+        f"Pipelines: {report['pipelines']} ({report['succeeded']} ok, {report['failed']} failed)",
+        f"Wall time: {report['wall_time_s']}s | Throughput: {report['throughput_per_min']} pipelines/min",
+        f"{'stage':<14}{'count':>6}{'mean':>9}{'p50':>9}{'max':>9}",
+    ]
+    for stage, s in report["stages"].items():
+        lines.append(f"{stage:<14}{s['count']:>6}{s['mean_s']:>8.2f}s{s['p50_s']:>8.2f}s{s['max_s']:>8.2f}s")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the GeoPulse pipeline for a brand x city matrix.")
+    parser.add_argument("--brands", nargs="+", help="brand keys, e.g. zomato swiggy (default: all)")
+    parser.add_argument("--cities", nargs="+", help="city names (default: all CITIES)")
+    parser.add_argument("--concurrency", type=int, default=4, help="pipelines in flight at once")
+    parser.add_argument("--rpm", type=int, default=60, help="OpenAI calls per minute across all pipelines")
+    parser.add_argument("--no-images", action="store_true", help="skip the image prompt and DALL-E calls")
+    parser.add_argument("--fast", action="store_true", help="merge the creative and image-prompt calls into one")
+    parser.add_argument("--jsonl", help="append each result as a JSON line to this file")
+    args = parser.parse_args()
+    tracing.start_metrics_server_from_env()
+
+    from openai import OpenAI
+
+    keys = backend.load_keys()
+    runner = BatchRunner(
+        keys, OpenAI(api_key=keys["OPENAI_API_KEY"]),
+        max_concurrency=args.concurrency, openai_rpm=args.rpm, with_images=not args.no_images, fast=args.fast
+    )
+    out = open(args.jsonl, "a", encoding="utf-8") if args.jsonl else None
+    try:
+        for result in runner.run(build_matrix(args.brands, args.cities)):
+            status = "✅" if result["status"] == "ok" else "❌"
+            print(f"[Batch] {status} {result['brand']} / {result['city']}: "
+                  f"{result.get('post_text') or result.get('error')}")
+            if out:
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+    finally:
+        if out:
+            out.close()
+    print()
+    print(format_report(runner.report()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Server time per user interaction in app.py, replayed with Streamlit's AppTest
+against benchmarks/mock_server.py.
+
+Each interaction (open the app, change a sidebar option, analyze, pick a
+trigger, generate, publish) is timed as the script time the server spends on
+it: every full rerun and st.rerun() it sets off, without time.sleep() in the
+script thread (idle polling). AppTest always runs the whole script, so for an
+interaction that starts inside an st.fragment (a button or poll tick in one
+step) only that fragment's body is counted for the first run, as a browser
+session would rerun just the fragment.
+    python benchmarks/bench_app_interactions.py
+    python benchmarks/bench_app_interactions.py --baseline HEAD~1    # side by side with app.py at that commit
+"""
+import argparse
+import functools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+POLL_SECONDS = 0.75  # how often a browser would tick a polling fragment
+
+
+class ScriptClock:
+    """
+    Records full runs (st.set_page_config is the app's first call), fragment bodies
+    and time.sleep() in the script thread, by patching streamlit and time.
+    """
+    def __init__(self):
+        self.runs = []       # [start, end, slept]
+        self.fragments = []  # (run index, name, seconds)
+        self._sleep = time.sleep
+
+    def install(self):
+        import streamlit as st
+        clock = self
+        set_page_config, fragment = st.set_page_config, st.fragment
+
+        def timed_set_page_config(*args, **kwargs):
+            now = time.perf_counter()
+            if clock.runs and clock.runs[-1][1] is None:
+                clock.runs[-1][1] = now
+            clock.runs.append([now, None, 0.0])
+            return set_page_config(*args, **kwargs)
+
+        def timed_fragment(func=None, *, run_every=None):
+            if func is None:
+                return lambda f: timed_fragment(f, run_every=run_every)
+
+            @functools.wraps(func)
+            def body(*args, **kwargs):
+                run, started, slept = len(clock.runs) - 1, time.perf_counter(), clock.runs[-1][2]
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    clock.fragments.append((run, func.__name__, time.perf_counter() - started - (clock.runs[-1][2] - slept)))
+            return fragment(body, run_every=run_every)
+
+        def sleep(seconds):
+            if threading.current_thread().name.startswith("ScriptRunner") and clock.runs:
+                clock.runs[-1][2] += seconds
+            clock._sleep(seconds)
+
+        st.set_page_config = timed_set_page_config
+        st.fragment = timed_fragment
+        time.sleep = sleep
+
+    def measure(self, action, origin=None):
+        """
+        Runs action() and returns (full runs, fragment runs, server seconds) for it.
+        origin names the fragment the interaction starts in, if any.
+        """
+        first_run, first_fragment = len(self.runs), len(self.fragments)
+        action()
+        if self.runs and self.runs[-1][1] is None:
+            self.runs[-1][1] = time.perf_counter()
+        runs = self.runs[first_run:]
+        costs = [end - start - slept for start, end, slept in runs]
+        fragment_runs = 0
+        if origin and runs:
+            body = [s for run, name, s in self.fragments[first_fragment:] if run == first_run and name == origin]
+            if body:
+                costs[0], fragment_runs = body[0], 1
+        return len(runs) - fragment_runs, fragment_runs, sum(costs)
+
+
+def run_scenario(app_path, latency_scale):
+    from mock_server import MockProviders
+    clock = ScriptClock()
+    data_dir = tempfile.mkdtemp(prefix="geopulse-bench-")
+    os.environ.update({"GEOPULSE_DATA_DIR": data_dir, "GEOPULSE_SIGNAL_REFRESH": "0"})
+    mock = MockProviders(latency_scale=latency_scale, seed=7).start()
+    os.environ["OPENAI_BASE_URL"] = mock.openai_base_url
+    keys = mock.install()
+    clock.install()
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=120)
+    for name, value in keys.items():
+        at.secrets[name] = value
+    results = []
+
+    def wait_for(step, origin):
+        # A browser ticks the polling fragment every POLL_SECONDS; the old app slept and reran itself
+        full = fragments = seconds = 0
+        while at.session_state.step != step:
+            if at.exception:
+                raise RuntimeError(at.exception[0].value)
+            time.sleep(POLL_SECONDS)
+            f, g, s = clock.measure(at.run, origin)
+            full, fragments, seconds = full + f, fragments + g, seconds + s
+        return full, fragments, seconds
+
+    def interaction(name, action, origin=None, until=None, poll_origin=None):
+        full, fragments, seconds = clock.measure(action, origin)
+        if until:
+            f, g, s = wait_for(until, poll_origin)
+            full, fragments, seconds = full + f, fragments + g, seconds + s
+        results.append({"interaction": name, "full_runs": full, "fragment_runs": fragments, "server_ms": seconds * 1000})
+
+    interaction("Open the app", at.run)
+    interaction("Change a sidebar option", lambda: next(
+        c for c in at.sidebar.checkbox if c.label.startswith("🎲")).check().run())
+    interaction("Analyze, until triggers show", lambda: next(
+        b for b in at.sidebar.button if b.label.startswith("🧠")).click().run(),
+                until="approval", poll_origin="job_progress")
+    interaction("Pick another trigger", lambda: at.radio[0].set_value(at.radio[0].options[1]).run(),
+                origin="approval_step")
+    interaction("Generate, until the post shows", lambda: next(
+        b for b in at.button if b.label.startswith("✍️")).click().run(),
+                origin="approval_step", until="review", poll_origin="job_progress")
+    interaction("Publish", lambda: next(b for b in at.button if "PUBLISH" in b.label).click().run(),
+                origin="review_step")
+    if at.session_state.step != "done":
+        raise RuntimeError(f"publishing did not finish: {[e.value for e in at.error]}")
+    mock.stop()
+    return results
+
+
+def format_table(columns):
+    names = list(columns)
+    rows = {}
+    for name, results in columns.items():
+        for r in results:
+            rows.setdefault(r["interaction"], {})[name] = r
+    lines = [f"{'interaction':<32}" + "".join(f"{n:>30}" for n in names)]
+    for interaction, by_name in rows.items():
+        cells = []
+        for n in names:
+            r = by_name.get(n)
+            cells.append(f"{r['server_ms']:>10.0f} ms ({r['full_runs']} full, {r['fragment_runs']} frag)" if r else "")
+        lines.append(f"{interaction:<32}" + "".join(f"{c:>30}" for c in cells))
+    totals = {n: sum(r["server_ms"] for r in results) for n, results in columns.items()}
+    lines.append(f"{'total':<32}" + "".join(f"{totals[n]:>27.0f} ms" for n in names))
+    return "\n".join(lines)
+
+
+def measure_in_subprocess(app_path, latency_scale):
+    """
+    Every app gets a fresh interpreter: backend's singletons and Streamlit's caches live per process.
+    """
+    output = subprocess.run(
+        [sys.executable, __file__, "--app", app_path, "--latency-scale", str(latency_scale), "--json"],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--baseline", help="git revision whose app.py to measure alongside")
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="mock provider latency multiplier")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.json:
+        results = run_scenario(args.app, args.latency_scale)
+        sys.__stdout__.write(json.dumps(results) + "\n")
+        return
+
+    columns = {}
+    if args.baseline:
+        source = subprocess.run(["git", "show", f"{args.baseline}:app.py"], capture_output=True, text=True,
+                                check=True, cwd=ROOT).stdout
+        with tempfile.NamedTemporaryFile("w", suffix=".py", dir=ROOT, prefix=".bench_app_", delete=False) as f:
+            f.write(source)
+        try:
+            columns[args.baseline] = measure_in_subprocess(f.name, args.latency_scale)
+        finally:
+            os.remove(f.name)
+    columns[os.path.relpath(args.app, ROOT)] = measure_in_subprocess(args.app, args.latency_scale)
+    print()
+    print(format_table(columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Runs N auto-approved pipelines through async_backend.AsyncPipeline against the
+local mock OpenAI server and compares the wall time with the same pipelines
+run one after another.
+
+Usage:
+    python benchmarks/bench_async_pipeline.py --pipelines 12 --concurrency 6 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+from async_backend import AsyncPipeline, make_async_client
+from mock_openai import MockOpenAI
+
+LIVE_SIGNAL = {"temp": 31.5, "condition": "Haze", "aqi": 212, "holiday": "None", "top_event": "None"}
+
+
+async def run_all(pipeline, jobs):
+    results = []
+    async for result in pipeline.run_many(jobs):
+        results.append(result)
+    return results
+
+
+async def run_sequential(pipeline, jobs):
+    return [await pipeline.run(*job) for job in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pipelines", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock latency per call, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    args = parser.parse_args()
+
+    brands = backend.all_brands()
+    jobs = [
+        (backend.CITIES[i % len(backend.CITIES)], LIVE_SIGNAL,
+         backend.get_company_profile(brands[i % len(brands)]), True)
+        for i in range(args.pipelines)
+    ]
+
+    with MockOpenAI(latency=args.latency, error_rate=args.error_rate, seed=7) as mock:
+        # One client per event loop: its connection pool is bound to the loop that opened it
+        started = time.perf_counter()
+        client = make_async_client("mock-key", base_url=mock.base_url)
+        asyncio.run(run_sequential(AsyncPipeline(client, max_concurrency=1), jobs))
+        sequential = time.perf_counter() - started
+
+        client = make_async_client("mock-key", base_url=mock.base_url)
+        pipeline = AsyncPipeline(client, max_concurrency=args.concurrency)
+        started = time.perf_counter()
+        results = asyncio.run(run_all(pipeline, jobs))
+        overlapped = time.perf_counter() - started
+
+    failed = [r for r in results if "error" in r]
+    for r in failed:
+        print(f"FAILED {r['brand']} / {r['city']}: {r['error']}")
+    print()
+    print(f"{args.pipelines} pipelines x 4 calls, mock latency {args.latency}s, error rate {args.error_rate:.0%}")
+    print(f"sequential: {sequential:.2f}s")
+    print(f"async     : {overlapped:.2f}s (concurrency={args.concurrency}, "
+          f"{pipeline.retries} retries, {len(failed)} failed, {mock.errors_injected} errors injected)")
+    print(f"speedup   : {sequential / overlapped:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
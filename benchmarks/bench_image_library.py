@@ -0,0 +1,86 @@
+"""
+Image library lookups: latency by library size, and which paraphrased prompts
+are reused at each similarity threshold.
+    python benchmarks/bench_image_library.py
+    python benchmarks/bench_image_library.py --sizes 100 1000 5000 --lookups 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from image_library import ImageLibrary
+
+SUBJECTS = ["bowl of biryani", "pepperoni pizza", "plate of masala dosa", "glass of mango lassi", "paneer tikka platter",
+            "stack of pancakes", "thali with dal and rice", "box of assorted sweets", "cup of masala chai", "burger and fries"]
+SETTINGS = ["on a modern dining table", "in a warmly lit living room", "on a wooden picnic table in a sunny park",
+            "on a marble kitchen counter", "at a rooftop party with fairy lights", "on a cosy sofa with friends"]
+STYLES = ["A vibrant, top-down photorealistic shot of", "A close-up photorealistic photo of",
+          "A bright, editorial-style photograph of", "A photorealistic image of"]
+
+# (stored prompt, new prompt, should it be reused?)
+PARAPHRASES = [
+    ("A vibrant, top-down photorealistic shot of a steaming bowl of biryani on a modern dining table.",
+     "A vibrant top-down photorealistic shot of a steaming bowl of biryani on a dining table.", True),
+    ("A vibrant, top-down photorealistic shot of a steaming bowl of biryani on a modern dining table.",
+     "A top-down photorealistic shot of steaming biryani bowls on a modern dining table.", True),
+    ("A photorealistic image of a pepperoni pizza on a wooden picnic table in a sunny park.",
+     "A photorealistic image of a pepperoni pizza at a rooftop party with fairy lights.", False),
+    ("A close-up photorealistic photo of a cup of masala chai on a marble kitchen counter.",
+     "A close-up photorealistic photo of a glass of mango lassi on a marble kitchen counter.", False),
+]
+
+
+def synthetic_prompt(rng, subjects=SUBJECTS):
+    return f"{rng.choice(STYLES)} a {rng.choice(subjects)} {rng.choice(SETTINGS)}, number {rng.randint(1, 10 ** 6)}."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 3000])
+    parser.add_argument("--lookups", type=int, default=100)
+    args = parser.parse_args()
+    rng = random.Random(7)
+
+    print()
+    print(f"{'images/brand':>13}{'p50 lookup':>13}{'p95 lookup':>13}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            library = ImageLibrary(directory)
+            for _ in range(size):
+                library.add("ZOMATO", synthetic_prompt(rng), os.urandom(16))
+            library.find("ZOMATO", "warm-up")
+            samples = []
+            for _ in range(args.lookups):
+                query = synthetic_prompt(rng)
+                started = time.perf_counter()
+                library.find("ZOMATO", query)
+                samples.append(time.perf_counter() - started)
+            samples.sort()
+            print(f"{size:>13}{statistics.median(samples) * 1000:>11.1f}ms{samples[int(len(samples) * 0.95)] * 1000:>11.1f}ms")
+
+    print()
+    print(f"{'threshold':>10}  reused? (expected)")
+    with tempfile.TemporaryDirectory() as directory:
+        library = ImageLibrary(directory, max_reuse=10 ** 6)
+        for stored, _, _ in PARAPHRASES:
+            library.add("ZOMATO", stored, stored.encode())
+        # Filler images of other dishes, so a "reused" answer can only come from the stored prompt
+        others = [subject for subject in SUBJECTS if not any(subject in stored + query for stored, query, _ in PARAPHRASES)]
+        for _ in range(200):
+            library.add("ZOMATO", synthetic_prompt(rng, others), os.urandom(16))
+        for threshold in (0.6, 0.7, 0.8, 0.9):
+            decisions = []
+            for _, query, expected in PARAPHRASES:
+                match = library.find("ZOMATO", query, threshold=threshold)
+                decisions.append(f"{'Y' if match else 'n'}({'Y' if expected else 'n'})")
+            print(f"{threshold:>10}  {' '.join(decisions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Bytes and encode time of each image derivative, and cache hit vs miss.
+
+Uses a synthetic photo-like 1024px PNG (gradients, shapes and sensor-style
+noise, roughly the size of a DALL-E 3 PNG) and a 512px draft of it:
+    python benchmarks/bench_images.py
+    python benchmarks/bench_images.py --image path/to/dalle.png
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from image_derivatives import TARGETS, DerivativeCache
+
+
+def synthetic_png(size=1024, seed=7):
+    image = Image.linear_gradient("L").resize((size, size)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for i in range(40):
+        x, y, r = (seed * 97 * (i + 1)) % size, (seed * 57 * (i + 3)) % size, 20 + (i * 13) % 120
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=((i * 53) % 256, (i * 91) % 256, (i * 29) % 256))
+    image = image.filter(ImageFilter.GaussianBlur(6))
+    noise = Image.effect_noise((size, size), 18).convert("RGB")
+    image = Image.blend(image, noise, 0.12)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def downscale(image_bytes, side):
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        buffer = io.BytesIO()
+        image.resize((side, side), Image.LANCZOS).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def timed(func, rounds):
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--image", help="a PNG to use instead of the synthetic one")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+    if args.image:
+        with open(args.image, "rb") as f:
+            full = f.read()
+    else:
+        full = synthetic_png()
+    sources = {"full 1024px": full, "draft 512px": downscale(full, 512)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        print()
+        print(f"{'source':<14}{'target':<10}{'bytes':>10}{'vs PNG':>8}{'size':>11}{'miss':>9}{'hit':>9}")
+        for source_name, source in sources.items():
+            print(f"{source_name:<14}{'(PNG)':<10}{len(source) // 1024:>8} KB")
+            for name in TARGETS:
+                # A fresh cache per round so every round is a miss
+                miss = timed(lambda: DerivativeCache(os.path.join(directory, f"m{time.perf_counter_ns()}")).get(source, name),
+                             args.rounds)
+                cache = DerivativeCache(os.path.join(directory, "shared"))
+                derivative = cache.get(source, name)
+                hit = timed(lambda: cache.get(source, name), args.rounds)
+                print(f"{'':<14}{name:<10}{len(derivative.data) // 1024:>8} KB{len(derivative.data) / len(source):>8.0%}"
+                      f"{derivative.width:>6}x{derivative.height:<4}{miss * 1000:>7.0f}ms{hit * 1000:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
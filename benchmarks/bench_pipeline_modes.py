@@ -0,0 +1,141 @@
+"""
+Latency and token usage of the two-call creative path (Call 2 + Call 3) vs the
+fast single-call path, replayed from recorded fixtures.
+
+Replay (offline, no credits):
+    python benchmarks/bench_pipeline_modes.py --rounds 3 --speed 0.2
+Re-record the fixtures against the live API (uses OPENAI_API_KEY or secrets.toml):
+    python benchmarks/bench_pipeline_modes.py --record
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "pipeline_modes.json")
+MODES = ("two_call", "fast")
+
+
+def call_kind(request):
+    if request.get("response_format", {}).get("type") == "json_schema":
+        return "fast"
+    system = request["messages"][0]["content"]
+    return "image_prompt" if "creative director" in system else "creative"
+
+
+class ReplayClient:
+    """
+    Stands in for OpenAI(): replays recorded responses in order, sleeping for
+    their recorded latency (scaled by `speed`), and tallies token usage.
+    """
+    def __init__(self, recorded, speed=1.0):
+        self.recorded = list(recorded)
+        self.speed = speed
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        if not self.recorded:
+            raise Exception(f"No recorded response left for a {call_kind(request)} call")
+        entry = self.recorded.pop(0)
+        if entry["kind"] != call_kind(request):
+            raise Exception(f"Fixture mismatch: expected {entry['kind']}, got {call_kind(request)}")
+        time.sleep(entry["latency_s"] * self.speed)
+        self.calls += 1
+        self.prompt_tokens += entry["usage"]["prompt_tokens"]
+        self.completion_tokens += entry["usage"]["completion_tokens"]
+        message = SimpleNamespace(content=entry["content"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(**entry["usage"]))
+
+
+class RecordingClient:
+    """
+    Wraps a real OpenAI client and records every chat completion it makes.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.recorded = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        started = time.perf_counter()
+        response = self.client.chat.completions.create(**request)
+        self.recorded.append({
+            "kind": call_kind(request),
+            "latency_s": round(time.perf_counter() - started, 2),
+            "usage": {"prompt_tokens": response.usage.prompt_tokens,
+                      "completion_tokens": response.usage.completion_tokens},
+            "content": response.choices[0].message.content,
+        })
+        return response
+
+
+def run_mode(client, mode, case):
+    profile = backend.get_company_profile(case["brand"])
+    args = (case["city"], case["trigger"], case["tone"], case["live_signal"], profile)
+    # Skip the LLM response cache: every round must hit the (replayed) API
+    if mode == "fast":
+        backend.generate_creative_package_fast(client, *args, use_cache=False)
+    else:
+        post_text = backend.generate_creative_assets(client, *args, use_cache=False)[0]
+        backend.generate_safe_image_prompt(client, post_text, profile)
+
+
+def record(fixtures):
+    from openai import OpenAI
+    openai_client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY") or backend.load_keys()["OPENAI_API_KEY"])
+    for case in fixtures["cases"]:
+        for mode in MODES:
+            client = RecordingClient(openai_client)
+            run_mode(client, mode, case)
+            case[mode] = client.recorded
+    with open(FIXTURES, "w", encoding="utf-8") as f:
+        json.dump(fixtures, f, indent=2, ensure_ascii=False)
+    print(f"Recorded {len(fixtures['cases'])} cases to {FIXTURES}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--speed", type=float, default=1.0, help="scale recorded latencies (0.1 = 10x faster)")
+    parser.add_argument("--record", action="store_true", help="re-record fixtures against the live API")
+    args = parser.parse_args()
+
+    with open(FIXTURES, encoding="utf-8") as f:
+        fixtures = json.load(f)
+    if args.record:
+        record(fixtures)
+        return
+
+    stats = {mode: {"latency": [], "calls": [], "prompt": [], "completion": []} for mode in MODES}
+    for _ in range(args.rounds):
+        for case in fixtures["cases"]:
+            for mode in MODES:
+                client = ReplayClient(case[mode], speed=args.speed)
+                started = time.perf_counter()
+                run_mode(client, mode, case)
+                stats[mode]["latency"].append((time.perf_counter() - started) / args.speed)
+                stats[mode]["calls"].append(client.calls)
+                stats[mode]["prompt"].append(client.prompt_tokens)
+                stats[mode]["completion"].append(client.completion_tokens)
+
+    print()
+    print(f"{len(fixtures['cases'])} recorded cases x {args.rounds} rounds (latency rescaled to recorded time)")
+    print(f"{'mode':<10}{'p50 latency':>13}{'mean latency':>14}{'calls/post':>12}{'prompt tok':>12}{'compl. tok':>12}")
+    for mode in MODES:
+        s = stats[mode]
+        print(f"{mode:<10}{statistics.median(s['latency']):>12.2f}s{statistics.mean(s['latency']):>13.2f}s"
+              f"{statistics.mean(s['calls']):>12.2f}{statistics.mean(s['prompt']):>12.0f}{statistics.mean(s['completion']):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Rate limiter: cost of one acquire, and whether several processes together stay
+inside one bucket and one daily quota.
+    python benchmarks/bench_rate_limiter.py
+    python benchmarks/bench_rate_limiter.py --processes 8 --seconds 5 --per-minute 600
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter
+from rate_limiter import Rate, RateLimited, RateLimiter, Tier
+
+
+def define_tier(per_minute, burst, daily):
+    rate_limiter.TIERS["bench"] = {"test": Tier(daily=daily, endpoints={"call": Rate(per_minute, burst)})}
+
+
+def worker(db_path, per_minute, burst, daily, seconds, results):
+    sys.stdout = open(os.devnull, "w")  # one log line per queued call is too much here
+    define_tier(per_minute, burst, daily)
+    limiter = RateLimiter(db_path, {"bench": "test"})
+    allowed = rejected = 0
+    stop = time.time() + seconds
+    while time.time() < stop:
+        try:
+            limiter.acquire("bench", "call", "key", max_wait=0.5)
+            allowed += 1
+        except RateLimited as e:
+            rejected += 1
+            if e.reason == "quota":
+                break
+    results.put((allowed, rejected, limiter.stats()["waited_s"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--per-minute", type=int, default=1200)
+    parser.add_argument("--burst", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        define_tier(10 ** 9, 10 ** 9, None)
+        limiter = RateLimiter(os.path.join(directory, "overhead.db"), {"bench": "test"})
+        samples = []
+        for _ in range(500):
+            started = time.perf_counter()
+            limiter.acquire("bench", "call", "key")
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        print()
+        print(f"acquire(): p50 {statistics.median(samples) * 1000:.2f} ms, p95 {samples[474] * 1000:.2f} ms")
+
+        for daily in (None, 50):
+            db_path = os.path.join(directory, f"shared-{daily}.db")
+            results = multiprocessing.Queue()
+            processes = [multiprocessing.Process(target=worker, args=(db_path, args.per_minute, args.burst, daily,
+                                                                      args.seconds, results))
+                         for _ in range(args.processes)]
+            started = time.time()
+            for process in processes:
+                process.start()
+            totals = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            elapsed = time.time() - started
+            allowed = sum(t[0] for t in totals)
+            expected = args.burst + args.per_minute / 60 * elapsed if daily is None else daily
+            print(f"{args.processes} processes, {args.per_minute}/min burst {args.burst}, daily {daily or 'none'}: "
+                  f"{allowed} calls allowed in {elapsed:.1f}s (at most {expected:.0f}), "
+                  f"per process {[t[0] for t in totals]}, {sum(t[1] for t in totals)} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compares sequential, parallel and warm-cache wall time of
+backend.fetch_live_signals against local stub servers that simulate each
+provider's latency, then refreshes every registry city once per city and once
+through backend.fetch_signals_bulk, counting the HTTP calls each needs.
+
+Usage:
+    python benchmarks/bench_signals.py --rounds 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+from holiday_index import HolidayIndex
+from signal_cache import SignalCache
+from stub_server import StubServer
+
+
+
+def weather_group(request):
+    ids = [int(i) for i in request.get("id", "").split(",") if i]
+    return {"cnt": len(ids), "list": [{"id": i, "main": {"temp": 31.5}, "weather": [{"main": "Haze"}]} for i in ids]}
+
+
+def news(request):
+    names = [c.strip('"') for c in request.get("q", "").split(") AND")[0].lstrip("(").split(" OR ")]
+    return {"articles": [{"title": f"{name}: India vs Australia at Wankhede"} for name in names]}
+
+
+STUB_ROUTES = {
+    "/weather": (0.25, {"main": {"temp": 31.5}, "weather": [{"main": "Haze"}]}),
+    "/weather_group": (0.30, weather_group),
+    "/aqi": (0.40, {"data": {"current": {"pollution": {"aqius": 212}}}}),
+    "/holiday": (0.30, {"response": {"holidays": [
+        {"name": "Diwali", "date": {"iso": backend.city_registry.get("Delhi").today().isoformat()}, "states": "All"}
+    ]}}),
+    "/news": (0.35, news),
+}
+STUB_KEYS = {
+    "OPENWEATHER_API_KEY": "stub", "IQAIR_API_KEY": "stub",
+    "CALENDARIFIC_API_KEY": "stub", "NEWS_API_KEY": "stub",
+}
+
+
+def time_fetch(city, parallel, rounds, use_cache=False):
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        backend.fetch_live_signals(STUB_KEYS, city, parallel=parallel, use_cache=use_cache, use_snapshot=False)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def time_refresh_all(server, bulk):
+    """
+    Wall time and HTTP calls to refresh every registry city, cold (no cache).
+    """
+    calls_before = server.request_count
+    started = time.perf_counter()
+    if bulk:
+        backend.fetch_signals_bulk(STUB_KEYS, use_cache=False, use_snapshot=False)
+    else:
+        for city in backend.CITIES:
+            backend.fetch_live_signals(STUB_KEYS, city, use_cache=False, use_snapshot=False)
+    return time.perf_counter() - started, server.request_count - calls_before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--city", default="Delhi")
+    args = parser.parse_args()
+
+    # In-memory only, so the benchmark never touches the real on-disk caches
+    backend.signal_cache = SignalCache()
+    backend.holiday_index = HolidayIndex(backend._download_holiday_year)
+
+    with StubServer(STUB_ROUTES) as server:
+        for provider in backend.SIGNAL_ENDPOINTS:
+            backend.SIGNAL_ENDPOINTS[provider] = f"{server.url}/{provider}"
+
+        sequential = time_fetch(args.city, False, args.rounds)
+        parallel = time_fetch(args.city, True, args.rounds)
+        time_fetch(args.city, True, 1, use_cache=True)  # warm the cache
+        cached = time_fetch(args.city, True, args.rounds, use_cache=True)
+        per_city = time_refresh_all(server, bulk=False)
+        bulk = time_refresh_all(server, bulk=True)
+
+    print()
+    latencies = ", ".join(f"{path.lstrip('/')}={delay:.2f}s" for path, (delay, _) in STUB_ROUTES.items())
+    print(f"Simulated provider latency: {latencies}")
+    for label, timings in (("sequential", sequential), ("parallel", parallel), ("cached", cached)):
+        print(f"{label:>10}: median {statistics.median(timings):.3f}s  "
+              f"min {min(timings):.3f}s  max {max(timings):.3f}s  ({args.rounds} rounds)")
+    print(f"   speedup: {statistics.median(sequential) / statistics.median(parallel):.2f}x")
+    print()
+    print(f"Refreshing all {len(backend.CITIES)} cities:")
+    for label, (wall, calls) in (("per-city", per_city), ("bulk", bulk)):
+        print(f"{label:>10}: {wall:.3f}s, {calls} HTTP calls")
+
+
+if __name__ == "__main__":
+    main()
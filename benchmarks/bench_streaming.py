@@ -0,0 +1,71 @@
+"""
+Time-to-first-content and end-to-end time of the generate job with and without
+streaming, against the local mock OpenAI server (which streams the creative
+reply a few characters at a time).
+
+Usage:
+    python benchmarks/bench_streaming.py --rounds 3 --token-delay 0.03
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEOPULSE_DATA_DIR", tempfile.mkdtemp(prefix="geopulse-bench-"))
+
+from openai import OpenAI
+
+import backend
+import jobs
+from mock_openai import MockOpenAI
+
+LIVE_SIGNAL = {"temp": 31.5, "condition": "Haze", "aqi": 212, "holiday": "None", "top_event": "None"}
+
+
+def run_once(client, stream):
+    """
+    Returns (seconds until any post_text is visible, seconds until the job is done).
+    """
+    job = {"payload": {
+        "city": "Delhi", "trigger": "Hazy Day", "tone": "Cozy and relaxed", "live_signals": LIVE_SIGNAL,
+        "company_profile": backend.get_company_profile(backend.all_brands()[0]),
+        "stream": stream, "use_cache": False,
+    }}
+    started = time.perf_counter()
+    first_content = []
+
+    def report_progress(progress):
+        if progress.get("post_text") and not first_content:
+            first_content.append(time.perf_counter() - started)
+
+    jobs.handle_generate(job, {"openai_client": client}, report_progress)
+    total = time.perf_counter() - started
+    return (first_content[0] if first_content else total), total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock time to first byte per call, seconds")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="mock delay per streamed chunk, seconds")
+    args = parser.parse_args()
+
+    with MockOpenAI(latency=args.latency, token_delay=args.token_delay) as mock:
+        client = OpenAI(api_key="mock-key", base_url=mock.base_url)
+        rows = {}
+        for label, stream in (("blocking", False), ("streaming", True)):
+            runs = [run_once(client, stream) for _ in range(args.rounds)]
+            rows[label] = (statistics.median(r[0] for r in runs), statistics.median(r[1] for r in runs))
+
+    print()
+    print(f"mock latency {args.latency}s, {args.token_delay}s per streamed chunk, median of {args.rounds}")
+    print(f"{'mode':<10} {'first post_text':>16} {'job done':>10}")
+    for label, (first, total) in rows.items():
+        print(f"{label:<10} {first:>15.2f}s {total:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
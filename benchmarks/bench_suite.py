@@ -0,0 +1,188 @@
+"""
+End-to-end benchmark of every pipeline stage against benchmarks/mock_server.py:
+signals, the three GPT-4o calls, the DALL-E image and both publishers, run
+single-shot and as N concurrent pipelines. Reports p50/p95/p99 latency and
+throughput per stage; --json saves the numbers and --compare diffs them
+against a saved run, so regressions show up as percentages.
+
+Usage:
+    python benchmarks/bench_suite.py --pipelines 24 --concurrency 8 --latency-scale 0.1
+    python benchmarks/bench_suite.py --json before.json
+    python benchmarks/bench_suite.py --compare before.json
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep traces and caches away from the real .geopulse directory
+os.environ.setdefault("GEOPULSE_DATA_DIR", tempfile.mkdtemp(prefix="geopulse-bench-"))
+
+from openai import OpenAI
+
+import backend
+import publishers
+from holiday_index import HolidayIndex
+from llm_cache import LLMResponseCache
+from mock_server import MockProviders, parse_error_rates
+from signal_cache import SignalCache
+
+STAGES = ["signals", "strategist", "creative", "image_prompt", "image", "telegram", "discord", "pipeline"]
+REGRESSION_THRESHOLD = 0.10  # flag p50/p95 slowdowns above 10%
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def run_pipeline(client, keys, brand, city):
+    """
+    One auto-approved pipeline (top trigger, no caches). Returns ({stage: seconds}, error or None).
+    A failing stage ends the pipeline; the stages before it still count.
+    """
+    timings = {}
+    started_pipeline = time.perf_counter()
+
+    def timed(stage, fn, *args, **kwargs):
+        started = time.perf_counter()
+        result = fn(*args, **kwargs)
+        timings[stage] = time.perf_counter() - started
+        return result
+
+    try:
+        profile = backend.get_company_profile(brand)
+        signals = timed("signals", backend.fetch_live_signals, keys, city, use_cache=False, use_snapshot=False)
+        triggers = timed("strategist", backend.get_dynamic_triggers_and_tone, client, signals, profile, use_cache=False)
+        if not triggers:
+            raise Exception("AI Strategist found no brand-safe triggers.")
+        post_text, hashtags, *_ = timed(
+            "creative", backend.generate_creative_assets, client, city,
+            triggers[0]["trigger"], triggers[0]["tone"], signals, profile, use_cache=False
+        )
+        image_prompt = timed("image_prompt", backend.generate_safe_image_prompt, client, post_text, profile, use_cache=False)
+        image_bytes = timed("image", backend.generate_image_with_dalle, client, image_prompt)
+        for channel in ("telegram", "discord"):
+            result = timed(channel, publishers.publish_one, channel, keys, post_text, image_bytes, hashtags,
+                           base_delay=0.05, max_delay=1.0)
+            if not result.ok:
+                raise Exception(f"{channel}: {result.message}")
+    except Exception as e:
+        return timings, str(e)
+    timings["pipeline"] = time.perf_counter() - started_pipeline
+    return timings, None
+
+
+def run_mode(client, keys, pairs, concurrency):
+    """
+    Runs the pairs with `concurrency` pipelines in flight and summarises each stage.
+    """
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(lambda pair: run_pipeline(client, keys, *pair), pairs))
+    wall = time.perf_counter() - started
+
+    summary = {"wall_s": round(wall, 3), "pipelines": len(pairs), "concurrency": concurrency,
+               "failed": sum(1 for _, error in outcomes if error), "stages": {}}
+    for stage in STAGES:
+        samples = [timings[stage] for timings, _ in outcomes if stage in timings]
+        if not samples:
+            continue
+        summary["stages"][stage] = {
+            "n": len(samples),
+            "p50": round(percentile(samples, 50), 4),
+            "p95": round(percentile(samples, 95), 4),
+            "p99": round(percentile(samples, 99), 4),
+            "mean": round(sum(samples) / len(samples), 4),
+            "per_s": round(len(samples) / wall, 2),
+        }
+    for _, error in outcomes:
+        if error:
+            print(f"[Bench] pipeline failed: {error}")
+    return summary
+
+
+def print_summary(label, summary):
+    print()
+    print(f"== {label}: {summary['pipelines']} pipelines, concurrency {summary['concurrency']}, "
+          f"wall {summary['wall_s']:.2f}s, {summary['failed']} failed ==")
+    print(f"{'stage':<13} {'n':>4} {'p50':>8} {'p95':>8} {'p99':>8} {'mean':>8} {'ops/s':>7}")
+    for stage, row in summary["stages"].items():
+        print(f"{stage:<13} {row['n']:>4} {row['p50']:>7.3f}s {row['p95']:>7.3f}s {row['p99']:>7.3f}s "
+              f"{row['mean']:>7.3f}s {row['per_s']:>7.2f}")
+
+
+def print_comparison(results, baseline):
+    print()
+    print(f"== vs baseline (⚠️ = more than {REGRESSION_THRESHOLD:.0%} slower) ==")
+    for mode, summary in results["modes"].items():
+        before_mode = baseline.get("modes", {}).get(mode)
+        if not before_mode:
+            continue
+        for stage, row in summary["stages"].items():
+            before = before_mode["stages"].get(stage)
+            if not before:
+                continue
+            deltas = []
+            for metric in ("p50", "p95"):
+                change = (row[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+                flag = " ⚠️" if change > REGRESSION_THRESHOLD else ""
+                deltas.append(f"{metric} {before[metric]:.3f}s -> {row[metric]:.3f}s ({change:+.0%}){flag}")
+            print(f"{mode:<10} {stage:<13} " + "   ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--single", type=int, default=5, help="pipelines run one at a time")
+    parser.add_argument("--pipelines", type=int, default=24, help="pipelines in the concurrent run")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-scale", type=float, default=0.1, help="multiplier on the recorded provider latencies")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="error rate for every provider")
+    parser.add_argument("--errors", help="per-provider error rates, e.g. weather=0.2,chat=0.05")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="a previous --json file to diff against")
+    args = parser.parse_args()
+
+    # Fresh in-memory caches: every stage must hit the (mock) provider
+    backend.signal_cache = SignalCache()
+    backend.llm_cache = LLMResponseCache()
+    backend.holiday_index = HolidayIndex(backend._download_holiday_year)
+
+    brands, cities = backend.all_brands(), backend.CITIES
+    pairs = [(brands[i % len(brands)], cities[i % len(cities)]) for i in range(max(args.single, args.pipelines))]
+    with MockProviders(args.latency_scale, args.jitter, args.error_rate, parse_error_rates(args.errors),
+                       seed=args.seed) as mock:
+        keys = mock.install()
+        client = OpenAI(api_key="mock", base_url=mock.openai_base_url)
+        results = {
+            "config": {k: v for k, v in vars(args).items() if k not in ("json", "compare")},
+            "modes": {
+                "single": run_mode(client, keys, pairs[:args.single], 1),
+                "concurrent": run_mode(client, keys, pairs[:args.pipelines], args.concurrency),
+            },
+        }
+        results["errors_injected"] = mock.errors_injected
+
+    print_summary("single-shot", results["modes"]["single"])
+    print_summary("concurrent", results["modes"]["concurrent"])
+    if any(results["errors_injected"].values()):
+        print(f"\nerrors injected: {results['errors_injected']}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nSaved results to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
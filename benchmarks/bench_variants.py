@@ -0,0 +1,99 @@
+"""
+N creative variants: N separate Call 2 requests vs one variants request, and
+the cost of ranking the candidates locally.
+
+The model's latency is simulated as time-to-first-token plus a per-token
+decode time (defaults are typical GPT-4o figures), with token counts taken
+from the actual prompts and the mock's replies (~4 characters per token):
+    python benchmarks/bench_variants.py --variants 4
+    python benchmarks/bench_variants.py --variants 4 --ttft 0.5 --token-s 0.012
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+from creative_ranker import rank_variants
+from mock_openai import pick_reply
+
+LIVE_SIGNAL = {"temp": 31.5, "condition": "Haze", "aqi": 212, "holiday": "Diwali",
+               "top_event": "India vs Australia: Wankhede sold out for series decider"}
+
+
+def tokens(text):
+    return max(1, len(text) // 4)
+
+
+class SimulatedClient:
+    """
+    Stands in for OpenAI(): answers with the mock's canned replies after
+    ttft + completion_tokens * token_s seconds (scaled by speed).
+    """
+    def __init__(self, ttft, token_s, speed):
+        self.ttft = ttft
+        self.token_s = token_s
+        self.speed = speed
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.simulated_s = 0.0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **request):
+        content = pick_reply(request["messages"])
+        usage = SimpleNamespace(prompt_tokens=sum(tokens(m["content"]) for m in request["messages"]),
+                                completion_tokens=tokens(content), total_tokens=0)
+        latency = self.ttft + usage.completion_tokens * self.token_s
+        time.sleep(latency * self.speed)
+        self.calls += 1
+        self.simulated_s += latency
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        message = SimpleNamespace(content=content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--variants", type=int, default=4)
+    parser.add_argument("--brand", default="zomato")
+    parser.add_argument("--ttft", type=float, default=0.6, help="simulated time to first token, seconds")
+    parser.add_argument("--token-s", type=float, default=0.015, help="simulated seconds per completion token")
+    parser.add_argument("--speed", type=float, default=0.1, help="scale the simulated sleeps (wall time only)")
+    parser.add_argument("--rank-rounds", type=int, default=2000)
+    args = parser.parse_args()
+    profile = backend.get_company_profile(args.brand)
+    call = ("Delhi", "Hazy Day", "Cozy and relaxed", LIVE_SIGNAL, profile)
+
+    separate = SimulatedClient(args.ttft, args.token_s, args.speed)
+    for _ in range(args.variants):
+        backend.generate_creative_assets(separate, *call, use_cache=False)
+    batched = SimulatedClient(args.ttft, args.token_s, args.speed)
+    ranked = backend.generate_creative_variants(batched, *call, n=args.variants, use_cache=False)
+
+    variants = [{key: v[key] for key in backend.CREATIVE_KEYS} for v in ranked]
+    recent = [v["post_text"] for v in variants[:1]] * 50
+    timings = []
+    for _ in range(args.rank_rounds):
+        started = time.perf_counter()
+        rank_variants(variants, profile, recent)
+        timings.append(time.perf_counter() - started)
+
+    print()
+    print(f"{args.variants} variants, simulated {args.ttft}s TTFT + {args.token_s * 1000:.0f} ms/token")
+    print(f"{'mode':<12}{'calls':>7}{'latency':>10}{'prompt tok':>12}{'compl. tok':>12}")
+    for name, client in (("separate", separate), ("variants", batched)):
+        print(f"{name:<12}{client.calls:>7}{client.simulated_s:>9.2f}s{client.prompt_tokens:>12}{client.completion_tokens:>12}")
+    print(f"ranking {len(variants)} candidates against 50 recent posts: "
+          f"p50 {statistics.median(timings) * 1e6:.0f} µs, max {max(timings) * 1e6:.0f} µs")
+    print("ranked:", json.dumps([(v["rank"], v["score"], v["issues"]) for v in ranked], ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
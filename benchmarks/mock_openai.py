@@ -0,0 +1,186 @@
+"""
+Minimal OpenAI-compatible mock (chat completions, incl. stream=True, + image
+generations) for exercising the pipelines offline. Replies are picked from the system prompt,
+so Calls 1-3 each get a response of the shape backend.py expects.
+
+Usage as a server:
+    python benchmarks/mock_openai.py --port 8080 --latency 0.5 --error-rate 0.1
+then point a client at base_url="http://127.0.0.1:8080/v1".
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+
+from stub_server import StubServer
+
+# 1x1 transparent PNG
+TINY_PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAQAAAC1HAwCAAAAC0lEQVR42mNkYAAAAAYAAjCB0C8AAAAASUVORK5CYII="
+)
+
+STRATEGIST_REPLY = {"triggers": [
+    {"trigger": "Hazy Day", "tone": "Cozy and relaxed", "reasoning": "Low-priority ambient trigger."}
+]}
+CREATIVE_REPLY = {
+    "post_text": "Haze outside, biryani inside. Stay cozy, we'll bring the flavour! 🍛",
+    "hashtags": ["#StayIn", "#BiryaniTime", "#Zomato"],
+    "target_audience": ["Young professionals", "Families ordering in"],
+    "predicted_impact_rating": "High",
+    "predicted_impact_reasoning": "Timely comfort-food hook for a day spent indoors.",
+}
+STREAM_CHUNK_CHARS = 8  # characters per streamed delta, roughly two tokens
+# Variants mode: distinct takes, one near-duplicate of the first and one with broken hashtags,
+# so the local ranker has something to do
+VARIANT_REPLIES = [
+    CREATIVE_REPLY,
+    {**CREATIVE_REPLY, "post_text": "Match night sorted: pizza for the whole gang, delivered before the first ball. 🍕🏏",
+     "hashtags": ["#MatchNight", "#PizzaParty", "#Zomato"]},
+    {**CREATIVE_REPLY, "post_text": "Haze outside, biryani inside. Stay cozy, we'll bring the flavor! 🍛"},
+    {**CREATIVE_REPLY, "post_text": "Diwali dinner, zero dishes. Restaurant deals on everything you're craving. 🪔",
+     "hashtags": ["#Diwali", "Deals", "#Diwali"]},
+]
+IMAGE_PROMPT_REPLY = "A vibrant, top-down photorealistic shot of a steaming bowl of biryani on a modern dining table."
+
+
+def pick_reply(messages):
+    """
+    Chooses the canned reply for a chat request from its system prompt.
+    """
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    if "marketing strategist for a" in system:
+        return json.dumps(STRATEGIST_REPLY)
+    if '"variants"' in system:
+        user = next((m["content"] for m in messages if m["role"] == "user"), "")
+        match = re.search(r"\*\*Variants:\*\* (\d+)", user)
+        n = int(match.group(1)) if match else 3
+        return json.dumps({"variants": [VARIANT_REPLIES[i % len(VARIANT_REPLIES)] for i in range(n)]})
+    if "`image_prompt`" in system:  # fast pipeline: creative package and image prompt in one reply
+        return json.dumps({**CREATIVE_REPLY, "image_prompt": IMAGE_PROMPT_REPLY})
+    if "creative director" in system:
+        return IMAGE_PROMPT_REPLY
+    return json.dumps(CREATIVE_REPLY)
+
+
+def _usage(request, content):
+    prompt_tokens = sum(len(m["content"]) for m in request.get("messages", [])) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4}
+
+
+def chat_completion_body(request, content):
+    return {
+        "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+        "model": request.get("model", "gpt-4o"),
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": _usage(request, content),
+    }
+
+
+def stream_chat_events(request, content, token_delay=0.0, chunk_chars=STREAM_CHUNK_CHARS):
+    """
+    Replays content as chat.completion.chunk SSE events, chunk_chars at a time,
+    sleeping token_delay between chunks to mimic generation speed.
+    """
+    def chunk(delta, finish_reason=None):
+        return "data: " + json.dumps({
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }) + "\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    for start in range(0, len(content), chunk_chars):
+        time.sleep(token_delay)
+        yield chunk({"content": content[start:start + chunk_chars]})
+    yield chunk({}, "stop")
+    if request.get("stream_options", {}).get("include_usage"):
+        yield "data: " + json.dumps({
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"), "choices": [], "usage": _usage(request, content),
+        }) + "\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def image_body():
+    return {"created": int(time.time()), "data": [{"b64_json": base64.b64encode(TINY_PNG).decode()}]}
+
+
+class MockOpenAI:
+    def __init__(self, latency=0.2, image_latency=None, error_rate=0.0, seed=None, port=0, token_delay=0.0):
+        self.error_rate = error_rate
+        self.token_delay = token_delay
+        self.errors_injected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.server = StubServer({
+            "/v1/chat/completions": (latency, self._chat),
+            "/v1/images/generations": (latency if image_latency is None else image_latency, self._image),
+        }, port=port)
+
+    @property
+    def base_url(self):
+        return f"{self.server.url}/v1"
+
+    def _maybe_fail(self):
+        with self._lock:
+            if self._random.random() >= self.error_rate:
+                return None
+            self.errors_injected += 1
+        return 429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}}, {"Retry-After": "0.05"}
+
+    def _chat(self, request):
+        failure = self._maybe_fail()
+        if failure:
+            return failure
+        content = pick_reply(request.get("messages", []))
+        if request.get("stream"):
+            return self._stream_chat(request, content)
+        # A non-streamed reply still takes as long to generate as a streamed one
+        time.sleep(self.token_delay * -(-len(content) // STREAM_CHUNK_CHARS))
+        return chat_completion_body(request, content)
+
+    def _stream_chat(self, request, content):
+        return stream_chat_events(request, content, self.token_delay)
+
+    def _image(self, request):
+        failure = self._maybe_fail()
+        if failure:
+            return failure
+        return image_body()
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible mock server.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    with MockOpenAI(latency=args.latency, error_rate=args.error_rate, port=args.port) as mock:
+        print(f"Mock OpenAI listening on {mock.base_url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Offline mock of every provider GeoPulse calls: OpenWeather, IQAir,
+Calendarific, NewsAPI, OpenAI (chat, incl. streaming, and images), Telegram
+and Discord, all on one local port.
+
+Responses are replayed from fixtures/providers.json (OpenAI replies come from
+mock_openai.pick_reply). Each provider gets its recorded median latency times
+latency_scale, with log-normal jitter so the tail percentiles mean something,
+and its own injected error rate (503 for the signal APIs, 429 + retry hint for
+OpenAI and the publishers).
+
+Usage as a server:
+    python benchmarks/mock_server.py --port 8090 --latency-scale 0.2 --error-rate 0.05
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from mock_openai import chat_completion_body, image_body, pick_reply, stream_chat_events
+from stub_server import StubServer
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "providers.json")
+PROVIDERS = ("weather", "weather_group", "aqi", "holiday", "news", "chat", "image", "telegram", "discord")
+# Providers replayed from another provider's fixture
+FIXTURE_OF = {"weather_group": "weather"}
+MOCK_KEYS = {
+    "OPENWEATHER_API_KEY": "mock", "IQAIR_API_KEY": "mock", "CALENDARIFIC_API_KEY": "mock",
+    "NEWS_API_KEY": "mock", "OPENAI_API_KEY": "mock", "TELEGRAM_BOT_TOKEN": "mock", "TELEGRAM_CHAT_ID": "-1001234567890",
+}
+RETRY_HINT_S = 0.05
+
+
+class MockProviders:
+    def __init__(self, latency_scale=1.0, jitter=0.25, error_rate=0.0, error_rates=None,
+                 token_delay=0.0, seed=None, port=0, fixtures_path=FIXTURES):
+        with open(fixtures_path, encoding="utf-8") as f:
+            self.fixtures = json.load(f)
+        holidays = self.fixtures["holiday"]["body"]["response"]["holidays"]
+        if holidays:
+            # Holidays are looked up by the city's local date, and every bundled city is on IST
+            holidays[0]["date"]["iso"] = datetime.now(ZoneInfo("Asia/Kolkata")).date().isoformat()
+        self.latency_scale = latency_scale
+        self.jitter = jitter
+        self.error_rates = {provider: error_rate for provider in PROVIDERS}
+        self.error_rates.update(error_rates or {})
+        self.token_delay = token_delay
+        self.requests = {provider: 0 for provider in PROVIDERS}
+        self.errors_injected = {provider: 0 for provider in PROVIDERS}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        routes = {f"/{provider}": (0, self._handler(provider)) for provider in ("weather", "weather_group", "aqi", "holiday", "news")}
+        routes.update({
+            "/v1/chat/completions": (0, self._handler("chat")),
+            "/v1/images/generations": (0, self._handler("image")),
+            f"/bot{MOCK_KEYS['TELEGRAM_BOT_TOKEN']}/sendPhoto": (0, self._handler("telegram")),
+            "/discord/webhook": (0, self._handler("discord")),
+        })
+        self.server = StubServer(routes, port=port)
+
+    # --- Endpoints, for pointing the app at the mock ---
+    @property
+    def url(self):
+        return self.server.url
+
+    @property
+    def openai_base_url(self):
+        return f"{self.url}/v1"
+
+    @property
+    def keys(self):
+        return {**MOCK_KEYS, "DISCORD_WEBHOOK_URL": f"{self.url}/discord/webhook"}
+
+    def install(self):
+        """
+        Points backend's signal endpoints and the Telegram API base at this mock.
+        Returns the API keys to use with it.
+        """
+        import backend
+        import publishers
+        for provider in backend.SIGNAL_ENDPOINTS:
+            backend.SIGNAL_ENDPOINTS[provider] = f"{self.url}/{provider}"
+        publishers.TELEGRAM_API_BASE = self.url
+        return self.keys
+
+    # --- Replies ---
+    def _handler(self, provider):
+        def handle(request):
+            with self._lock:
+                self.requests[provider] += 1
+                delay = self.fixtures[FIXTURE_OF.get(provider, provider)]["latency_s"] * self.latency_scale
+                delay *= self._random.lognormvariate(0, self.jitter) if self.jitter else 1.0
+                failed = self._random.random() < self.error_rates[provider]
+                if failed:
+                    self.errors_injected[provider] += 1
+            time.sleep(delay)
+            if failed:
+                return self._failure(provider)
+            if provider == "chat":
+                content = pick_reply(request.get("messages", []))
+                if request.get("stream"):
+                    return stream_chat_events(request, content, self.token_delay)
+                return chat_completion_body(request, content)
+            if provider == "image":
+                return image_body()
+            if provider == "weather_group":
+                return self._weather_group(request)
+            if provider == "news":
+                return self._news(request)
+            return copy.deepcopy(self.fixtures[provider]["body"])
+        return handle
+
+    def _weather_group(self, request):
+        """
+        OpenWeather /group: the weather fixture once per requested city id.
+        """
+        items = []
+        for city_id in filter(None, request.get("id", "").split(",")):
+            item = copy.deepcopy(self.fixtures["weather"]["body"])
+            item["id"] = int(city_id)
+            items.append(item)
+        return {"cnt": len(items), "list": items}
+
+    def _news(self, request):
+        """
+        The news fixture; an OR-query over several cities gets one article per city.
+        """
+        body = copy.deepcopy(self.fixtures["news"]["body"])
+        match = re.match(r"\((.*?)\) AND", request.get("q", ""))
+        if match and " OR " in match.group(1):
+            article = body["articles"][0]
+            body["articles"] = [dict(article, title=f"{city.strip(chr(34))}: {article['title']}")
+                                for city in match.group(1).split(" OR ")]
+            body["totalResults"] = len(body["articles"])
+        return body
+
+    def _failure(self, provider):
+        if provider in ("chat", "image"):
+            return 429, {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_exceeded"}}, {"Retry-After": str(RETRY_HINT_S)}
+        if provider == "telegram":
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests (mock)",
+                         "parameters": {"retry_after": RETRY_HINT_S}}, {}
+        if provider == "discord":
+            return 429, {"message": "You are being rate limited (mock).", "retry_after": RETRY_HINT_S, "global": False}, {}
+        return 503, {"error": "Service unavailable (mock)"}, {}
+
+    def start(self):
+        self.server.start()
+        return self
+
+    def stop(self):
+        self.server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def parse_error_rates(spec):
+    """
+    "weather=0.2,chat=0.05" -> {"weather": 0.2, "chat": 0.05}
+    """
+    rates = {}
+    for item in filter(None, (spec or "").split(",")):
+        provider, _, rate = item.partition("=")
+        if provider not in PROVIDERS:
+            raise ValueError(f"unknown provider '{provider}', expected one of {', '.join(PROVIDERS)}")
+        rates[provider] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local mock of every GeoPulse provider.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiplier on the recorded latencies")
+    parser.add_argument("--jitter", type=float, default=0.25, help="sigma of the log-normal latency jitter")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="error rate for every provider")
+    parser.add_argument("--errors", help="per-provider error rates, e.g. weather=0.2,chat=0.05")
+    args = parser.parse_args()
+    with MockProviders(args.latency_scale, args.jitter, args.error_rate, parse_error_rates(args.errors), port=args.port) as mock:
+        print(f"Mock providers listening on {mock.url} (Ctrl+C to stop)")
+        print(f"  OpenAI base_url : {mock.openai_base_url}")
+        print(f"  signal endpoints: {mock.url}/weather, /weather_group, /aqi, /holiday, /news")
+        print(f"  Telegram base   : {mock.url}")
+        print(f"  Discord webhook : {mock.keys['DISCORD_WEBHOOK_URL']}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
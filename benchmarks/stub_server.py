@@ -0,0 +1,105 @@
+"""
+Tiny threaded HTTP stub server used by the benchmarks.
+Each route replays a canned JSON body after an artificial delay, so provider
+latency can be simulated without touching the real APIs.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+
+class StubServer:
+    def __init__(self, routes, host="127.0.0.1", port=0):
+        """
+        routes: {"/path": (delay_seconds, json_body)}
+        json_body may also be a callable(request_json) returning either a body or a
+        (status, body, headers) tuple, for routes whose reply depends on the request.
+        For a request without a body, request_json holds the query-string parameters.
+        A body that is an iterator of strings is sent as a chunked text/event-stream.
+        """
+        self.routes = routes
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so pooled clients can reuse the connection
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                path, _, query = self.path.partition("?")
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                with stub._lock:
+                    stub.request_count += 1
+                headers = {}
+                if path not in stub.routes:
+                    body, status = b'{"error": "not found"}', 404
+                else:
+                    delay, payload = stub.routes[path]
+                    time.sleep(delay)
+                    status = 200
+                    if callable(payload):
+                        try:
+                            request_json = json.loads(raw) if raw else dict(parse_qsl(query))
+                        except ValueError:
+                            request_json = {}
+                        payload = payload(request_json)
+                        if isinstance(payload, tuple):
+                            status, payload, headers = payload
+                    if hasattr(payload, "__next__"):
+                        self._stream(status, payload)
+                        return
+                    body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self, status, events):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events:
+                    data = event.encode()
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+
+            do_GET = _reply
+            do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
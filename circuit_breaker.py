@@ -0,0 +1,136 @@
+"""
+Per-provider circuit breaker with latency-based adaptive timeouts.
+
+closed     calls go through; consecutive failures (errors, or calls slower than
+           slow_call_s) are counted
+open       after failure_threshold of them in a row: calls are skipped and the
+           caller serves a cached or fallback value instead; the cool-down doubles
+           each time the breaker re-opens, up to max_open_seconds
+half_open  once the cool-down is over, a single probe call is let through; success
+           closes the breaker, failure opens it again; a probe that never went
+           out is handed back with release_probe()
+
+Successful call latencies feed a sliding window; the read timeout handed to
+requests is a multiple of their p95, so a provider that normally answers in
+300 ms no longer gets the full static timeout before we give up on it.
+"""
+import math
+import threading
+import time
+from collections import deque
+
+from tracing import redact
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, name, default_timeout=(3.05, 6), failure_threshold=3, slow_call_s=4.0,
+                 open_seconds=30, max_open_seconds=300, window=50, min_samples=5,
+                 timeout_multiplier=3.0, min_read_timeout=1.0):
+        self.name = name
+        self.default_timeout = default_timeout
+        self.failure_threshold = failure_threshold
+        self.slow_call_s = slow_call_s
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_read_timeout = min_read_timeout
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.short_circuited = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self.last_error = None
+
+    def _cooldown(self):
+        return min(self.max_open_seconds, self.open_seconds * 2 ** max(0, self.trips - 1))
+
+    def allow(self):
+        """
+        True if a call may go out now. In half-open state only one probe is allowed at a time.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self._cooldown():
+                self.state = HALF_OPEN
+                self._probe_in_flight = False
+                print(f"[Breaker] {self.name}: half-open, probing for recovery")
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.short_circuited += 1
+            return False
+
+    def record_success(self, latency_s):
+        if latency_s > self.slow_call_s:
+            self.record_failure(f"slow call ({latency_s:.1f}s)")
+            return
+        with self._lock:
+            self._latencies.append(latency_s)
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                print(f"[Breaker] {self.name}: ✅ recovered, closing")
+            self.state = CLOSED
+            self.trips = 0
+            self._probe_in_flight = False
+
+    def record_failure(self, reason=""):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = redact(str(reason))[:200]  # shown in the UI; URLs may carry keys
+            self._probe_in_flight = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                print(f"[Breaker] {self.name}: ❌ open for {self._cooldown():.0f}s after {reason}")
+
+    def release_probe(self):
+        """
+        For a call that was allowed but never sent (e.g. our own rate limiter said
+        no): records neither outcome, and frees the half-open probe slot so the
+        next call may probe instead.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def _p95(self):
+        ordered = sorted(self._latencies)
+        return ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)] if ordered else None
+
+    def timeout(self):
+        """
+        (connect, read) timeout for the next call: read is timeout_multiplier x the
+        observed p95, never above the static default nor below min_read_timeout.
+        """
+        connect, read = self.default_timeout
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.default_timeout
+            adaptive = self._p95() * self.timeout_multiplier
+        return connect, round(min(read, max(self.min_read_timeout, adaptive)), 2)
+
+    def status(self):
+        with self._lock:
+            reopens_in = None
+            if self.state == OPEN:
+                reopens_in = max(0.0, self._cooldown() - (time.monotonic() - self.opened_at))
+            p95 = self._p95()
+        return {
+            "provider": self.name,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "short_circuited": self.short_circuited,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "read_timeout_s": self.timeout()[1],
+            "reopens_in_s": round(reopens_in, 1) if reopens_in is not None else None,
+            "last_error": self.last_error,
+        }
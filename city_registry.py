@@ -0,0 +1,115 @@
+"""
+Precomputed city registry: name, state, coordinates, timezone and the
+OpenWeather city id for every city GeoPulse can target.
+
+The providers are queried by coordinates (and, where they have one, by their
+multi-city group endpoint), so nothing is geocoded at request time. Adding a
+city is one JSON entry; extra files can be layered over the bundled
+data/cities.json with GEOPULSE_CITIES_FILE (os.pathsep-separated paths).
+"""
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import date, datetime
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9
+    ZoneInfo = None
+
+BUNDLED_CITIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "cities.json")
+
+
+@dataclass(frozen=True)
+class City:
+    name: str
+    state: str
+    lat: float
+    lon: float
+    timezone: str = "Asia/Kolkata"
+    country: str = "India"
+    country_code: str = "IN"
+    owm_id: int = None
+    aliases: tuple = ()
+
+    def today(self):
+        """
+        The city's local date (the server may run in UTC, holidays are local).
+        """
+        if ZoneInfo is None:
+            return date.today()
+        try:
+            return datetime.now(ZoneInfo(self.timezone)).date()
+        except Exception:
+            return date.today()
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(
+            name=entry["name"], state=entry["state"], lat=float(entry["lat"]), lon=float(entry["lon"]),
+            timezone=entry.get("timezone", "Asia/Kolkata"), country=entry.get("country", "India"),
+            country_code=entry.get("country_code", "IN"), owm_id=entry.get("owm_id"),
+            aliases=tuple(entry.get("aliases", ())),
+        )
+
+
+class CityRegistry:
+    def __init__(self, cities=()):
+        self._cities = {}   # name -> City, in insertion order
+        self._lookup = {}   # lower-cased name or alias -> name
+        self._lock = threading.Lock()
+        for city in cities:
+            self.add(city)
+
+    @classmethod
+    def load(cls, *paths):
+        """
+        Builds a registry from one or more {"cities": [...]} JSON files; later files
+        override earlier entries with the same name.
+        """
+        registry = cls()
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f).get("cities", [])
+            for entry in entries:
+                registry.add(City.from_dict(entry))
+        return registry
+
+    def add(self, city):
+        with self._lock:
+            self._cities[city.name] = city
+            for key in (city.name, *city.aliases):
+                self._lookup[key.lower()] = city.name
+
+    def get(self, name):
+        """
+        City by name or alias (case-insensitive), or None.
+        """
+        key = self._lookup.get((name or "").strip().lower())
+        return self._cities.get(key) if key else None
+
+    def names(self):
+        return list(self._cities)
+
+    def states(self):
+        return {name: city.state for name, city in self._cities.items()}
+
+    def __iter__(self):
+        return iter(list(self._cities.values()))
+
+    def __len__(self):
+        return len(self._cities)
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+
+def load_city_registry():
+    """
+    The bundled cities plus any files listed in GEOPULSE_CITIES_FILE.
+    """
+    extra = [p for p in os.environ.get("GEOPULSE_CITIES_FILE", "").split(os.pathsep) if p]
+    registry = CityRegistry.load(BUNDLED_CITIES, *extra)
+    print(f"[Cities] ✅ Loaded {len(registry)} cities")
+    return registry
@@ -0,0 +1,228 @@
+"""
+Local ranking of creative variants.
+
+The variants call asks GPT-4o for several candidate posts in one round-trip;
+this module scores them on the CPU in about a millisecond, so picking the best few
+costs no extra API calls. A candidate's score (0-1) is a weighted mix of:
+
+  length     inside the ideal range; over POST_MAX_CHARS is a hard fail
+  hashtags   3-5 well-formed, distinct tags (#Word, letters/digits/underscore)
+  voice      overlap with the brand's keywords (products, voice, brand name)
+  freshness  1 - the highest similarity to the brand's recent posts; at or above
+             DUPLICATE_SIMILARITY the candidate is flagged as a near-duplicate
+
+Similarity is the Jaccard index of word 3-gram sets, which is enough to catch
+a post that only swapped a word or two. Candidates that near-duplicate a
+higher-ranked candidate are marked too, so the top K shows distinct takes.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+
+POST_MAX_CHARS = 500
+POST_IDEAL_CHARS = (80, 300)
+HASHTAG_COUNT = (3, 5)
+HASHTAG_MAX_CHARS = 30
+DUPLICATE_SIMILARITY = 0.6
+SHINGLE_SIZE = 3
+WEIGHTS = {"length": 0.25, "hashtags": 0.25, "voice": 0.2, "freshness": 0.3}
+HARD_FAIL_FACTOR = 0.5  # score multiplier for over-length posts and near-duplicates
+VOICE_TARGET_HITS = 2   # brand keywords a post needs for a full voice score
+
+HASHTAG_PATTERN = re.compile(r"#[^\W_]\w*")
+WORD_PATTERN = re.compile(r"[^\W_]+")
+STOPWORDS = {
+    "and", "the", "with", "uses", "very", "for", "that", "this", "from", "into", "your", "their",
+    "but", "not", "are", "its", "our", "all",
+}
+
+
+def words(text):
+    return WORD_PATTERN.findall((text or "").lower())
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    The set of word n-grams of text (the whole text as one gram if it is shorter than size).
+    """
+    tokens = words(text)
+    if len(tokens) < size:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def similarity(a, b):
+    """
+    Jaccard similarity of two shingle sets.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def voice_keywords(company_profile):
+    """
+    Lower-cased keywords a post in the brand's voice tends to use.
+    """
+    text = " ".join([company_profile.get("brand_name", ""), company_profile.get("voice", ""),
+                     *company_profile.get("product_examples", [])])
+    return {word for word in words(text) if len(word) > 2 and word not in STOPWORDS}
+
+
+def length_score(post_text):
+    length = len(post_text)
+    low, high = POST_IDEAL_CHARS
+    if length > POST_MAX_CHARS:
+        return 0.0
+    if length < low:
+        return length / low
+    if length > high:
+        # 1.0 at the top of the ideal range down to 0.5 at the hard limit
+        return 1.0 - 0.5 * (length - high) / (POST_MAX_CHARS - high)
+    return 1.0
+
+
+def hashtag_issues(hashtags):
+    """
+    Problems with a hashtag list (empty list if it is fine).
+    """
+    issues = []
+    if not isinstance(hashtags, list):
+        return ["hashtags are not a list"]
+    invalid = [tag for tag in hashtags
+               if not isinstance(tag, str) or not HASHTAG_PATTERN.fullmatch(tag) or len(tag) > HASHTAG_MAX_CHARS]
+    if invalid:
+        issues.append(f"invalid hashtags: {', '.join(map(str, invalid))}")
+    lowered = [tag.lower() for tag in hashtags if isinstance(tag, str)]
+    if len(set(lowered)) < len(lowered):
+        issues.append("repeated hashtags")
+    low, high = HASHTAG_COUNT
+    if not low <= len(hashtags) <= high:
+        issues.append(f"{len(hashtags)} hashtags (expected {low}-{high})")
+    return issues
+
+
+def hashtag_score(hashtags):
+    if not isinstance(hashtags, list) or not hashtags:
+        return 0.0
+    valid = [tag for tag in hashtags
+             if isinstance(tag, str) and HASHTAG_PATTERN.fullmatch(tag) and len(tag) <= HASHTAG_MAX_CHARS]
+    distinct = len({tag.lower() for tag in valid})
+    low, high = HASHTAG_COUNT
+    count_factor = 1.0 if low <= len(hashtags) <= high else 0.7
+    return distinct / len(hashtags) * count_factor
+
+
+def score_variant(variant, keywords, recent_shingles=()):
+    """
+    Scores one variant dict (the five creative keys). Returns
+    {"score", "checks": {name: 0-1}, "issues": [...], "similar_to_recent": 0-1}.
+    """
+    post_text = variant.get("post_text") or ""
+    hashtags = variant.get("hashtags") or []
+    issues = []
+
+    checks = {"length": length_score(post_text)}
+    if len(post_text) > POST_MAX_CHARS:
+        issues.append(f"{len(post_text)} characters (limit {POST_MAX_CHARS})")
+
+    checks["hashtags"] = hashtag_score(hashtags)
+    issues += hashtag_issues(hashtags)
+
+    text_words = set(words(post_text + " " + " ".join(str(tag) for tag in hashtags)))
+    hits = keywords & text_words
+    checks["voice"] = min(1.0, len(hits) / VOICE_TARGET_HITS) if keywords else 1.0
+    if not hits and keywords:
+        issues.append("no brand keywords")
+
+    own = shingles(post_text)
+    closest = max((similarity(own, other) for other in recent_shingles), default=0.0)
+    checks["freshness"] = 1.0 - closest
+    if closest >= DUPLICATE_SIMILARITY:
+        issues.append(f"near-duplicate of a recent post ({closest:.0%} similar)")
+
+    score = sum(WEIGHTS[name] * value for name, value in checks.items())
+    if len(post_text) > POST_MAX_CHARS or closest >= DUPLICATE_SIMILARITY:
+        score *= HARD_FAIL_FACTOR
+    return {"score": round(score, 4), "checks": {k: round(v, 3) for k, v in checks.items()},
+            "issues": issues, "similar_to_recent": round(closest, 3)}
+
+
+def rank_variants(variants, company_profile, recent_posts=()):
+    """
+    Scores and sorts variants, best first. Each returned dict is the variant plus
+    "score", "checks", "issues" and "duplicate_of" (the rank of a better candidate
+    it near-duplicates, or None). Duplicates sort after every distinct candidate.
+    """
+    keywords = voice_keywords(company_profile)
+    recent_shingles = [shingles(post) for post in recent_posts]
+    scored = [{**variant, **score_variant(variant, keywords, recent_shingles)} for variant in variants]
+    scored.sort(key=lambda v: v["score"], reverse=True)
+
+    kept = []  # (rank, shingles) of the distinct candidates so far
+    for variant in scored:
+        own = shingles(variant.get("post_text"))
+        variant["duplicate_of"] = next(
+            (rank for rank, other in kept if similarity(own, other) >= DUPLICATE_SIMILARITY), None
+        )
+        if variant["duplicate_of"] is None:
+            kept.append((len(kept) + 1, own))
+            variant["rank"] = len(kept)
+        else:
+            variant["issues"].append(f"near-duplicate of candidate #{variant['duplicate_of']}")
+
+    distinct = [v for v in scored if v["duplicate_of"] is None]
+    duplicates = [v for v in scored if v["duplicate_of"] is not None]
+    for rank, variant in enumerate(duplicates, start=len(distinct) + 1):
+        variant["rank"] = rank
+    return distinct + duplicates
+
+
+class RecentPosts:
+    """
+    The last few posts published per brand, kept in memory and appended to a
+    JSONL file so duplicate detection survives restarts.
+    """
+    def __init__(self, path=None, per_brand=50):
+        self.path = path
+        self.per_brand = per_brand
+        self._posts = {}  # brand -> deque of post texts, oldest first
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a torn last line from a crash
+                    self._remember(entry["brand"], entry["post_text"])
+        except OSError:
+            pass
+
+    def _remember(self, brand, post_text):
+        self._posts.setdefault(brand, deque(maxlen=self.per_brand)).append(post_text)
+
+    def add(self, brand, post_text):
+        with self._lock:
+            self._remember(brand, post_text)
+            if not self.path:
+                return
+            try:
+                if os.path.dirname(self.path):
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"ts": round(time.time(), 3), "brand": brand, "post_text": post_text},
+                                       ensure_ascii=False) + "\n")
+            except OSError as e:
+                print(f"[Variants] ❌ Could not record the post in {self.path}: {e}")
+
+    def get(self, brand):
+        with self._lock:
+            return list(self._posts.get(brand, ()))
@@ -0,0 +1,341 @@
+"""
+Headless GeoPulse: the full pipeline from the command line, no Streamlit.
+
+    python -m geopulse run --brand zomato --city Delhi --auto-approve top1
+    python -m geopulse run --brand swiggy --city Mumbai --auto-approve top2 --no-images
+    python -m geopulse run --brand zomato --city Delhi --publish telegram discord
+    python -m geopulse daemon --brands zomato swiggy --cities Delhi Mumbai --interval 600
+    python -m geopulse signals --city Delhi
+    python -m geopulse brands | cities
+
+Results are printed to stdout as one JSON object per line; progress logs go
+to stderr, so the output can be piped straight into jq or a file. Heavy
+modules (backend, openai, publishers) are only imported once a command runs,
+so --help and argument errors return immediately.
+
+The daemon re-runs the strategist and creative chain for a (brand, city) pair
+only when its city's signals change materially (see signal_changes.py), or
+on every cycle with --every-cycle. Keys come from the environment or
+.streamlit/secrets.toml, as in batch.py.
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+EXIT_FAILED = 1
+EXIT_MISSING_KEY = 2
+
+
+class MissingKeys(Exception):
+    def __init__(self, names):
+        self.names = names
+        super().__init__(", ".join(names))
+
+
+def emit(record):
+    """One JSON line on the real stdout (prints from the backend are sent to stderr)."""
+    sys.__stdout__.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+    sys.__stdout__.flush()
+
+
+def parse_pick(spec):
+    """
+    "top1" -> 1, "top3" -> 3: how many of the ranked triggers to auto-approve.
+    """
+    match = re.fullmatch(r"top(\d+)", spec or "")
+    if not match or int(match.group(1)) < 1:
+        raise argparse.ArgumentTypeError(f"expected topN (e.g. top1), got '{spec}'")
+    return int(match.group(1))
+
+
+def load_keys(publish_channels=(), with_openai=True):
+    """
+    The API keys a command needs, checked up front: raises MissingKeys naming
+    every one that is not set, before any work starts.
+    """
+    import backend
+    required = list(backend.SIGNAL_KEY_NAMES)
+    if with_openai:
+        required += ["OPENAI_API_KEY"]
+    if "telegram" in publish_channels:
+        required += ["TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID"]
+    if "discord" in publish_channels:
+        required += ["DISCORD_WEBHOOK_URL"]
+    keys = backend.load_keys(required=())
+    missing = [name for name in required if name not in keys]
+    if missing:
+        raise MissingKeys(missing)
+    return keys
+
+
+def make_openai_client(keys):
+    from openai import OpenAI
+    return OpenAI(api_key=keys["OPENAI_API_KEY"])
+
+
+class Pipeline:
+    """
+    One campaign run, the way the app does it, with the approval step replaced by
+    an automatic pick of the top N ranked triggers.
+    """
+    def __init__(self, keys, openai_client, with_images=True, fast=False, publish_channels=(),
+                 use_cache=True, output_dir=None, variants=1, draft_images=False, reuse_images=True):
+        import backend
+        self.keys = keys
+        self.openai_client = openai_client
+        self.with_images = with_images
+        self.fast = fast
+        self.variants = variants
+        self.draft_images = draft_images
+        self.reuse_images = reuse_images
+        self.publish_channels = list(publish_channels)
+        self.use_cache = use_cache
+        self.output_dir = output_dir or os.path.join(backend.DATA_DIR, "cli", datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+    def run(self, brand, city, pick=1, live_signal=None, reason=None):
+        """
+        Runs brand x city and returns one result dict per approved trigger.
+        A failure is reported as a single result with status "failed".
+        """
+        import backend
+        import tracing
+
+        base = {"brand": brand, "city": city, "status": "ok"}
+        if reason:
+            base["reason"] = reason
+        with tracing.trace("cli.pipeline", brand=brand, city=city) as root:
+            base["trace_id"] = root.trace_id
+            timings = {}
+            try:
+                profile = backend.get_company_profile(brand)
+                registered = backend.city_registry.get(city)
+                if registered is None:
+                    raise Exception(f"Unknown city: {city} (see `python -m geopulse cities`)")
+                base["city"] = city = registered.name
+                started = time.perf_counter()
+                if live_signal is None:
+                    live_signal = backend.fetch_live_signals(self.keys, city)
+                timings["signals"] = round(time.perf_counter() - started, 3)
+
+                started = time.perf_counter()
+                triggers = backend.get_dynamic_triggers_and_tone(
+                    self.openai_client, live_signal, profile, use_cache=self.use_cache
+                )
+                timings["strategist"] = round(time.perf_counter() - started, 3)
+                if not triggers:
+                    raise Exception("AI Strategist found no brand-safe triggers.")
+            except Exception as e:
+                print(f"[CLI] ❌ {brand} / {city} failed: {e}")
+                return [{**base, "status": "failed", "error": str(e), "timings": timings}]
+
+            results = []
+            for rank, trigger in enumerate(triggers[:pick], start=1):
+                result = {**base, "rank": rank, "live_signal": live_signal, "trigger": trigger["trigger"],
+                          "tone": trigger["tone"], "reasoning": trigger.get("reasoning"), "timings": dict(timings)}
+                try:
+                    self._create(result, profile)
+                except Exception as e:
+                    print(f"[CLI] ❌ {brand} / {city} / '{trigger['trigger']}' failed: {e}")
+                    result["status"] = "failed"
+                    result["error"] = str(e)
+                results.append(result)
+            return results
+
+    def _create(self, result, profile):
+        import backend
+        import publishers
+
+        args = (result["city"], result["trigger"], result["tone"], result["live_signal"], profile)
+        timings = result["timings"]
+        started = time.perf_counter()
+        if self.variants > 1:
+            ranked = backend.generate_creative_variants(self.openai_client, *args, n=self.variants,
+                                                        use_cache=self.use_cache)
+            result.update({key: ranked[0][key] for key in backend.CREATIVE_KEYS})
+            result["variant_score"] = ranked[0]["score"]
+            result["variants_considered"] = len(ranked)
+        elif self.fast:
+            (result["post_text"], result["hashtags"], result["target_audience"], result["predicted_impact_rating"],
+             result["predicted_impact_reasoning"], result["image_prompt"]) = backend.generate_creative_package_fast(
+                self.openai_client, *args, use_cache=self.use_cache)
+        else:
+            (result["post_text"], result["hashtags"], result["target_audience"], result["predicted_impact_rating"],
+             result["predicted_impact_reasoning"]) = backend.generate_creative_assets(
+                self.openai_client, *args, use_cache=self.use_cache)
+        timings["creative"] = round(time.perf_counter() - started, 3)
+        if not self.with_images and not self.publish_channels:
+            return
+
+        if not result.get("image_prompt"):
+            started = time.perf_counter()
+            result["image_prompt"] = backend.generate_safe_image_prompt(
+                self.openai_client, result["post_text"], profile, use_cache=self.use_cache)
+            timings["image_prompt"] = round(time.perf_counter() - started, 3)
+        started = time.perf_counter()
+        image_bytes, match = backend.generate_or_reuse_image(self.openai_client, result["image_prompt"], profile,
+                                                             draft=self.draft_images, reuse=self.reuse_images)
+        result["reused_image"] = match._asdict() if match else None
+        timings["image"] = round(time.perf_counter() - started, 3)
+        os.makedirs(self.output_dir, exist_ok=True)
+        slug = re.sub(r"[^a-z0-9]+", "-", f"{result['brand']}-{result['city']}-{result['rank']}".lower()).strip("-")
+        result["image_path"] = os.path.join(self.output_dir, f"{slug}.png")
+        with open(result["image_path"], "wb") as f:
+            f.write(image_bytes)
+
+        if self.publish_channels:
+            started = time.perf_counter()
+            published = publishers.publish_all(self.keys, result["post_text"], image_bytes, result["hashtags"],
+                                               channels=self.publish_channels)
+            timings["publish"] = round(time.perf_counter() - started, 3)
+            result["published"] = [r.to_dict() for r in published]
+            if all(r.ok for r in published):
+                backend.recent_posts.add(profile["brand_name"], result["post_text"])
+            else:
+                result["status"] = "partial"
+
+
+# --- Commands ---
+def cmd_run(args):
+    keys = load_keys(args.publish or ())
+    pipeline = Pipeline(keys, make_openai_client(keys), with_images=not args.no_images, fast=args.fast,
+                        publish_channels=args.publish or (), use_cache=not args.fresh, output_dir=args.output_dir,
+                        variants=args.variants, draft_images=args.draft_images, reuse_images=not args.no_reuse)
+    results = pipeline.run(args.brand, args.city, pick=args.auto_approve)
+    for result in results:
+        emit(result)
+    return 0 if all(r["status"] == "ok" for r in results) else EXIT_FAILED
+
+
+def cmd_daemon(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import backend
+    import tracing
+
+    keys = load_keys(args.publish or ())
+    brands = args.brands or backend.all_brands()
+    cities = args.cities or backend.CITIES
+    pipeline = Pipeline(keys, make_openai_client(keys), with_images=not args.no_images, fast=args.fast,
+                        publish_channels=args.publish or (), output_dir=args.output_dir, variants=args.variants,
+                        draft_images=args.draft_images, reuse_images=not args.no_reuse)
+    tracing.start_metrics_server_from_env()
+    backend.holiday_index.start_background_refresh(keys)
+    backend.ensure_signal_refresher(keys)
+    print(f"[CLI] Daemon watching {len(brands)} brands x {len(cities)} cities every {args.interval}s")
+
+    cycle = 0
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="geopulse-daemon") as pool:
+        while True:
+            cycle += 1
+            started = time.perf_counter()
+            signals = backend.fetch_signals_bulk(keys, cities)
+            runs = []
+            for city in cities:
+                deltas = backend.change_detector.observe(city, signals[city])
+                if deltas or args.every_cycle:
+                    reason = ", ".join(d["reason"] if d["field"] == "*" else f"{d['field']} {d['reason']}"
+                                       for d in deltas) or "scheduled cycle"
+                    runs += [(brand, city, reason) for brand in brands]
+            futures = [pool.submit(tracing.wrap(pipeline.run), brand, city, args.auto_approve, signals[city], reason)
+                       for brand, city, reason in runs]
+            for future in futures:
+                for result in future.result():
+                    emit(result)
+            emit({"event": "cycle", "cycle": cycle, "pipelines": len(runs),
+                  "duration_s": round(time.perf_counter() - started, 3), "at": datetime.now().isoformat()})
+            if args.cycles and cycle >= args.cycles:
+                return 0
+            time.sleep(args.interval)
+
+
+def cmd_signals(args):
+    import backend
+    keys = load_keys(with_openai=False)
+    if args.city:
+        emit({"city": args.city, "live_signal": backend.fetch_live_signals(keys, args.city)})
+        return 0
+    for city, live_signal in backend.fetch_signals_bulk(keys, args.cities).items():
+        emit({"city": city, "live_signal": live_signal})
+    return 0
+
+
+def cmd_brands(args):
+    import backend
+    for industry, brands in backend.profile_registry.industries().items():
+        for brand in brands:
+            emit({"brand": brand, "industry": industry})
+    return 0
+
+
+def cmd_cities(args):
+    import backend
+    for city in backend.city_registry:
+        emit({"city": city.name, "state": city.state, "lat": city.lat, "lon": city.lon, "timezone": city.timezone})
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="geopulse", description="Run the GeoPulse pipeline without Streamlit.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_pipeline_options(command):
+        command.add_argument("--auto-approve", type=parse_pick, default=1, metavar="topN",
+                             help="approve the N top-ranked triggers (default: top1)")
+        command.add_argument("--no-images", action="store_true", help="skip the image prompt and DALL-E calls")
+        command.add_argument("--fast", action="store_true", help="merge the creative and image-prompt calls into one")
+        command.add_argument("--variants", type=int, default=1, metavar="N",
+                             help="write N post variants in one call and keep the top-ranked one")
+        command.add_argument("--draft-images", action="store_true",
+                             help="DALL-E 2 at 512px; upscaled to each channel's size on publish")
+        command.add_argument("--no-reuse", action="store_true",
+                             help="always call DALL-E, even when a past image of the brand matches the prompt")
+        command.add_argument("--publish", nargs="+", choices=["telegram", "discord"], help="publish to these channels")
+        command.add_argument("--output-dir", help="where images are written (default: .geopulse/cli/<timestamp>)")
+
+    run = commands.add_parser("run", help="one brand x city campaign")
+    run.add_argument("--brand", required=True)
+    run.add_argument("--city", required=True)
+    run.add_argument("--fresh", action="store_true", help="bypass the AI response cache")
+    add_pipeline_options(run)
+    run.set_defaults(handler=cmd_run)
+
+    daemon = commands.add_parser("daemon", help="keep running campaigns as signals change")
+    daemon.add_argument("--brands", nargs="+", help="brand keys (default: all)")
+    daemon.add_argument("--cities", nargs="+", help="city names (default: all registered)")
+    daemon.add_argument("--interval", type=int, default=300, help="seconds between signal checks")
+    daemon.add_argument("--every-cycle", action="store_true", help="run every pair each cycle, not only on material changes")
+    daemon.add_argument("--concurrency", type=int, default=4, help="pipelines in flight at once")
+    daemon.add_argument("--cycles", type=int, default=0, help="stop after this many cycles (default: run forever)")
+    add_pipeline_options(daemon)
+    daemon.set_defaults(handler=cmd_daemon)
+
+    signals = commands.add_parser("signals", help="print live signals as JSON")
+    signals.add_argument("--city", help="one city (default: every registered city, in bulk)")
+    signals.add_argument("--cities", nargs="+", help="a subset of cities for the bulk fetch")
+    signals.set_defaults(handler=cmd_signals)
+
+    commands.add_parser("brands", help="list brand profiles").set_defaults(handler=cmd_brands)
+    commands.add_parser("cities", help="list registered cities").set_defaults(handler=cmd_cities)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # Backend progress prints go to stderr so stdout stays machine-readable JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            return args.handler(args)
+        except MissingKeys as e:
+            print(f"[CLI] ❌ Missing API key(s): {e}. Set them in the environment or .streamlit/secrets.toml.")
+            return EXIT_MISSING_KEY
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
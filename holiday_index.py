@@ -0,0 +1,163 @@
+"""
+Local date -> holidays index for the Calendarific calendar.
+The whole year is downloaded once (or loaded from its cached JSON file), so a
+holiday lookup for any city is an in-memory dict read with no network call.
+"""
+import json
+import os
+import threading
+import time
+from datetime import date
+
+
+class HolidayIndex:
+    def __init__(self, fetch_year, cache_dir=None, country="IN", retry_after=10 * 60):
+        """
+        fetch_year: callable(keys, country, year) -> list of Calendarific holiday dicts.
+        cache_dir: where the yearly JSON files are kept; None keeps everything in memory.
+        retry_after: seconds to wait before retrying a failed download.
+        """
+        self.fetch_year = fetch_year
+        self.cache_dir = cache_dir
+        self.country = country
+        self.retry_after = retry_after
+        self._years = {}  # year -> {iso_date: [{"name": ..., "states": "All" | [state, ...]}]}
+        self._failed_at = {}
+        self._downloads = {}  # year -> threading.Event set when its in-flight download ends
+        self._lock = threading.Lock()
+        self._refresher = None
+
+    def _cache_path(self, year):
+        return os.path.join(self.cache_dir, f"holidays_{self.country}_{year}.json")
+
+    @staticmethod
+    def build_index(holidays):
+        """
+        Turns Calendarific's holiday list into {iso_date: [{"name", "states"}]}.
+        """
+        index = {}
+        for holiday in holidays:
+            iso = holiday.get('date', {}).get('iso', '')[:10]
+            if not iso:
+                continue
+            states = holiday.get('states', 'All')
+            if isinstance(states, list):
+                states = [s.get('name') if isinstance(s, dict) else s for s in states]
+            index.setdefault(iso, []).append({'name': holiday['name'], 'states': states})
+        return index
+
+    def _load_file(self, year):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(year), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_file(self, year, holidays):
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = self._cache_path(year) + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(holidays, f)
+        os.replace(tmp_path, self._cache_path(year))
+
+    def refresh(self, keys, year):
+        """
+        Downloads the full year from Calendarific and replaces the in-memory index.
+        """
+        print(f"[Holiday] Downloading {self.country} holiday calendar for {year}...")
+        holidays = self.fetch_year(keys, self.country, year)
+        self._save_file(year, holidays)
+        with self._lock:
+            self._years[year] = self.build_index(holidays)
+            self._failed_at.pop(year, None)
+        print(f"[Holiday] ✅ Indexed {len(holidays)} holidays for {year}")
+
+    def _ensure_year(self, keys, year):
+        with self._lock:
+            if year in self._years:
+                return
+            holidays = self._load_file(year)
+            if holidays is not None:
+                self._years[year] = self.build_index(holidays)
+                return
+            failed_at = self._failed_at.get(year)
+            if failed_at and time.time() - failed_at < self.retry_after:
+                raise Exception(f"Holiday calendar for {year} unavailable (last download failed)")
+            # Concurrent cities share a single download, which runs outside the
+            # lock so lookups and is_loaded() for loaded years never wait on it
+            download = self._downloads.get(year)
+            if download is None:
+                download = self._downloads[year] = threading.Event()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            download.wait()
+            with self._lock:
+                if year in self._years:
+                    return
+            raise Exception(f"Holiday calendar for {year} unavailable (last download failed)")
+        try:
+            holidays = self.fetch_year(keys, self.country, year)
+            with self._lock:
+                self._years[year] = self.build_index(holidays)
+        except Exception:
+            with self._lock:
+                self._failed_at[year] = time.time()
+            raise
+        finally:
+            with self._lock:
+                self._downloads.pop(year, None)
+            download.set()
+        self._save_file(year, holidays)
+        print(f"[Holiday] ✅ Indexed {len(holidays)} holidays for {year}")
+
+    def is_loaded(self, year):
+        """
+        True if a lookup in year needs no download: the year is in memory, or in
+        its cached JSON file (which is loaded now). Never waits for a download in progress.
+        """
+        with self._lock:
+            if year not in self._years:
+                holidays = self._load_file(year)
+                if holidays is not None:
+                    self._years[year] = self.build_index(holidays)
+            return year in self._years
+
+    def lookup(self, keys, day: date, state=None):
+        """
+        Returns the names of the holidays on `day`. With a state, only holidays
+        observed nationally ("All") or in that state are returned.
+        """
+        self._ensure_year(keys, day.year)
+        with self._lock:
+            entries = self._years[day.year].get(day.isoformat(), [])
+        return [
+            entry['name'] for entry in entries
+            if state is None or entry['states'] == 'All' or state in entry['states']
+        ]
+
+    def start_background_refresh(self, keys, interval=24 * 60 * 60):
+        """
+        Starts a daemon thread that re-downloads the current year every `interval` seconds.
+        Safe to call more than once; only one refresher thread is ever started.
+        """
+        with self._lock:
+            if self._refresher is not None:
+                return
+            self._refresher = threading.Thread(
+                target=self._refresh_loop, args=(keys, interval), daemon=True, name="holiday-refresh"
+            )
+        self._refresher.start()
+
+    def _refresh_loop(self, keys, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self.refresh(keys, date.today().year)
+            except Exception as e:
+                print(f"[Holiday] ❌ Background refresh failed: {e}")
@@ -0,0 +1,209 @@
+"""
+Per-target image encodes, made once and kept in a content-hashed disk cache.
+
+DALL-E returns a ~1-3 MB PNG. Nothing downstream needs that file as is: the
+review step shows the image in a column a few hundred pixels wide, and the
+channels re-compress whatever they are sent. Each target below describes one
+consumer. derive() makes that consumer's encode once and caches it under
+<sha256 of the source>-<target>-<spec hash>, so the preview, each retry and
+each channel reuse the same bytes.
+
+  preview   WebP, at most 768 px, for st.image in the review step
+  telegram  JPEG, 1024-1280 px (sendPhoto shows at most 1280 px, 10 MB limit)
+  discord   WebP, 1024 px (shown inline; 10 MB attachment limit)
+
+min_side upscales smaller sources (512 px draft images) with Lanczos when they
+are published, so a cheap draft never goes out as a thumbnail. The cache
+evicts the least recently used files once it grows past max_bytes.
+"""
+import hashlib
+import io
+import os
+import threading
+import uuid
+from collections import namedtuple
+
+from PIL import Image
+
+Target = namedtuple("Target", ["format", "max_side", "min_side", "quality", "max_bytes"])
+Derivative = namedtuple("Derivative", ["data", "mime", "extension", "width", "height"])
+
+TARGETS = {
+    "preview": Target("WEBP", max_side=768, min_side=0, quality=75, max_bytes=None),
+    "telegram": Target("JPEG", max_side=1280, min_side=1024, quality=87, max_bytes=10 * 1024 * 1024),
+    "discord": Target("WEBP", max_side=1024, min_side=1024, quality=85, max_bytes=10 * 1024 * 1024),
+}
+FORMATS = {"JPEG": ("image/jpeg", "jpg"), "WEBP": ("image/webp", "webp"), "PNG": ("image/png", "png")}
+MIN_QUALITY = 50  # lowest quality tried when an encode is over its target's max_bytes
+
+
+def encode(image_bytes, target):
+    """
+    Resizes and re-encodes image bytes for a Target. Returns a Derivative.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as source:
+        image = source.convert("RGBA" if target.format == "WEBP" and "A" in source.getbands() else "RGB")
+    longest = max(image.size)
+    scale = 1.0
+    if longest > target.max_side:
+        scale = target.max_side / longest
+    elif longest < target.min_side:
+        scale = target.min_side / longest
+    if scale != 1.0:
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        image = image.resize(size, Image.LANCZOS)
+
+    mime, extension = FORMATS[target.format]
+    options = {"optimize": True} if target.format == "JPEG" else {"method": 4}
+    quality = target.quality
+    while True:
+        buffer = io.BytesIO()
+        image.save(buffer, format=target.format, quality=quality, **options)
+        data = buffer.getvalue()
+        if target.max_bytes is None or len(data) <= target.max_bytes or quality <= MIN_QUALITY:
+            return Derivative(data, mime, extension, image.width, image.height)
+        quality -= 10
+
+
+def spec_hash(target):
+    return hashlib.sha1(repr(tuple(target)).encode()).hexdigest()[:8]
+
+
+class DerivativeCache:
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024, targets=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.targets = dict(TARGETS)
+        if targets:
+            self.targets.update(targets)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0  # source bytes minus derivative bytes, over every derive()
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk, counted when the directory is first needed
+
+    def _open_directory(self):
+        """
+        Creates the directory and counts what is already in it, on first use. Caller holds the lock.
+        """
+        if self._size is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._size = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.is_file())
+
+    def _path(self, digest, name, target):
+        extension = FORMATS[target.format][1]
+        return os.path.join(self.directory, f"{digest}-{name}-{spec_hash(target)}.{extension}")
+
+    def get(self, image_bytes, name):
+        """
+        The named target's encode of image_bytes, from disk if it was made before.
+        If the source cannot be decoded, returns it unchanged as a PNG.
+        """
+        target = self.targets[name]
+        mime, extension = FORMATS[target.format]
+        path = self._path(hashlib.sha256(image_bytes).hexdigest()[:32], name, target)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # recently used: evicted last
+            with self._lock:
+                self.hits += 1
+                self.bytes_saved += len(image_bytes) - len(data)
+            with Image.open(io.BytesIO(data)) as image:
+                width, height = image.size
+            return Derivative(data, mime, extension, width, height)
+        except OSError:
+            pass
+
+        try:
+            derivative = encode(image_bytes, target)
+        except Exception as e:
+            print(f"[Images] ❌ Could not encode the {name} image, using the original: {e}")
+            return Derivative(image_bytes, "image/png", "png", None, None)
+        self._write(path, derivative.data)
+        with self._lock:
+            self.misses += 1
+            self.bytes_saved += len(image_bytes) - len(derivative.data)
+        return derivative
+
+    def warm(self, image_bytes, names=None):
+        """
+        Makes every (or the named) target's encode ahead of use, e.g. right after DALL-E returns.
+        """
+        for name in names or self.targets:
+            self.get(image_bytes, name)
+
+    def _write(self, path, data):
+        temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            with self._lock:
+                self._open_directory()
+            with open(temp_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)  # readers in other processes never see a half-written file
+        except OSError as e:
+            print(f"[Images] ❌ Could not cache {os.path.basename(path)}: {e}")
+            return
+        with self._lock:
+            self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used files until the cache is at 90% of max_bytes.
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file():
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        size = sum(entry[1] for entry in entries)
+        removed = 0
+        for _, file_size, path in entries:
+            if size <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            removed += 1
+        with self._lock:
+            self._size = size
+        print(f"[Images] Evicted {removed} cached images ({size / 1024 / 1024:.1f} MB left)")
+
+    def stats(self):
+        with self._lock:
+            if os.path.isdir(self.directory):
+                self._open_directory()
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0,
+                    "bytes_saved": self.bytes_saved, "size_bytes": self._size or 0, "max_bytes": self.max_bytes}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def ensure_cache(directory=None, max_bytes=256 * 1024 * 1024):
+    """
+    Returns the process-wide cache, creating it on first call. backend.py creates it
+    under DATA_DIR at import; callers that only need it (publishers) pass nothing.
+    The directory itself is only made when the first encode is written.
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            directory = directory or os.path.join(os.environ.get("GEOPULSE_DATA_DIR", ".geopulse"), "images")
+            _cache = DerivativeCache(directory, max_bytes)
+    return _cache
+
+
+def derive(image_bytes, name):
+    return ensure_cache().get(image_bytes, name)
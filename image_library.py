@@ -0,0 +1,224 @@
+"""
+Local library of generated images, searchable by image prompt.
+
+Call 3 writes a positive, literal, city-free image prompt ("A vibrant,
+top-down photorealistic shot of a steaming bowl of biryani..."), so a brand's
+prompts repeat a lot from week to week. Every DALL-E image is stored here with
+its prompt. Before the next DALL-E call, find() looks for a close enough past
+prompt of the same brand, and the image comes from disk in milliseconds.
+
+Similarity is the cosine of TF-IDF weighted character 3-grams of the prompt's
+content words ("biryani" matches "biryanis", "bowl" matches "bowls"). IDF is
+per brand, so the phrasing every prompt shares ("photorealistic shot of")
+weighs little. An inverted index over the 3-grams keeps lookups to the prompts
+that share at least one gram. Everything runs on the CPU with the standard
+library.
+
+Reuse is bounded: a match must score at least `threshold`, and an image that
+has been reused `max_reuse` times is not offered again. Rows and image files
+are shared by every process using the same directory, which is created on
+first use.
+"""
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, namedtuple
+
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_MAX_REUSE = 3
+STOPWORDS = {
+    "a", "an", "the", "of", "on", "in", "with", "and", "to", "for", "at", "by", "from", "into", "its",
+    "is", "are", "as", "or", "that", "this", "some", "while", "their", "his", "her",
+}
+
+Match = namedtuple("Match", ["id", "prompt", "similarity", "reuse_count", "path"])
+
+
+def features(prompt):
+    """
+    Character 3-grams of the prompt's content words, with word-boundary markers.
+    """
+    grams = Counter()
+    for word in re.findall(r"[^\W_]+", prompt.lower()):
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        padded = f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class _BrandIndex:
+    def __init__(self):
+        self.docs = {}       # image id -> Counter of grams
+        self.postings = {}   # gram -> set of image ids
+        self.df = Counter()  # gram -> number of prompts containing it
+        self._idf = {}       # gram -> idf, cleared whenever a prompt is added
+        self._norms = {}     # image id -> TF-IDF vector norm, cleared likewise
+
+    def add(self, image_id, grams):
+        self.docs[image_id] = grams
+        for gram in grams:
+            self.postings.setdefault(gram, set()).add(image_id)
+            self.df[gram] += 1
+        self._idf.clear()
+        self._norms.clear()
+
+    def idf(self, gram):
+        value = self._idf.get(gram)
+        if value is None:
+            value = self._idf[gram] = math.log((len(self.docs) + 1) / (self.df.get(gram, 0) + 1)) + 1
+        return value
+
+    def vector(self, grams):
+        return {gram: count * self.idf(gram) for gram, count in grams.items()}
+
+    def norm(self, image_id):
+        value = self._norms.get(image_id)
+        if value is None:
+            value = self._norms[image_id] = math.sqrt(sum(w * w for w in self.vector(self.docs[image_id]).values()))
+        return value
+
+    def search(self, grams, limit=None):
+        """
+        [(similarity, image id)] of the best-matching prompts (the best limit of them), best first.
+        """
+        candidates = set()
+        for gram in grams:
+            candidates |= self.postings.get(gram, set())
+        if not candidates:
+            return []
+        query = self.vector(grams)
+        query_norm = math.sqrt(sum(w * w for w in query.values()))
+        scored = []
+        for image_id in candidates:
+            doc = self.docs[image_id]
+            dot = sum(weight * doc[gram] * self.idf(gram) for gram, weight in query.items() if gram in doc)
+            norm = query_norm * self.norm(image_id)
+            scored.append((dot / norm if norm else 0.0, image_id))
+        scored.sort(reverse=True)
+        return scored if limit is None else scored[:limit]
+
+
+class ImageLibrary:
+    def __init__(self, directory, threshold=DEFAULT_THRESHOLD, max_reuse=DEFAULT_MAX_REUSE):
+        self.directory = directory
+        self.threshold = threshold
+        self.max_reuse = max_reuse
+        self.lookups = 0
+        self.reuses = 0
+        self._indexes = {}  # brand -> _BrandIndex
+        self._loaded_id = 0  # highest row id already indexed
+        self._lock = threading.Lock()
+        self._db = None  # opened on first use, so importing backend creates nothing
+
+    def _connection(self):
+        """
+        The library's connection, opened (with the directory and table) on first call. Caller holds the lock.
+        """
+        if self._db is None:
+            os.makedirs(self.directory, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, "library.db"), timeout=5,
+                                 check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, brand TEXT NOT NULL, prompt TEXT NOT NULL,"
+                " file TEXT NOT NULL, draft INTEGER NOT NULL DEFAULT 0, reuse_count INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL, last_used_at REAL)"
+            )
+            self._db = db
+        return self._db
+
+    def _sync(self):
+        """
+        Indexes rows added since the last sync, including those written by other processes.
+        """
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(
+                "SELECT id, brand, prompt FROM images WHERE id > ? ORDER BY id", (self._loaded_id,)
+            ).fetchall()
+            for image_id, brand, prompt in rows:
+                self._indexes.setdefault(brand, _BrandIndex()).add(image_id, features(prompt))
+                self._loaded_id = image_id
+
+    def add(self, brand, prompt, image_bytes, draft=False):
+        """
+        Stores an image and its prompt. Returns the image id.
+        """
+        name = f"{hashlib.sha256(image_bytes).hexdigest()[:32]}.png"
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            self._connection()  # creates the directory on first use
+        if not os.path.exists(path):
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(image_bytes)
+            os.replace(temp_path, path)
+        with self._lock:
+            db = self._connection()
+            cursor = db.execute(
+                "INSERT INTO images (brand, prompt, file, draft, created_at) VALUES (?, ?, ?, ?, ?)",
+                (brand, prompt, name, int(draft), time.time())
+            )
+        self._sync()
+        return cursor.lastrowid
+
+    def find(self, brand, prompt, allow_draft=False, threshold=None):
+        """
+        The closest past image of this brand for prompt, or None if none scores at
+        least threshold or every close one has been reused max_reuse times.
+        A full-size request (allow_draft=False) is never offered a draft image.
+        Every candidate above threshold is checked, best first, so used-up or
+        draft images at the top do not hide a usable one further down.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        self._sync()
+        with self._lock:
+            self.lookups += 1
+            index = self._indexes.get(brand)
+            scored = index.search(features(prompt)) if index else []
+        for similarity, image_id in scored:
+            if similarity < threshold:
+                break
+            with self._lock:
+                db = self._connection()
+                row = db.execute(
+                    "SELECT prompt, file, draft, reuse_count FROM images WHERE id = ?", (image_id,)
+                ).fetchone()
+            if row is None or row[3] >= self.max_reuse or (row[2] and not allow_draft):
+                continue
+            path = os.path.join(self.directory, row[1])
+            if os.path.exists(path):
+                return Match(image_id, row[0], round(similarity, 3), row[3], path)
+        return None
+
+    def use(self, match):
+        """
+        Reads a matched image and counts the reuse. Returns the PNG bytes, or None
+        if other callers (in any process) used up its max_reuse since find().
+        """
+        with open(match.path, "rb") as f:
+            image_bytes = f.read()
+        with self._lock:
+            db = self._connection()
+            claimed = db.execute(
+                "UPDATE images SET reuse_count = reuse_count + 1, last_used_at = ? WHERE id = ? AND reuse_count < ?",
+                (time.time(), match.id, self.max_reuse)
+            ).rowcount
+            if not claimed:
+                return None
+            self.reuses += 1
+        return image_bytes
+
+    def stats(self):
+        with self._lock:
+            db = self._connection()
+            images = db.execute("SELECT COUNT(*), COALESCE(SUM(reuse_count), 0) FROM images").fetchone()
+            return {"images": images[0], "total_reuses": images[1], "lookups": self.lookups,
+                    "reuses": self.reuses, "reuse_rate": self.reuses / self.lookups if self.lookups else 0.0,
+                    "threshold": self.threshold, "max_reuse": self.max_reuse}
@@ -0,0 +1,452 @@
+"""
+Durable background jobs for the generation chain.
+
+Jobs are rows in a local SQLite queue and are executed by a small pool of
+worker threads, so a Streamlit rerun, tab close or widget click no longer
+throws away in-flight LLM/DALL-E work. The app submits a job, polls its
+status, and can reattach to a finished job (result + image) after a reload.
+
+A running job holds a lease that a heartbeat thread renews while its handler
+runs, so a long DALL-E call or rate-limit wait never lets it lapse. If the
+process dies, the lease expires and another worker picks the job up, at most
+MAX_ATTEMPTS times in all; after that the job is marked failed. Every write a
+worker makes is scoped to its own attempt, so a worker whose lease lapsed
+cannot overwrite the job after another worker re-claimed it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+import backend
+import tracing
+
+LEASE_SECONDS = 180
+HEARTBEAT_SECONDS = 30  # how often a running job's lease is renewed
+MAX_ATTEMPTS = 3  # claims per job, counting re-claims after a worker died
+RETENTION_SECONDS = 7 * 24 * 60 * 60
+STREAM_PROGRESS_INTERVAL = 0.2  # seconds between partial post_text writes while streaming
+
+# Runs Call 3 alongside the tail of a streamed Call 2
+_overlap_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geopulse-overlap")
+
+
+class JobQueue:
+    def __init__(self, db_path, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL,"
+                " payload TEXT NOT NULL, result TEXT, error TEXT, progress TEXT, image BLOB,"
+                " attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            db.execute("DELETE FROM jobs WHERE created_at < ?", (time.time() - RETENTION_SECONDS,))
+
+    def _connect(self):
+        # One short-lived connection per operation: safe across worker threads and processes
+        db = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def submit(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        with closing(self._connect()) as db:
+            db.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, 'queued', ?, ?)",
+                (job_id, kind, json.dumps(payload), time.time())
+            )
+        print(f"[Jobs] Queued {kind} job {job_id}")
+        return job_id
+
+    def claim(self, kinds):
+        """
+        Atomically takes the oldest queued job (or one whose lease expired) of the given kinds.
+        A job whose lease expired after max_attempts claims is marked failed instead.
+        """
+        now = time.time()
+        placeholders = ",".join("?" * len(kinds))
+        db = self._connect()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            given_up = db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL"
+                f" WHERE kind IN ({placeholders}) AND status = 'running' AND lease_until < ? AND attempts >= ?",
+                (f"Gave up after {self.max_attempts} attempts: the worker running it stopped each time",
+                 now, *kinds, now, self.max_attempts)
+            ).rowcount
+            if given_up:
+                print(f"[Jobs] ❌ Gave up on {given_up} job(s) after {self.max_attempts} attempts")
+            row = db.execute(
+                f"SELECT * FROM jobs WHERE kind IN ({placeholders}) AND"
+                " (status = 'queued' OR (status = 'running' AND lease_until < ?))"
+                " ORDER BY created_at LIMIT 1",
+                (*kinds, now)
+            ).fetchone()
+            if row is None:
+                db.execute("COMMIT")
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?,"
+                " started_at = COALESCE(started_at, ?) WHERE id = ?",
+                (now + LEASE_SECONDS, now, row["id"])
+            )
+            db.execute("COMMIT")
+            return self._to_dict(row, include_image=False)
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        finally:
+            db.close()
+
+    # The writes below take the attempt number the worker claimed (the job's
+    # "attempts" + 1) and return False, changing nothing, once that attempt is
+    # no longer the running one.
+
+    def update_progress(self, job_id, attempt, progress):
+        with closing(self._connect()) as db:
+            return db.execute(
+                "UPDATE jobs SET progress = ?, lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (json.dumps(progress), time.time() + LEASE_SECONDS, job_id, attempt)
+            ).rowcount > 0
+
+    def renew_lease(self, job_id, attempt):
+        with closing(self._connect()) as db:
+            return db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (time.time() + LEASE_SECONDS, job_id, attempt)
+            ).rowcount > 0
+
+    def complete(self, job_id, attempt, result, image=None):
+        with closing(self._connect()) as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, image = ?, finished_at = ?, lease_until = NULL"
+                " WHERE id = ? AND status = 'running' AND attempts = ?",
+                (json.dumps(result), image, time.time(), job_id, attempt)
+            ).rowcount > 0
+
+    def fail(self, job_id, attempt, error):
+        with closing(self._connect()) as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL"
+                " WHERE id = ? AND status = 'running' AND attempts = ?",
+                (error, time.time(), job_id, attempt)
+            ).rowcount > 0
+
+    def get(self, job_id):
+        with closing(self._connect()) as db:
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row, include_image=True):
+        job = dict(row)
+        for field in ("payload", "result", "progress"):
+            job[field] = json.loads(job[field]) if job[field] else None
+        if not include_image:
+            job.pop("image", None)
+        return job
+
+
+# --- Job handlers ---
+# Each handler gets (job, context, report_progress) and returns (result_dict, image_bytes_or_None).
+
+def handle_analyze(job, context, report_progress):
+    payload = job["payload"]
+    company_profile = backend.get_company_profile(payload["brand"])
+    report_progress({"stage": "signals"})
+    live_signals = backend.fetch_live_signals(context["keys"], payload["city"])
+    report_progress({"stage": "strategist", "live_signals": live_signals})
+    ranked_triggers = backend.get_dynamic_triggers_and_tone(
+        context["openai_client"], live_signals, company_profile, use_cache=payload.get("use_cache", True)
+    )
+    return {
+        "company_profile": company_profile,
+        "city": payload["city"],
+        "live_signals": live_signals,
+        "ranked_triggers": ranked_triggers,
+        "deltas": payload.get("deltas", []),
+    }, None
+
+
+def handle_generate(job, context, report_progress):
+    payload = job["payload"]
+    openai_client = context["openai_client"]
+    args = (payload["city"], payload["trigger"], payload["tone"], payload["live_signals"], payload["company_profile"])
+    use_cache = payload.get("use_cache", True)
+
+    image_prompt = payload.get("image_prompt")
+    if payload.get("variant"):
+        # A variant picked from a variants job: Call 2 is already done
+        creative = tuple(payload["variant"][key] for key in backend.CREATIVE_KEYS)
+    else:
+        report_progress({"stage": "creative"})
+        if payload.get("stream") and not payload.get("fast"):
+            creative, image_prompt = _stream_creative(openai_client, args, use_cache, report_progress)
+        elif payload.get("fast"):
+            *creative, image_prompt = backend.generate_creative_package_fast(openai_client, *args, use_cache=use_cache)
+        else:
+            creative = backend.generate_creative_assets(openai_client, *args, use_cache=use_cache)
+    post_text, hashtags, target_audience, predicted_impact_rating, predicted_impact_reasoning = creative
+
+    if not image_prompt:
+        report_progress({"stage": "image_prompt", "post_text": post_text})
+        image_prompt = backend.generate_safe_image_prompt(openai_client, post_text, payload["company_profile"], use_cache=use_cache)
+
+    report_progress({"stage": "image", "post_text": post_text, "image_prompt": image_prompt})
+    image_bytes, match = backend.generate_or_reuse_image(
+        openai_client, image_prompt, payload["company_profile"], draft=payload.get("draft_image", False),
+        reuse=payload.get("reuse_image", True), threshold=payload.get("reuse_threshold")
+    )
+    # The review preview and every channel's encode are ready before the user gets there
+    backend.image_cache.warm(image_bytes)
+    return {
+        "post_text": post_text,
+        "hashtags": hashtags,
+        "target_audience": target_audience,
+        "predicted_impact_rating": predicted_impact_rating,
+        "predicted_impact_reasoning": predicted_impact_reasoning,
+        "image_prompt": image_prompt,
+        "reused_image": match._asdict() if match else None,
+    }, image_bytes
+
+
+def _stream_creative(openai_client, args, use_cache, report_progress):
+    """
+    Streams Call 2 into the job's progress so the UI can render post_text as it
+    is written, and fires Call 3 the moment post_text closes instead of waiting
+    for hashtags/audience/impact. Returns (creative 5-tuple, image_prompt).
+    """
+    company_profile = args[4]
+    fields = {}
+    image_prompt_future = None
+    last_write = 0.0
+    creative = None
+    for kind, key, value in backend.stream_creative_assets(openai_client, *args, use_cache=use_cache):
+        if kind == "done":
+            creative = value
+            break
+        fields[key] = value
+        if kind == "value" and key == "post_text" and image_prompt_future is None:
+            print("[Jobs] post_text closed, starting image prompt early (Call 3)")
+            image_prompt_future = _overlap_executor.submit(
+                tracing.wrap(backend.generate_safe_image_prompt), openai_client, value, company_profile, use_cache=use_cache
+            )
+        now = time.monotonic()
+        if kind == "value" or now - last_write >= STREAM_PROGRESS_INTERVAL:
+            report_progress({"stage": "creative", "streaming": True, **fields})
+            last_write = now
+
+    if image_prompt_future is None:
+        return creative, None
+    report_progress({"stage": "image_prompt", "streaming": True, **fields})
+    return creative, image_prompt_future.result()
+
+
+def handle_variants(job, context, report_progress):
+    """
+    N ranked creative candidates in one call and no image; the app submits a
+    generate job with the picked one as payload["variant"].
+    """
+    payload = job["payload"]
+    args = (payload["city"], payload["trigger"], payload["tone"], payload["live_signals"], payload["company_profile"])
+    report_progress({"stage": "variants"})
+    variants = backend.generate_creative_variants(
+        context["openai_client"], *args, n=payload.get("n", 3), use_cache=payload.get("use_cache", True)
+    )
+    return {"variants": variants}, None
+
+
+HANDLERS = {
+    "analyze": handle_analyze,
+    "generate": handle_generate,
+    "variants": handle_variants,
+}
+
+
+class WorkerPool:
+    def __init__(self, queue, context, size=4, handlers=None, poll_interval=0.5):
+        self.queue = queue
+        self.context = context
+        self.size = size
+        self.handlers = handlers or HANDLERS
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.size):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"[Jobs] Started {self.size} workers")
+        return self
+
+    def submit(self, kind, payload):
+        job_id = self.queue.submit(kind, payload)
+        self._wake.set()
+        return job_id
+
+    def _work(self):
+        kinds = list(self.handlers)
+        while True:
+            job = self.queue.claim(kinds)
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _heartbeat(self, job_id, attempt, stop):
+        while not stop.wait(HEARTBEAT_SECONDS):
+            try:
+                self.queue.renew_lease(job_id, attempt)
+            except sqlite3.Error as e:
+                print(f"[Jobs] ❌ Could not renew the lease of job {job_id}: {e}")
+
+    def _run(self, job):
+        attempt = job["attempts"] + 1
+        print(f"[Jobs] Running {job['kind']} job {job['id']} (attempt {attempt})")
+        stop = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job["id"], attempt, stop), daemon=True,
+                         name=f"job-heartbeat-{job['id'][:8]}").start()
+        try:
+            # The job id doubles as the trace id, so the UI can show the job's waterfall
+            with tracing.trace(f"job.{job['kind']}", trace_id=job["id"], attempt=attempt):
+                result, image = self.handlers[job["kind"]](
+                    job, self.context, lambda progress: self.queue.update_progress(job["id"], attempt, progress)
+                )
+            if self.queue.complete(job["id"], attempt, result, image):
+                print(f"[Jobs] ✅ {job['kind']} job {job['id']} done")
+            else:
+                print(f"[Jobs] ⚠️ Dropped the result of {job['kind']} job {job['id']}: attempt {attempt} lost its lease")
+        except Exception as e:
+            print(f"[Jobs] ❌ {job['kind']} job {job['id']} failed: {e}")
+            if not self.queue.fail(job["id"], attempt, str(e)):
+                print(f"[Jobs] ⚠️ Dropped the failure of {job['kind']} job {job['id']}: attempt {attempt} lost its lease")
+        finally:
+            stop.set()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def ensure_workers(keys, openai_client, size=4):
+    """
+    Returns the process-wide worker pool, starting it on first call. Streamlit reruns
+    reuse the already-imported module, so the pool outlives every rerun.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            queue = JobQueue(os.path.join(backend.DATA_DIR, "jobs.db"))
+            _pool = WorkerPool(queue, {"keys": keys, "openai_client": openai_client}, size=size).start()
+    return _pool
+
+
+# --- Re-strategizing on signal changes ---
+class SignalChangeScheduler:
+    """
+    Watches the signal snapshot store and submits an analyze job for each watched
+    (brand, city) pair whose city's signals changed materially, so the strategist
+    only runs when the world did. Polls the snapshot version, which is a single
+    SQLite read, so every process can run one without extra API calls.
+    """
+    def __init__(self, pool, detector, poll_interval=15):
+        self.pool = pool
+        self.detector = detector
+        self.poll_interval = poll_interval
+        self.jobs_submitted = 0
+        self._watched = set()
+        self._latest = {}  # (brand, city) -> (job id, material deltas)
+        self._seen_version = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, brand, city):
+        with self._lock:
+            self._watched.add((brand, city))
+
+    def unwatch(self, brand, city):
+        with self._lock:
+            self._watched.discard((brand, city))
+
+    def watched(self):
+        with self._lock:
+            return sorted(self._watched)
+
+    def latest_job(self, brand, city):
+        """
+        (job id, material deltas) of the last change-triggered analysis for the pair, or None.
+        """
+        with self._lock:
+            return self._latest.get((brand, city))
+
+    def check(self, signals_by_city):
+        """
+        Runs the detector over {city: live_signal} and schedules the watched pairs
+        of every city with a material delta. Returns the submitted job ids.
+        """
+        submitted = []
+        for city, signals in signals_by_city.items():
+            deltas = self.detector.observe(city, signals)
+            if not deltas:
+                continue
+            with self._lock:
+                brands = [brand for brand, watched_city in self._watched if watched_city == city]
+            for brand in brands:
+                job_id = self.pool.submit("analyze", {"brand": brand, "city": city, "reason": "signal_change",
+                                                      "deltas": deltas})
+                with self._lock:
+                    self._latest[(brand, city)] = (job_id, deltas)
+                    self.jobs_submitted += 1
+                submitted.append(job_id)
+        return submitted
+
+    def poll_once(self):
+        version = backend.snapshot_store.version()
+        if version == self._seen_version or version == 0:
+            return []
+        self._seen_version = version
+        with tracing.trace("signals.change_check", version=version):
+            return self.check(backend.fetch_signals_bulk(self.pool.context["keys"]))
+
+    def _loop(self):
+        while True:
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[Changes] ❌ Change check failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="signal-changes")
+            self._thread.start()
+        return self
+
+
+_change_scheduler = None
+
+
+def ensure_change_scheduler(pool, poll_interval=15):
+    """
+    Returns the process-wide change scheduler, starting it on first call.
+    """
+    global _change_scheduler
+    with _pool_lock:
+        if _change_scheduler is None:
+            _change_scheduler = SignalChangeScheduler(pool, backend.change_detector, poll_interval).start()
+    return _change_scheduler
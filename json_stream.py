@@ -0,0 +1,146 @@
+"""
+Incremental parser for a streamed top-level JSON object.
+
+Feed it the text deltas of a streaming chat completion and it reports:
+  ("partial", key, text_so_far)  while a top-level string value is arriving
+  ("value", key, value)          as soon as a top-level value is complete
+so the UI can render post_text token by token and fill in the other fields
+the moment their keys close, long before the whole JSON has arrived.
+"""
+import json
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class IncrementalJSONObjectParser:
+    def __init__(self):
+        self._state = "start"   # start, key_or_end, key, colon, value, string, nested, scalar, comma_or_end, done
+        self._key = ""
+        self._raw = []          # raw text of a nested/scalar value
+        self._text = []         # decoded text of a string value
+        self._escape = None     # None, "" (just saw a backslash) or the \\u hex digits so far
+        self._depth = 0
+        self._in_nested_string = False
+        self._nested_escape = False
+        self.values = {}
+
+    def feed(self, chunk):
+        events = []
+        partial_grew = False
+        for ch in chunk:
+            state = self._state
+            if state == "start":
+                if ch == "{":
+                    self._state = "key_or_end"
+            elif state == "key_or_end":
+                if ch == '"':
+                    self._state, self._key, self._escape = "key", "", None
+                    self._text = []
+                elif ch == "}":
+                    self._state = "done"
+            elif state == "key":
+                if self._consume_string_char(ch):
+                    self._key = "".join(self._text)
+                    self._state = "colon"
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+            elif state == "value":
+                if ch.isspace():
+                    continue
+                if ch == '"':
+                    self._state, self._text, self._escape = "string", [], None
+                elif ch in "[{":
+                    self._state, self._raw, self._depth = "nested", [ch], 1
+                    self._in_nested_string = self._nested_escape = False
+                else:
+                    self._state, self._raw = "scalar", [ch]
+            elif state == "string":
+                before = len(self._text)
+                if self._consume_string_char(ch):
+                    if partial_grew:
+                        events.append(("partial", self._key, self._partial_text()))
+                        partial_grew = False
+                    self._finish_value("".join(self._text), events)
+                elif len(self._text) != before:
+                    partial_grew = True
+            elif state == "nested":
+                self._raw.append(ch)
+                if self._in_nested_string:
+                    if self._nested_escape:
+                        self._nested_escape = False
+                    elif ch == "\\":
+                        self._nested_escape = True
+                    elif ch == '"':
+                        self._in_nested_string = False
+                elif ch == '"':
+                    self._in_nested_string = True
+                elif ch in "[{":
+                    self._depth += 1
+                elif ch in "]}":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._finish_value(json.loads("".join(self._raw)), events)
+            elif state == "scalar":
+                if ch in ",}":
+                    self._finish_value(json.loads("".join(self._raw).strip()), events)
+                    self._close(ch)
+                else:
+                    self._raw.append(ch)
+            elif state == "comma_or_end":
+                self._close(ch)
+        if partial_grew and self._state == "string":
+            events.append(("partial", self._key, self._partial_text()))
+        return events
+
+    def _consume_string_char(self, ch):
+        """
+        Appends one character of a JSON string body to self._text.
+        Returns True when ch is the closing quote.
+        """
+        if self._escape is not None:
+            if self._escape == "" and ch != "u":
+                self._text.append(_ESCAPES.get(ch, ch))
+                self._escape = None
+            elif self._escape == "":
+                self._escape = "u"
+            else:
+                self._escape += ch
+                if len(self._escape) == 5:
+                    code = int(self._escape[1:], 16)
+                    if 0xDC00 <= code <= 0xDFFF and self._text and 0xD800 <= ord(self._text[-1]) <= 0xDBFF:
+                        # Low half of a surrogate pair (emoji escaped by ensure_ascii)
+                        high = ord(self._text.pop())
+                        code = 0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)
+                    self._text.append(chr(code))
+                    self._escape = None
+            return False
+        if ch == "\\":
+            self._escape = ""
+            return False
+        if ch == '"':
+            return True
+        self._text.append(ch)
+        return False
+
+    def _partial_text(self):
+        """Decoded text so far, minus a dangling high surrogate still waiting for its pair."""
+        text = "".join(self._text)
+        if text and 0xD800 <= ord(text[-1]) <= 0xDBFF:
+            text = text[:-1]
+        return text
+
+    def _finish_value(self, value, events):
+        self.values[self._key] = value
+        events.append(("value", self._key, value))
+        self._state = "comma_or_end"
+
+    def _close(self, ch):
+        if ch == ",":
+            self._state = "key_or_end"
+        elif ch == "}":
+            self._state = "done"
+
+    @property
+    def done(self):
+        return self._state == "done"
@@ -0,0 +1,157 @@
+"""
+Content-addressed cache for LLM responses.
+The key is a hash of everything that determines the reply (model, system
+prompt, user prompt, response_format), so identical requests (Analyze pressed
+twice, two teammates on the same brand and city) are answered locally.
+Memory tier is LRU-bounded; an optional SQLite tier survives restarts and is
+opened on first use.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(model, messages, response_format=None):
+    system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+    user = "\n".join(m["content"] for m in messages if m["role"] != "system")
+    canonical = json.dumps(
+        {"model": model, "system": system, "user": user, "response_format": response_format},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, max_entries=256, max_disk_entries=5000, db_path=None):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()  # key -> (content, latency_s, expires_at)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.saved_latency_s = 0.0
+        self.db_path = db_path
+        self._db = None
+        self._db_opened = False  # the file is opened on first use, not at import
+
+    # --- Disk tier ---
+    def _disk(self):
+        """
+        The SQLite connection, opened on first call; None without a disk tier. Caller holds the lock.
+        """
+        if not self._db_opened:
+            self._db_opened = True
+            if self.db_path:
+                self._open_db(self.db_path)
+        return self._db
+
+    def _open_db(self, db_path):
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, content TEXT NOT NULL, latency_s REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[Cache] ❌ LLM disk cache disabled, could not open {db_path}: {e}")
+            self._db = None
+
+    def _disk_get(self, key):
+        db = self._disk()
+        if db is None:
+            return None
+        row = db.execute(
+            "SELECT content, latency_s, expires_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def _disk_put(self, key, entry):
+        db = self._disk()
+        if db is None:
+            return
+        db.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, content, latency_s, expires_at) VALUES (?, ?, ?, ?)",
+            (key, *entry)
+        )
+        count = db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_disk_entries:
+            # Drop whatever expires soonest
+            db.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY expires_at LIMIT ?)",
+                (count - self.max_disk_entries,)
+            )
+        db.commit()
+
+    # --- Public API ---
+    def get(self, key):
+        """
+        Returns the cached response text, or None if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._disk_get(key)
+            if entry is None or entry[2] <= now:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._store(key, entry)
+            self.hits += 1
+            self.saved_latency_s += entry[1]
+            return entry[0]
+
+    def contains(self, key):
+        """
+        True if a fresh entry exists. Unlike get(), does not touch the hit/miss stats.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key) or self._disk_get(key)
+            return entry is not None and entry[2] > now
+
+    def put(self, key, content, latency_s, ttl):
+        entry = (content, latency_s, time.time() + ttl)
+        with self._lock:
+            self._store(key, entry)
+            self._disk_put(key, entry)
+
+    def record_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            db = self._disk()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "saved_latency_s": round(self.saved_latency_s, 2),
+                "entries": len(self._entries),
+            }
@@ -0,0 +1,347 @@
+"""
+Brand profile registry: one JSON (or YAML, if PyYAML is installed) file per
+brand in profiles/, validated against a small schema and indexed by brand and
+industry for O(1) lookups.
+
+Each brand's system prompts are compiled once when its file is loaded. They are
+built from the same templates as before, so every request for a brand starts
+with a byte-identical system prompt and provider-side prompt caching can apply.
+The directory is re-scanned (at most every check_interval seconds, on access)
+and changed files are reloaded in place: onboarding a brand is dropping a file
+in, with no restart.
+
+A profile file looks like:
+    {"brand": "zomato", "industry": "Food & Q-Commerce", "voice": "...",
+     "product_examples": ["Biryani", "Pizza"], "order": 3}
+"order" (optional) sorts brands in the UI; "brand_name" (optional) defaults to
+the upper-cased brand key.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+try:
+    import yaml
+except ImportError:  # YAML profiles are optional
+    yaml = None
+
+REQUIRED_FIELDS = {"brand": str, "industry": str, "voice": str, "product_examples": list}
+OPTIONAL_FIELDS = {"brand_name": str, "order": int}
+PROFILE_EXTENSIONS = (".json", ".yaml", ".yml")
+# Stands in for the post text when the image-prompt template is compiled
+POST_TEXT_SLOT = "\x00post_text\x00"
+
+CompiledPrompts = namedtuple(
+    "CompiledPrompts",
+    ["strategist_system", "creative_system", "fast_creative_system", "variants_creative_system",
+     "image_prompt_head", "image_prompt_tail"]
+)
+
+
+class ProfileError(ValueError):
+    pass
+
+
+def validate_profile(data, source="profile"):
+    """
+    Raises ProfileError if data does not match the profile schema.
+    """
+    if not isinstance(data, dict):
+        raise ProfileError(f"{source}: expected an object, got {type(data).__name__}")
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            raise ProfileError(f"{source}: missing required field '{field}'")
+    for field, value in data.items():
+        kind = REQUIRED_FIELDS.get(field) or OPTIONAL_FIELDS.get(field)
+        if kind is None:
+            raise ProfileError(f"{source}: unknown field '{field}'")
+        if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+            raise ProfileError(f"{source}: '{field}' must be a {kind.__name__}")
+        if kind is str and not value.strip():
+            raise ProfileError(f"{source}: '{field}' must not be empty")
+    if not data["product_examples"] or not all(isinstance(p, str) and p.strip() for p in data["product_examples"]):
+        raise ProfileError(f"{source}: 'product_examples' must be a non-empty list of strings")
+
+
+def to_company_profile(data):
+    """
+    The profile dict the pipeline expects: industry, voice, product_examples, brand_name.
+    """
+    return {
+        "industry": data["industry"],
+        "voice": data["voice"],
+        "product_examples": list(data["product_examples"]),
+        "brand_name": data.get("brand_name") or data["brand"].upper(),
+    }
+
+
+# --- Prompt templates (the text every call has always sent) ---
+def _image_prompt_template(company_profile, post_text):
+    return f"""
+        You are a creative director for the brand *{company_profile['brand_name']}*.
+        Your brand voice is: *{company_profile['voice']}*
+
+        **TASK:** Read the following social media post. Your job is to create a single, visually descriptive DALL-E prompt for a photorealistic image to accompany it.
+
+        **CRITICAL SAFETY GUARDRAIL:**
+        The image prompt MUST be 100% positive and focus *only* on the *solution* or *product* mentioned in the post.
+        - **DO NOT** mention the negative problem (e.g., "haze", "pollution", "rain", "bad weather", "smog", "unhealthy").
+        - **DO** focus on the positive outcome (e.g., "delicious food", "cozy indoors", "happy person", "new fashion").
+        - **BE LITERAL.** Avoid metaphors like "explosion of flavor" or "killer deal".
+        
+        **Post Text:**
+        "{post_text}"
+
+        Respond *ONLY* with the final, safe image prompt.
+        
+        **Example:**
+        If the post is "Delhi's haze is bad! Stay in and order our delicious biryani."
+        Your prompt should be: "A vibrant, top-down photorealistic shot of a steaming, aromatic bowl of biryani and a raita on a modern dining table."
+        (Notice: No mention of "haze" or "Delhi").
+        """
+
+
+def _creative_system_prompt(company_profile):
+    return f"""
+        You are an expert social media manager and marketing strategist for the brand *{company_profile['brand_name']}*.
+        Your brand voice is: *{company_profile['voice']}*
+        Your relevant products are: *{", ".join(company_profile['product_examples'])}*
+        
+        You MUST generate **five** things in a JSON format:
+        1.  `post_text`: A short, ready-to-publish social media post (under 500 characters).
+        2.  `hashtags`: A JSON array of 3-5 relevant and trending hashtags.
+        3.  `target_audience`: A JSON array of 2-3 specific audience segments this post will appeal to.
+        4.  `predicted_impact_rating`: A single rating ("High", "Medium", or "Low") of this post's potential.
+        5.  `predicted_impact_reasoning`: A 1-sentence analysis of *why* this post will perform well.
+        
+        Respond *ONLY* with a valid JSON object. (Do NOT include `image_prompt`).
+        """
+
+
+def _variants_creative_system_prompt(company_profile):
+    return f"""
+        You are an expert social media manager and marketing strategist for the brand *{company_profile['brand_name']}*.
+        Your brand voice is: *{company_profile['voice']}*
+        Your relevant products are: *{", ".join(company_profile['product_examples'])}*
+        
+        You MUST write the number of **distinct** post variants asked for in the request. Each variant takes a
+        different angle, hook or product on the same trigger; do NOT rephrase one post several times.
+        For each variant, generate **five** things:
+        1.  `post_text`: A short, ready-to-publish social media post (under 500 characters).
+        2.  `hashtags`: A JSON array of 3-5 relevant and trending hashtags.
+        3.  `target_audience`: A JSON array of 2-3 specific audience segments this post will appeal to.
+        4.  `predicted_impact_rating`: A single rating ("High", "Medium", or "Low") of this post's potential.
+        5.  `predicted_impact_reasoning`: A 1-sentence analysis of *why* this post will perform well.
+        
+        Respond *ONLY* with a valid JSON object with a key "variants", a JSON list of the variant objects.
+        (Do NOT include `image_prompt`).
+        """
+
+
+def _fast_creative_system_prompt(company_profile):
+    return f"""
+        You are an expert social media manager, marketing strategist and creative director for the brand *{company_profile['brand_name']}*.
+        Your brand voice is: *{company_profile['voice']}*
+        Your relevant products are: *{", ".join(company_profile['product_examples'])}*
+        
+        You MUST generate **six** things in a JSON format:
+        1.  `post_text`: A short, ready-to-publish social media post (under 500 characters).
+        2.  `hashtags`: A JSON array of 3-5 relevant and trending hashtags.
+        3.  `target_audience`: A JSON array of 2-3 specific audience segments this post will appeal to.
+        4.  `predicted_impact_rating`: A single rating ("High", "Medium", or "Low") of this post's potential.
+        5.  `predicted_impact_reasoning`: A 1-sentence analysis of *why* this post will perform well.
+        6.  `image_prompt`: A single, visually descriptive DALL-E prompt for a photorealistic image to accompany the post.
+        
+        **CRITICAL SAFETY GUARDRAIL (for `image_prompt` only):**
+        The image prompt MUST be 100% positive and focus *only* on the *solution* or *product* mentioned in the post.
+        - **DO NOT** mention the negative problem (e.g., "haze", "pollution", "rain", "bad weather", "smog", "unhealthy").
+        - **DO NOT** mention the city.
+        - **DO** focus on the positive outcome (e.g., "delicious food", "cozy indoors", "happy person", "new fashion").
+        - **BE LITERAL.** Avoid metaphors like "explosion of flavor" or "killer deal".
+        
+        Respond *ONLY* with a valid JSON object.
+        """
+
+
+def _strategist_system_prompt(company_profile):
+    industry = company_profile['industry']
+    return f"""
+        You are a marketing strategist for a *{industry}* brand with this voice: *{company_profile['voice']}*.
+        Your task is to analyze live data and identify *all* commercially-valuable triggers.
+        
+        Priority Guide:
+        1.  **High Priority:** Mass Cultural Events (Holidays, Sports) and Safety/Urgency Triggers (Heavy Rain, AQI > 200).
+        2.  **Low Priority:** Ambient Triggers (e.g., Clear Skies, Haze, regular news).
+        
+        **BRAND SAFETY GUARDRAIL:**
+        You MUST ignore any triggers that are negative, tragic, or politically sensitive. Focus only on positive or neutral events.
+
+        **FALLBACK RULE:**
+        If no High Priority triggers are found, you MUST identify and return at least one Low Priority 'Ambient' trigger.
+        
+        **TASK:**
+        Return a JSON object with a key "triggers", which is a JSON list of all *brand-safe* triggers, ranked by priority.
+        For each trigger, provide a 'trigger', 'tone', and 'reasoning'.
+        
+        Respond *ONLY* with a valid JSON object.
+        Example:
+        {{"triggers": [
+          {{"trigger": "India Cricket Match", "tone": "Passionate and exciting", "reasoning": "High-priority cultural event."}},
+          {{"trigger": "Hazy Day", "tone": "Cozy and relaxed", "reasoning": "Low-priority ambient trigger."}}
+        ]}}
+        """
+
+
+def compile_prompts(company_profile):
+    """
+    Renders a profile's system prompts once. The image-prompt system message
+    depends on the post, so it is kept as the text before and after it.
+    """
+    head, tail = _image_prompt_template(company_profile, POST_TEXT_SLOT).split(POST_TEXT_SLOT)
+    return CompiledPrompts(
+        strategist_system=_strategist_system_prompt(company_profile),
+        creative_system=_creative_system_prompt(company_profile),
+        fast_creative_system=_fast_creative_system_prompt(company_profile),
+        variants_creative_system=_variants_creative_system_prompt(company_profile),
+        image_prompt_head=head,
+        image_prompt_tail=tail,
+    )
+
+
+def profile_fingerprint(company_profile):
+    return (company_profile["brand_name"], company_profile["industry"], company_profile["voice"],
+            tuple(company_profile["product_examples"]))
+
+
+class ProfileRegistry:
+    def __init__(self, directory, check_interval=2.0, max_compiled=1024):
+        self.directory = directory
+        self.check_interval = check_interval
+        self.max_compiled = max_compiled
+        self.version = 0
+        self.errors = {}        # file name -> validation error of the last load
+        self._profiles = {}     # brand -> company profile dict
+        self._industries = {}   # industry -> [brand, ...] in display order
+        self._compiled = OrderedDict()  # profile fingerprint -> CompiledPrompts
+        self._last_good = {}    # file name -> last profile data that validated
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        self.reload_if_changed(force=True)
+
+    # --- Loading ---
+    def _files(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except OSError:
+            return []
+        return [name for name in names if name.endswith(PROFILE_EXTENSIONS)
+                and (yaml is not None or name.endswith(".json"))]
+
+    def _scan(self):
+        signature = []
+        for name in self._files():
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            signature.append((name, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _read(self, name):
+        with open(os.path.join(self.directory, name), encoding="utf-8") as f:
+            if name.endswith(".json"):
+                return json.load(f)
+            return yaml.safe_load(f)
+
+    def reload_if_changed(self, force=False):
+        """
+        Re-reads the directory if any profile file was added, removed or modified.
+        A file that fails validation is reported in .errors and keeps its last good
+        version, if it had one; the rest still load.
+        Returns True if the registry was reloaded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked_at < self.check_interval:
+                return False
+            self._checked_at = now
+            signature = self._scan()
+            if signature == self._signature:
+                return False
+
+            entries, errors = [], {}
+            for name, _, _ in signature:
+                try:
+                    data = self._read(name)
+                    validate_profile(data, name)
+                except Exception as e:  # OSError, ValueError, ProfileError, yaml.YAMLError
+                    errors[name] = str(e) if isinstance(e, ProfileError) else f"{name}: {e}"
+                    # A half-saved or broken edit keeps serving the last good version of the file
+                    data = self._last_good.get(name)
+                    if data is None:
+                        continue
+                entries.append((data.get("order", 1_000_000), name, data))
+
+            profiles, industries, compiled = {}, {}, OrderedDict()
+            for _, name, data in sorted(entries, key=lambda entry: entry[:2]):
+                brand = data["brand"]
+                if brand in profiles:
+                    errors[name] = f"{name}: duplicate brand '{brand}'"
+                    continue
+                profile = to_company_profile(data)
+                profiles[brand] = profile
+                industries.setdefault(profile["industry"], []).append(brand)
+                compiled[profile_fingerprint(profile)] = compile_prompts(profile)
+
+            self._last_good = {name: data for _, name, data in entries}
+            self._profiles, self._industries, self._compiled = profiles, industries, compiled
+            self._signature = signature
+            self.errors = errors
+            self.version += 1
+        for error in errors.values():
+            print(f"[Profiles] ❌ {error}")
+        print(f"[Profiles] ✅ Loaded {len(profiles)} brands in {len(industries)} industries (v{self.version})")
+        return True
+
+    # --- Lookups ---
+    def get(self, brand):
+        """
+        A copy of the brand's company profile. Raises KeyError for an unknown brand.
+        """
+        self.reload_if_changed()
+        profile = self._profiles.get(brand)
+        if profile is None:
+            raise KeyError(f"Unknown brand: {brand}")
+        return {**profile, "product_examples": list(profile["product_examples"])}
+
+    def brands(self):
+        self.reload_if_changed()
+        return [brand for brands in self._industries.values() for brand in brands]
+
+    def industries(self):
+        """
+        {industry: [brand, ...]} in display order.
+        """
+        self.reload_if_changed()
+        return {industry: list(brands) for industry, brands in self._industries.items()}
+
+    def prompts_for(self, company_profile):
+        """
+        The compiled prompts for a profile dict: precompiled for every registered
+        brand, compiled and memoised on first use for anything else (e.g. an old
+        job payload, or a profile edited since).
+        """
+        key = profile_fingerprint(company_profile)
+        prompts = self._compiled.get(key)  # lock-free read; the dict is only swapped or appended to
+        if prompts is not None:
+            return prompts
+        with self._lock:
+            prompts = self._compiled.get(key)
+            if prompts is None:
+                prompts = self._compiled[key] = compile_prompts(company_profile)
+                while len(self._compiled) > max(self.max_compiled, len(self._profiles)):
+                    self._compiled.popitem(last=False)
+            return prompts
@@ -0,0 +1,244 @@
+"""
+Fan-out publisher: sends one post to every configured channel concurrently.
+
+Each channel is a Publisher registered in PUBLISHERS. publish_all() runs them
+in parallel over a pooled session, retries each channel on its own with
+backoff (honouring Retry-After on 429), and returns one PublishResult per
+channel. Posting is not idempotent, so only failures where the channel cannot
+have posted are retried: a 429, or a connection that was never made. A 5xx or
+a timeout after the request went out may already have posted, and is retried
+only for a publisher that sets idempotent = True. To add a channel, subclass
+Publisher and call register_publisher(); app.py does not need to change.
+"""
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import image_derivatives
+import tracing
+
+TELEGRAM_API_BASE = "https://api.telegram.org"
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# The channel rejected the request without acting on it
+NOT_POSTED_STATUS = {429}
+
+
+@dataclass
+class PublishResult:
+    channel: str
+    ok: bool
+    message: str
+    attempts: int = 0
+    latency_s: float = 0.0
+    status_code: int = None
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class Publisher:
+    """
+    One publishing channel. Subclasses set name/label/required_keys and implement send().
+    image_target names the image_derivatives target the image is encoded for before send().
+    idempotent: True if sending the same post twice posts it once, which makes
+    5xx and read errors safe to retry.
+    """
+    name = ""
+    label = ""
+    required_keys = ()
+    image_target = None
+    idempotent = False
+    timeout = (3.05, 30)
+
+    def is_configured(self, keys):
+        return all(keys.get(k) for k in self.required_keys)
+
+    def send(self, session, keys, message_text, image, hashtags):
+        """
+        Makes one attempt and returns the requests.Response (status is checked by the caller).
+        image is an image_derivatives.Derivative (see image_file()).
+        """
+        raise NotImplementedError
+
+    def prepare_image(self, image_bytes):
+        if self.image_target is None:
+            return image_derivatives.Derivative(image_bytes, "image/png", "png", None, None)
+        return image_derivatives.derive(image_bytes, self.image_target)
+
+    @staticmethod
+    def image_file(image):
+        return (f"geopulse.{image.extension}", image.data, image.mime)
+
+    def retry_after(self, response):
+        """
+        Seconds the channel asked us to wait before retrying, if it said.
+        """
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+
+
+class TelegramPublisher(Publisher):
+    name = "telegram"
+    label = "Telegram"
+    required_keys = ("TELEGRAM_BOT_TOKEN", "TELEGRAM_CHAT_ID")
+    image_target = "telegram"
+
+    def send(self, session, keys, message_text, image, hashtags):
+        url = f"{TELEGRAM_API_BASE}/bot{keys['TELEGRAM_BOT_TOKEN']}/sendPhoto"
+        full_caption = f"{message_text}\n\n{' '.join(hashtags)}"
+        payload_data = {'chat_id': keys['TELEGRAM_CHAT_ID'], 'caption': full_caption, 'parse_mode': 'Markdown'}
+        files_to_send = {'photo': self.image_file(image)}
+        return session.post(url, data=payload_data, files=files_to_send, timeout=self.timeout)
+
+    def retry_after(self, response):
+        # Telegram puts it in the body: {"parameters": {"retry_after": 14}}
+        try:
+            return float(response.json()["parameters"]["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return super().retry_after(response)
+
+
+class DiscordPublisher(Publisher):
+    name = "discord"
+    label = "Discord"
+    required_keys = ("DISCORD_WEBHOOK_URL",)
+    image_target = "discord"
+
+    def send(self, session, keys, message_text, image, hashtags):
+        full_message = f"{message_text}\n\n{' '.join(hashtags)}"
+        files_to_send = {
+            'file1': self.image_file(image),
+            'payload_json': (None, json.dumps({'content': full_message}))
+        }
+        return session.post(keys['DISCORD_WEBHOOK_URL'], files=files_to_send, timeout=self.timeout)
+
+    def retry_after(self, response):
+        # Discord sends both; the body value has sub-second precision
+        try:
+            return float(response.json()["retry_after"])
+        except (ValueError, KeyError, TypeError):
+            return super().retry_after(response)
+
+
+PUBLISHERS = {}
+
+
+def register_publisher(publisher):
+    PUBLISHERS[publisher.name] = publisher
+    return publisher
+
+
+register_publisher(DiscordPublisher())
+register_publisher(TelegramPublisher())
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="publish")
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+    return _session
+
+
+def configured_channels(keys):
+    return [name for name, publisher in PUBLISHERS.items() if publisher.is_configured(keys)]
+
+
+def _never_sent(error):
+    """
+    True if the request cannot have reached the channel: the connection itself
+    was never made (refused, DNS failure, connect timeout).
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), urllib3.exceptions.NewConnectionError)
+    return False
+
+
+def publish_one(channel, keys, message_text, image_bytes, hashtags,
+                max_retries=3, base_delay=1.0, max_delay=30.0):
+    """
+    Sends to a single channel, retrying with jittered exponential backoff (or the
+    channel's Retry-After, up to max_delay) on 429 and on connections that were
+    never made; 5xx and read errors only for an idempotent publisher.
+    Never raises: failures, including an unknown channel or an image that will
+    not encode, come back as PublishResult(ok=False).
+    The image is encoded for the channel once (cached by content), not per attempt.
+    """
+    with tracing.span(f"publish.{channel}", kind="publish") as span:
+        publisher = PUBLISHERS.get(channel)
+        try:
+            if publisher is None:
+                raise ValueError(f"unknown channel '{channel}'")
+            image = publisher.prepare_image(image_bytes)
+        except Exception as e:
+            print(f"[Publisher] ❌ FAILED to prepare the post for {channel}: {e}")
+            result = PublishResult(channel, False, f"Could not prepare the post: {e}")
+        else:
+            span.set(bytes_out=len(image.data or b"") + len(message_text or ""))
+            result = _publish_with_retries(channel, keys, message_text, image, hashtags, max_retries, base_delay, max_delay)
+            span.set(retries=result.attempts - 1, status_code=result.status_code)
+        if not result.ok:
+            span.status, span.error = "error", result.message[:300]
+        return result
+
+
+def _publish_with_retries(channel, keys, message_text, image, hashtags, max_retries, base_delay, max_delay):
+    publisher = PUBLISHERS[channel]
+    print(f"[Publisher] Attempting to post to {publisher.label}...")
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        status_code, wait = None, None
+        try:
+            response = publisher.send(get_session(), keys, message_text, image, hashtags)
+            status_code = response.status_code
+            if response.ok:
+                print(f"[Publisher] ✅ SUCCESS! Post sent to your {publisher.label} channel.")
+                return PublishResult(channel, True, "Success", attempt, time.perf_counter() - started, status_code)
+            error = tracing.redact(f"HTTP {status_code}: {response.text[:200]}")
+            retryable = status_code in (RETRYABLE_STATUS if publisher.idempotent else NOT_POSTED_STATUS)
+            if status_code == 429:
+                wait = publisher.retry_after(response)
+        except requests.RequestException as e:
+            error, retryable = tracing.redact(str(e)), publisher.idempotent or _never_sent(e)
+
+        if not retryable or attempt > max_retries or (wait is not None and wait > max_delay):
+            print(f"[Publisher] ❌ FAILED to post to {publisher.label}: {error}")
+            return PublishResult(channel, False, error, attempt, time.perf_counter() - started, status_code)
+        if wait is None:
+            wait = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+        print(f"[Publisher] {publisher.label} attempt {attempt} failed ({error}), retrying in {wait:.1f}s")
+        time.sleep(wait)
+
+
+def publish_all(keys, message_text, image_bytes, hashtags, channels=None, **retry_options):
+    """
+    Publishes to every configured channel (or just `channels`; [] publishes nowhere) in parallel.
+    Returns a list of PublishResult in channel registration order.
+    """
+    if channels is None:
+        channels = configured_channels(keys)
+    futures = [
+        _executor.submit(tracing.wrap(publish_one), channel, keys, message_text, image_bytes, hashtags, **retry_options)
+        for channel in channels
+    ]
+    return [future.result() for future in futures]
@@ -0,0 +1,308 @@
+"""
+Token-bucket rate limits and daily quotas per API key, shared across processes.
+
+Every Streamlit session, job worker and CLI process calls OpenAI, OpenWeather,
+IQAir, Calendarific and NewsAPI with the same keys. These providers count calls
+per key. Each session staying under the limit on its own is not enough: together
+they hit 429s and burn through free-tier daily caps. This module keeps the
+counts in one SQLite file per data directory (WAL mode, opened on first use), so
+every process draws from the same buckets.
+
+  bucket  one per (vendor, endpoint, key): refills at per_minute / 60 tokens a
+          second up to burst; a call takes one token (an image request takes n)
+  quota   one per (vendor, key) and UTC day: calls counted against the tier's
+          daily limit
+
+acquire() waits for a token when the wait fits in max_wait (queueing), and
+raises RateLimited otherwise, or at once when the daily quota is spent, so the
+caller can degrade (stale signal, cached reply) without a round-trip.
+acquire_async() does the same in an event loop without holding a thread while
+it waits. penalize() drains a bucket after a 429 so that every process backs
+off together. Keys are stored as a short hash, never in clear.
+
+Limits are the providers' published numbers for each tier at the time of
+writing. Pick tiers with GEOPULSE_API_TIERS, e.g. "openai=tier2,newsapi=business".
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+Rate = namedtuple("Rate", ["per_minute", "burst"])
+Tier = namedtuple("Tier", ["daily", "endpoints"])  # daily=None: no daily cap
+
+TIERS = {
+    "openweather": {
+        "free": Tier(daily=33_000, endpoints={"weather": Rate(60, 10), "weather_group": Rate(60, 10)}),
+        "startup": Tier(daily=330_000, endpoints={"weather": Rate(600, 50), "weather_group": Rate(600, 50)}),
+    },
+    "iqair": {
+        "community": Tier(daily=500, endpoints={"aqi": Rate(5, 5)}),
+        "startup": Tier(daily=10_000, endpoints={"aqi": Rate(100, 20)}),
+    },
+    "calendarific": {
+        "free": Tier(daily=33, endpoints={"holiday": Rate(10, 5)}),
+        "pro": Tier(daily=3_300, endpoints={"holiday": Rate(60, 10)}),
+    },
+    "newsapi": {
+        "developer": Tier(daily=100, endpoints={"news": Rate(30, 5)}),
+        "business": Tier(daily=8_000, endpoints={"news": Rate(300, 20)}),
+    },
+    "openai": {
+        "tier1": Tier(daily=None, endpoints={"chat": Rate(500, 20), "images": Rate(5, 5)}),
+        "tier2": Tier(daily=None, endpoints={"chat": Rate(5_000, 50), "images": Rate(50, 10)}),
+    },
+}
+DEFAULT_TIERS = {"openweather": "free", "iqair": "community", "calendarific": "free", "newsapi": "developer",
+                 "openai": "tier1"}
+
+
+class RateLimited(Exception):
+    def __init__(self, vendor, endpoint, reason, retry_after):
+        self.vendor = vendor
+        self.endpoint = endpoint
+        self.reason = reason  # "rate" or "quota"
+        self.retry_after = retry_after
+        what = "daily quota spent" if reason == "quota" else "rate limit"
+        super().__init__(f"{vendor} {endpoint}: {what}, retry in {retry_after:.0f}s")
+
+
+def tiers_from_env(value=None):
+    """
+    {vendor: tier name}: DEFAULT_TIERS with GEOPULSE_API_TIERS ("vendor=tier,...") applied.
+    """
+    tiers = dict(DEFAULT_TIERS)
+    for item in (value if value is not None else os.environ.get("GEOPULSE_API_TIERS", "")).split(","):
+        vendor, _, tier = item.strip().partition("=")
+        if not vendor:
+            continue
+        if tier not in TIERS.get(vendor, {}):
+            print(f"[RateLimit] ❌ Unknown tier {item.strip()!r}, keeping {vendor}={tiers.get(vendor)}")
+            continue
+        tiers[vendor] = tier
+    return tiers
+
+
+def key_id(api_key):
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+def _today():
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _seconds_to_midnight():
+    now = datetime.now(timezone.utc)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), timezone.utc)
+    return (midnight - now).total_seconds()
+
+
+class RateLimiter:
+    def __init__(self, db_path, tiers=None):
+        self.db_path = db_path
+        self.tiers = dict(DEFAULT_TIERS)
+        self.tiers.update(tiers or {})
+        self.queued = 0
+        self.waited_s = 0.0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._db = None  # opened on first use, so importing backend creates no file
+
+    def _connection(self):
+        """
+        The shared counters' connection, opened (and old quota days pruned) on first call.
+        Caller holds self._lock.
+        """
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                " name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS quotas ("
+                " name TEXT NOT NULL, day TEXT NOT NULL, used INTEGER NOT NULL, PRIMARY KEY (name, day))"
+            )
+            db.execute("DELETE FROM quotas WHERE day < ?", ((datetime.now(timezone.utc) - timedelta(days=7)).date().isoformat(),))
+            self._db = db
+        return self._db
+
+    def tier(self, vendor):
+        return TIERS[vendor][self.tiers[vendor]]
+
+    def _rate(self, vendor, endpoint):
+        return self.tier(vendor).endpoints.get(endpoint)
+
+    def _check(self, rate, daily, bucket, quota, cost, day, now):
+        """
+        (wait_s, reason, tokens) for taking cost tokens now: wait_s is 0 and reason
+        None when it is allowed. Reads only; call with self._lock held.
+        """
+        db = self._connection()
+        used = db.execute("SELECT used FROM quotas WHERE name = ? AND day = ?", (quota, day)).fetchone()
+        used = used[0] if used else 0
+        if daily is not None and used + cost > daily:
+            return _seconds_to_midnight(), "quota", None
+        tokens = None
+        if rate is not None:
+            row = db.execute("SELECT tokens, updated_at FROM buckets WHERE name = ?", (bucket,)).fetchone()
+            tokens = rate.burst if row is None else min(rate.burst, row[0] + (now - row[1]) * rate.per_minute / 60)
+            if tokens < cost:
+                return (cost - tokens) * 60 / rate.per_minute, "rate", tokens
+        return 0.0, None, tokens
+
+    def try_acquire(self, vendor, endpoint, api_key, cost=1):
+        """
+        Takes cost tokens if the bucket and the daily quota allow it. Returns
+        (allowed, wait_s, reason): wait_s is how long until it would be allowed.
+        """
+        rate = self._rate(vendor, endpoint)
+        daily = self.tier(vendor).daily
+        if rate is None and daily is None:
+            return True, 0.0, None
+        key = key_id(api_key)
+        bucket, quota = f"{vendor}:{endpoint}:{key}", f"{vendor}:{key}"
+        day, now = _today(), time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                wait, reason, tokens = self._check(rate, daily, bucket, quota, cost, day, now)
+                if reason is None:
+                    if rate is not None:
+                        db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                                   (bucket, tokens - cost, now))
+                    db.execute(
+                        "INSERT INTO quotas (name, day, used) VALUES (?, ?, ?)"
+                        " ON CONFLICT (name, day) DO UPDATE SET used = used + excluded.used", (quota, day, cost)
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return reason is None, wait, reason
+
+    def wait_time(self, vendor, endpoint, api_key, cost=1):
+        """
+        (wait_s, reason) until try_acquire() would allow the call, without taking
+        anything. Lets a caller pace a run of calls before it starts each one.
+        """
+        rate = self._rate(vendor, endpoint)
+        daily = self.tier(vendor).daily
+        if rate is None and daily is None:
+            return 0.0, None
+        key = key_id(api_key)
+        with self._lock:
+            wait, reason, _ = self._check(rate, daily, f"{vendor}:{endpoint}:{key}", f"{vendor}:{key}", cost,
+                                          _today(), time.time())
+        return wait, reason
+
+    def acquire(self, vendor, endpoint, api_key, cost=1, max_wait=0.0):
+        """
+        Waits up to max_wait seconds for the call to be allowed. Raises RateLimited
+        when it would take longer, or when the daily quota is spent.
+        """
+        deadline = time.monotonic() + max_wait
+        started = None
+        while True:
+            allowed, wait, reason = self.try_acquire(vendor, endpoint, api_key, cost)
+            if allowed:
+                self._waited(started)
+                return
+            if reason == "quota" or time.monotonic() + wait > deadline:
+                raise self._rejected(vendor, endpoint, reason, wait)
+            if started is None:
+                started = self._queued(vendor, endpoint, wait)
+            time.sleep(wait + 0.01)
+
+    async def acquire_async(self, vendor, endpoint, api_key, cost=1, max_wait=0.0):
+        """
+        acquire() for an event loop: waits with asyncio.sleep, so a queued call holds
+        no thread. Only the short SQLite transaction runs in the default executor.
+        """
+        deadline = time.monotonic() + max_wait
+        started = None
+        while True:
+            allowed, wait, reason = await asyncio.to_thread(self.try_acquire, vendor, endpoint, api_key, cost)
+            if allowed:
+                self._waited(started)
+                return
+            if reason == "quota" or time.monotonic() + wait > deadline:
+                raise self._rejected(vendor, endpoint, reason, wait)
+            if started is None:
+                started = self._queued(vendor, endpoint, wait)
+            await asyncio.sleep(wait + 0.01)
+
+    def _queued(self, vendor, endpoint, wait):
+        with self._lock:
+            self.queued += 1
+        if wait >= 0.5:
+            print(f"[RateLimit] ⏳ {vendor} {endpoint}: waiting {wait:.1f}s for a token")
+        return time.monotonic()
+
+    def _waited(self, started):
+        if started is not None:
+            with self._lock:
+                self.waited_s += time.monotonic() - started
+
+    def _rejected(self, vendor, endpoint, reason, wait):
+        with self._lock:
+            self.rejected += 1
+        print(f"[RateLimit] ❌ {vendor} {endpoint}: "
+              f"{'daily quota spent' if reason == 'quota' else f'no token for {wait:.1f}s'}")
+        return RateLimited(vendor, endpoint, reason, wait)
+
+    def penalize(self, vendor, endpoint, api_key, retry_after=None):
+        """
+        Empties the bucket after a 429, so no process calls again for retry_after
+        seconds (default: the time one token takes to refill).
+        """
+        rate = self._rate(vendor, endpoint)
+        if rate is None:
+            return
+        refill = 60 / rate.per_minute
+        retry_after = retry_after if retry_after is not None else refill
+        tokens = 1 - retry_after / refill  # negative: the bucket is in debt until then
+        with self._lock:
+            self._connection().execute("INSERT OR REPLACE INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?)",
+                                       (f"{vendor}:{endpoint}:{key_id(api_key)}", tokens, time.time()))
+        print(f"[RateLimit] {vendor} {endpoint}: 429, backing off {retry_after:.0f}s in every process")
+
+    def status(self, vendor, api_key):
+        """
+        Per endpoint of the vendor's tier: tokens left now and today's quota use for this key.
+        """
+        tier = self.tier(vendor)
+        key = key_id(api_key)
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            row = db.execute("SELECT used FROM quotas WHERE name = ? AND day = ?",
+                             (f"{vendor}:{key}", _today())).fetchone()
+            buckets = dict((name, (tokens, updated_at)) for name, tokens, updated_at in db.execute(
+                "SELECT name, tokens, updated_at FROM buckets WHERE name LIKE ?", (f"{vendor}:%:{key}",)
+            ).fetchall())
+        used = row[0] if row else 0
+        result = []
+        for endpoint, rate in tier.endpoints.items():
+            tokens, updated_at = buckets.get(f"{vendor}:{endpoint}:{key}", (rate.burst, now))
+            result.append({
+                "vendor": vendor, "endpoint": endpoint, "tier": self.tiers[vendor],
+                "per_minute": rate.per_minute,
+                "tokens": round(max(0.0, min(rate.burst, tokens + (now - updated_at) * rate.per_minute / 60)), 1),
+                "burst": rate.burst, "used_today": used, "daily": tier.daily,
+                "remaining_today": None if tier.daily is None else max(0, tier.daily - used),
+            })
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {"queued": self.queued, "waited_s": round(self.waited_s, 2), "rejected": self.rejected}
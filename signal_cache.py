@@ -0,0 +1,161 @@
+"""
+TTL + LRU cache for live signals, keyed by (city, provider).
+Each provider has its own freshness policy; entries can optionally be mirrored
+to a SQLite file so a Streamlit restart does not start from a cold cache. The
+file is opened on first use, so importing backend creates nothing on disk.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Seconds a provider's value stays fresh.
+DEFAULT_TTLS = {
+    "weather": 10 * 60,
+    "aqi": 60 * 60,
+    "holiday": 24 * 60 * 60,
+    "news": 5 * 60,
+}
+
+
+class SignalCache:
+    def __init__(self, ttls=None, max_entries=512, db_path=None):
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._entries = OrderedDict()  # (city, provider) -> (value, stored_at)
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = {}
+        self._db = None
+        self._db_opened = False  # the file is opened on first use, not at import
+
+    # --- Disk tier ---
+    def _disk(self):
+        """
+        The SQLite connection, opened on first call; None without a disk tier. Caller holds the lock.
+        """
+        if not self._db_opened:
+            self._db_opened = True
+            if self.db_path:
+                self._open_db(self.db_path)
+        return self._db
+
+    def _open_db(self, db_path):
+        try:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS signal_cache ("
+                " city TEXT NOT NULL, provider TEXT NOT NULL, value TEXT NOT NULL,"
+                " stored_at REAL NOT NULL, PRIMARY KEY (city, provider))"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"[Cache] ❌ Disk cache disabled, could not open {db_path}: {e}")
+            self._db = None
+
+    def _disk_get(self, key):
+        db = self._disk()
+        if db is None:
+            return None
+        row = db.execute(
+            "SELECT value, stored_at FROM signal_cache WHERE city = ? AND provider = ?", key
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def _disk_put(self, key, value, stored_at):
+        db = self._disk()
+        if db is None:
+            return
+        db.execute(
+            "INSERT OR REPLACE INTO signal_cache (city, provider, value, stored_at) VALUES (?, ?, ?, ?)",
+            (key[0], key[1], json.dumps(value), stored_at)
+        )
+        db.commit()
+
+    # --- Public API ---
+    def ttl_for(self, provider):
+        return self.ttls.get(provider, 0)
+
+    def set_ttl(self, provider, seconds):
+        self.ttls[provider] = seconds
+
+    def get(self, city, provider):
+        """
+        Returns the cached value if it is still fresh, else None.
+        """
+        key = (city, provider)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._disk_get(key)
+                if entry is not None:
+                    self._store(key, entry)
+            if entry is not None and now - entry[1] < self.ttl_for(provider):
+                self._entries.move_to_end(key)
+                self._hits[provider] = self._hits.get(provider, 0) + 1
+                return entry[0]
+            self._misses[provider] = self._misses.get(provider, 0) + 1
+            return None
+
+    def get_stale(self, city, provider, max_age=None):
+        """
+        Returns (value, age_seconds) for the last stored value even if it has expired,
+        or None if there is none (or it is older than max_age). Used as a fallback when
+        the provider is down; does not count towards the hit/miss stats.
+        """
+        key = (city, provider)
+        with self._lock:
+            entry = self._entries.get(key) or self._disk_get(key)
+        if entry is None:
+            return None
+        age = time.time() - entry[1]
+        if max_age is not None and age > max_age:
+            return None
+        return entry[0], age
+
+    def put(self, city, provider, value):
+        key = (city, provider)
+        stored_at = time.time()
+        with self._lock:
+            self._store(key, (value, stored_at))
+            self._disk_put(key, value, stored_at)
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            db = self._disk()
+            if db is not None:
+                db.execute("DELETE FROM signal_cache")
+                db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self._hits.values())
+            misses = sum(self._misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+                "entries": len(self._entries),
+                "by_provider": {
+                    provider: {"hits": self._hits.get(provider, 0), "misses": self._misses.get(provider, 0)}
+                    for provider in sorted(set(self._hits) | set(self._misses))
+                },
+            }
@@ -0,0 +1,137 @@
+"""
+Change detection over successive live_signal dicts.
+
+In a scheduled setting the strategist does not need to run every cycle, only
+when something it would react to has changed. diff_signals compares a city's
+signals with its baseline. The baseline is the last set that counted as
+material, so slow drift (1°C per refresh) still adds up to a swing. A delta is
+material when:
+
+  aqi        the US AQI moves into another band (default cut-offs 50/100/150/200/300)
+  temp       it is at least temp_swing_c away from the baseline
+  condition  the weather condition changes (Haze -> Rain)
+  holiday    a new holiday value appears
+  top_event  a new top news event appears
+
+Every delta, material or not, goes to the delta log (in memory and, if
+log_path is set, a JSONL file) so the thresholds can be tuned from real data.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_THRESHOLDS = {
+    "aqi_bands": (50, 100, 150, 200, 300),
+    "temp_swing_c": 4.0,
+    "condition": True,
+    "holiday": True,
+    "top_event": True,
+}
+UNAVAILABLE = ("N/A", "None", None)
+
+
+def aqi_band(value, bands):
+    """Index of the AQI band value falls in, or None if it is not a number."""
+    if not isinstance(value, (int, float)):
+        return None
+    return sum(1 for cut in bands if value > cut)
+
+
+def diff_signals(baseline, current, thresholds=None):
+    """
+    Deltas between two live_signal dicts: [{"field", "from", "to", "material", "reason"}].
+    A value turning "N/A"/"None" (an outage, or an event ending) is logged but never material.
+    """
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    deltas = []
+    for field in ("aqi", "temp", "condition", "holiday", "top_event"):
+        before, after = baseline.get(field), current.get(field)
+        if before == after:
+            continue
+        material, reason = False, "changed"
+        if after in UNAVAILABLE:
+            reason = "cleared" if field in ("holiday", "top_event") else "provider unavailable"
+        elif field == "aqi":
+            old_band, new_band = aqi_band(before, thresholds["aqi_bands"]), aqi_band(after, thresholds["aqi_bands"])
+            material = old_band != new_band
+            reason = "crossed an AQI band" if material else "within the same AQI band"
+        elif field == "temp":
+            if isinstance(before, (int, float)) and isinstance(after, (int, float)):
+                material = abs(after - before) >= thresholds["temp_swing_c"]
+                reason = f"swing of {after - before:+.1f}°C"
+            else:
+                material, reason = True, "temperature available again"
+        elif thresholds.get(field):
+            material, reason = True, f"new {field.replace('_', ' ')}"
+        deltas.append({"field": field, "from": before, "to": after, "material": material, "reason": reason})
+    return deltas
+
+
+class ChangeDetector:
+    def __init__(self, thresholds=None, log_path=None, max_log=500):
+        self.thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+        self.log_path = log_path
+        self._baselines = {}  # city -> signals at the last material change
+        self._log = deque(maxlen=max_log)
+        self._lock = threading.Lock()
+        self.observations = 0
+        self.material_changes = 0
+
+    def observe(self, city, signals):
+        """
+        Compares signals with the city's baseline and logs the deltas.
+        Returns the material deltas ([] if nothing material changed). The first
+        observation of a city is material, so a fresh process strategizes once.
+        """
+        now = time.time()
+        with self._lock:
+            self.observations += 1
+            baseline = self._baselines.get(city)
+            if baseline is None:
+                deltas = [{"field": "*", "from": None, "to": None, "material": True, "reason": "first observation"}]
+            else:
+                deltas = diff_signals(baseline, signals, self.thresholds)
+            material = [d for d in deltas if d["material"]]
+            if material:
+                self._baselines[city] = dict(signals)
+                self.material_changes += 1
+            entries = [{"ts": round(now, 3), "city": city, **delta} for delta in deltas]
+            self._log.extend(entries)
+        self._append(entries)
+        if material:
+            print(f"[Changes] 📈 {city}: " + ", ".join(f"{d['field']} {d['reason']}" for d in material))
+        return material
+
+    def _append(self, entries):
+        if not self.log_path or not entries:
+            return
+        try:
+            if os.path.dirname(self.log_path):
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"[Changes] ❌ Could not write the delta log to {self.log_path}: {e}")
+
+    def log(self, limit=50, city=None, material_only=False):
+        """
+        Most recent deltas first.
+        """
+        with self._lock:
+            entries = list(self._log)
+        entries = [e for e in reversed(entries)
+                   if (city is None or e["city"] == city) and (not material_only or e["material"])]
+        return entries[:limit]
+
+    def stats(self):
+        with self._lock:
+            by_field = {}
+            for entry in self._log:
+                counts = by_field.setdefault(entry["field"], {"deltas": 0, "material": 0})
+                counts["deltas"] += 1
+                counts["material"] += int(entry["material"])
+            return {"observations": self.observations, "material_changes": self.material_changes,
+                    "by_field": by_field}
@@ -0,0 +1,325 @@
+"""
+Always-on signal refresher and the shared snapshot store it feeds.
+
+SignalRefresher re-fetches the remote providers (weather, AQI, news) for every
+registered city on per-provider intervals, using the bulk group calls, and
+writes the results to a SQLite snapshot store (WAL mode). Each write bumps a
+global version. Any number of Streamlit workers or CLI processes can read the
+store with no network I/O, and fetch_live_signals only goes to the network
+when a snapshot is missing or older than its max age.
+
+Only one refresher per data directory actually fetches: the others wait on a
+lease row in the same database and take over when it expires. Holidays are not
+snapshotted, they are already a local index lookup.
+
+Run it as its own process instead of inside the app with:
+    python signal_snapshots.py            # refresh forever
+    python signal_snapshots.py --once     # one round, then exit
+"""
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+# Seconds between refreshes, per provider: the shortest the refresher uses.
+# quota_intervals() lengthens them to the configured tier's daily quota.
+DEFAULT_INTERVALS = {"weather": 10 * 60, "aqi": 60 * 60, "news": 30 * 60}
+# Most of a provider's daily quota the refresher may spend; the rest is kept for
+# interactive fetches, bulk runs and the change detector
+REFRESH_QUOTA_SHARE = 0.5
+# A snapshot older than this is stale and readers fetch live instead
+MAX_AGE_INTERVALS = 2
+DEFAULT_MAX_AGES = {provider: MAX_AGE_INTERVALS * interval for provider, interval in DEFAULT_INTERVALS.items()}
+
+
+def quota_intervals(calls_per_round, daily_quotas, intervals=None, share=REFRESH_QUOTA_SHARE):
+    """
+    intervals (default DEFAULT_INTERVALS), each lengthened so that a day of rounds
+    spends at most share of the provider's daily quota.
+    calls_per_round: {provider: calls one round makes}; daily_quotas: {provider: cap, None for none}.
+    E.g. NewsAPI's developer tier allows 100 calls a day: one group call every
+    30 minutes spends 48, a second group call per round doubles the interval.
+    """
+    intervals = dict(intervals or DEFAULT_INTERVALS)
+    for provider, calls in calls_per_round.items():
+        daily = daily_quotas.get(provider)
+        if provider in intervals and daily and calls:
+            intervals[provider] = max(intervals[provider], math.ceil(24 * 60 * 60 * calls / (daily * share)))
+    return intervals
+
+
+class SnapshotStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = None  # opened on first use, so importing backend creates no file
+
+    def _connection(self):
+        """
+        The store's connection, opened (and the schema created) on first call. Caller holds the lock.
+        """
+        if self._db is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " city TEXT NOT NULL, provider TEXT NOT NULL, value TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL, version INTEGER NOT NULL, PRIMARY KEY (city, provider))"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS snapshot_meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshot_lease ("
+                " name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db = db
+        return self._db
+
+    def write(self, values_by_city, fetched_at=None):
+        """
+        Stores {city: {provider: values}} as one new version. Returns the version.
+        """
+        fetched_at = fetched_at or time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT value FROM snapshot_meta WHERE name = 'version'").fetchone()
+                version = (int(row[0]) if row else 0) + 1
+                db.execute("INSERT OR REPLACE INTO snapshot_meta (name, value) VALUES ('version', ?)", (str(version),))
+                db.executemany(
+                    "INSERT OR REPLACE INTO snapshots (city, provider, value, fetched_at, version) VALUES (?, ?, ?, ?, ?)",
+                    [(city, provider, json.dumps(values), fetched_at, version)
+                     for city, providers in values_by_city.items() for provider, values in providers.items()]
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return version
+
+    def read(self, city, max_ages=None):
+        """
+        {provider: values} for a city, leaving out providers older than their max age.
+        """
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(
+                "SELECT provider, value, fetched_at FROM snapshots WHERE city = ?", (city,)
+            ).fetchall()
+        now = time.time()
+        return {
+            provider: json.loads(value) for provider, value, fetched_at in rows
+            if max_ages is None or now - fetched_at <= max_ages.get(provider, 0)
+        }
+
+    def read_all(self, max_ages=None):
+        """
+        {city: {provider: values}} for every city in the store, with the same staleness rule as read().
+        """
+        with self._lock:
+            db = self._connection()
+            rows = db.execute("SELECT city, provider, value, fetched_at FROM snapshots").fetchall()
+        now = time.time()
+        snapshot = {}
+        for city, provider, value, fetched_at in rows:
+            if max_ages is None or now - fetched_at <= max_ages.get(provider, 0):
+                snapshot.setdefault(city, {})[provider] = json.loads(value)
+        return snapshot
+
+    def version(self):
+        with self._lock:
+            db = self._connection()
+            row = db.execute("SELECT value FROM snapshot_meta WHERE name = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _fetched_at(self, provider):
+        with self._lock:
+            db = self._connection()
+            return dict(db.execute(
+                "SELECT city, fetched_at FROM snapshots WHERE provider = ?", (provider,)
+            ).fetchall())
+
+    def oldest_fetch(self, provider, cities):
+        """
+        fetched_at of the provider's oldest snapshot among cities; 0 if any city has none.
+        """
+        rows = self._fetched_at(provider)
+        return min((rows.get(city, 0) for city in cities), default=0)
+
+    def stale_cities(self, provider, cities, max_age, now=None):
+        """
+        The cities whose provider snapshot is missing or at least max_age seconds old.
+        """
+        now = now or time.time()
+        rows = self._fetched_at(provider)
+        return [city for city in cities if now - rows.get(city, 0) >= max_age]
+
+    def status(self):
+        """
+        Per provider: cities covered and the age of the oldest and newest snapshot.
+        """
+        with self._lock:
+            db = self._connection()
+            rows = db.execute(
+                "SELECT provider, COUNT(*), MIN(fetched_at), MAX(fetched_at) FROM snapshots GROUP BY provider"
+            ).fetchall()
+        now = time.time()
+        return [
+            {"provider": provider, "cities": count, "oldest_age_s": round(now - oldest, 1),
+             "newest_age_s": round(now - newest, 1)}
+            for provider, count, oldest, newest in rows
+        ]
+
+    def acquire_lease(self, owner, ttl, name="refresher"):
+        """
+        True if owner holds (or just took) the named lease for the next ttl seconds.
+        """
+        now = time.time()
+        with self._lock:
+            db = self._connection()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT owner, expires_at FROM snapshot_lease WHERE name = ?", (name,)).fetchone()
+                held = row is None or row[0] == owner or row[1] < now
+                if held:
+                    db.execute(
+                        "INSERT OR REPLACE INTO snapshot_lease (name, owner, expires_at) VALUES (?, ?, ?)",
+                        (name, owner, now + ttl)
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return held
+
+    def release_lease(self, owner, name="refresher"):
+        with self._lock:
+            db = self._connection()
+            db.execute("DELETE FROM snapshot_lease WHERE name = ? AND owner = ?", (name, owner))
+
+
+class SignalRefresher:
+    def __init__(self, fetch_bulk, keys, store, cities, intervals=None, tick=30, retry_after=60):
+        """
+        fetch_bulk: callable(keys, cities, providers) -> {city: {provider: values or None}},
+        None meaning that provider failed for that city.
+        """
+        self.fetch_bulk = fetch_bulk
+        self.keys = keys
+        self.store = store
+        self.cities = list(cities)
+        self.intervals = dict(DEFAULT_INTERVALS)
+        if intervals:
+            self.intervals.update(intervals)
+        self.tick = tick
+        self.retry_after = retry_after
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.rounds = 0
+        self.last_error = None
+        self._attempted_at = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def due_providers(self, now=None):
+        """
+        Providers whose oldest city snapshot is older than their interval (and not retried too recently).
+        """
+        now = now or time.time()
+        return [
+            provider for provider, interval in self.intervals.items()
+            if now - self.store.oldest_fetch(provider, self.cities) >= interval
+            and now - self._attempted_at.get(provider, 0) >= min(interval, self.retry_after)
+        ]
+
+    def run_once(self):
+        """
+        Refreshes the due providers if this process holds the lease. Returns the providers refreshed.
+        """
+        if not self.store.acquire_lease(self.owner, ttl=3 * self.tick):
+            return []
+        due = self.due_providers()
+        if not due:
+            return []
+        now = time.time()
+        # Only the cities that are (nearly) due: a city that failed last round is
+        # retried on its own, not together with every city that is still fresh.
+        # Providers due for the same cities share one bulk fetch.
+        groups = {}
+        for provider in due:
+            self._attempted_at[provider] = now
+            cities = self.store.stale_cities(provider, self.cities, max(0, self.intervals[provider] - self.tick), now)
+            groups.setdefault(tuple(cities), []).append(provider)
+        fetched = {}
+        for cities, providers in groups.items():
+            for city, values in self.fetch_bulk(self.keys, list(cities), providers).items():
+                fetched.setdefault(city, {}).update(values)
+        values = {
+            city: {provider: value for provider, value in providers.items() if value is not None}
+            for city, providers in fetched.items()
+        }
+        values = {city: providers for city, providers in values.items() if providers}
+        if values:
+            version = self.store.write(values)
+            print(f"[Refresher] ✅ Snapshot v{version}: {', '.join(due)} for {len(values)} cities")
+        self.rounds += 1
+        return due
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[Refresher] ❌ Refresh round failed: {e}")
+            self._stop.wait(self.tick)
+        self.store.release_lease(self.owner)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="signal-refresher")
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def status(self):
+        return {"owner": self.owner, "rounds": self.rounds, "version": self.store.version(),
+                "last_error": self.last_error, "providers": self.store.status()}
+
+
+def main():
+    import argparse
+
+    import backend
+
+    parser = argparse.ArgumentParser(description="Refresh GeoPulse signals for every registered city.")
+    parser.add_argument("--once", action="store_true", help="run one refresh round and exit")
+    parser.add_argument("--tick", type=int, default=30, help="seconds between schedule checks")
+    args = parser.parse_args()
+    refresher = backend.make_signal_refresher(backend.load_keys(), tick=args.tick)
+    if args.once:
+        refreshed = refresher.run_once()
+        print(f"[Refresher] Refreshed: {', '.join(refreshed) if refreshed else 'nothing (not due, or another refresher holds the lease)'}")
+        return
+    print(f"[Refresher] Refreshing {len(refresher.cities)} cities into {refresher.store.db_path} (Ctrl+C to stop)")
+    refresher.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        refresher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Speculative pre-generation for the HITL step.
+
+While a human reads the ranked triggers, the creative package (Call 2, and
+optionally the image prompt, Call 3) for the top N triggers is generated in
+the background. The replies land in backend.llm_cache, so when the user picks
+one of them the generate job is answered from the cache (or joins the request
+still on the wire) instead of starting from scratch.
+
+Each round (one analysis) has a spend cap. Work for triggers that were not
+picked is cancelled if it has not started yet. Otherwise it finishes and stays
+in the cache, and its estimated cost is counted as wasted spend.
+"""
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import backend
+import tracing
+
+EXPECTED_COMPLETION_TOKENS = {"creative": 300, "image_prompt": 80}
+MAX_ROUNDS = 64
+
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def estimate_cost(messages, completion_tokens, model=backend.OPENAI_TEXT_MODEL):
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    return tracing.llm_cost(model, prompt_tokens, completion_tokens)
+
+
+class _Round:
+    def __init__(self):
+        self.tasks = OrderedDict()  # (trigger, tone) -> task dict
+        self.reserved_usd = 0.0
+        self.picked = None
+        self.closed = False
+
+
+class SpeculativeGenerator:
+    def __init__(self, openai_client, max_workers=3, budget_usd=0.05, top_n=2, with_image_prompt=True):
+        self.openai_client = openai_client
+        self.budget_usd = budget_usd
+        self.top_n = top_n
+        self.with_image_prompt = with_image_prompt
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="geopulse-speculate")
+        self._rounds = OrderedDict()
+        self._lock = threading.Lock()
+        self.launched = 0
+        self.skipped = 0
+        self.cancelled = 0
+        self.hits = 0
+        self.misses = 0
+        self.spent_usd = 0.0
+        self.wasted_usd = 0.0
+
+    def start(self, round_id, city, ranked_triggers, live_signal, company_profile, fast=False, top_n=None):
+        """
+        Starts pre-generating the top N ranked triggers for this round, as far as the
+        round's budget allows. Calling it again for the same round is a no-op.
+        Returns the number of triggers launched.
+        """
+        top_n = self.top_n if top_n is None else top_n
+        with self._lock:
+            if round_id in self._rounds:
+                return 0
+            spec = self._rounds[round_id] = _Round()
+            while len(self._rounds) > MAX_ROUNDS:
+                self._rounds.popitem(last=False)
+
+            launched = 0
+            for ranked in ranked_triggers[:top_n]:
+                pair = (ranked["trigger"], ranked["tone"])
+                if pair in spec.tasks:
+                    continue
+                args = (city, pair[0], pair[1], live_signal, company_profile)
+                estimate = self._estimate(args, fast)
+                if spec.reserved_usd + estimate > self.budget_usd:
+                    print(f"[Speculate] Budget cap reached, not pre-generating '{pair[0]}'")
+                    self.skipped += 1
+                    continue
+                spec.reserved_usd += estimate
+                task = {"state": "queued", "cost_usd": 0.0}
+                spec.tasks[pair] = task
+                task["future"] = self._executor.submit(self._run, spec, pair, task, args, fast)
+                launched += 1
+            self.launched += launched
+        if launched:
+            print(f"[Speculate] Pre-generating {launched} trigger(s) for {city}")
+        return launched
+
+    def _estimate(self, args, fast):
+        if fast:
+            messages = backend.build_fast_creative_messages(*args)
+            completion = EXPECTED_COMPLETION_TOKENS["creative"] + EXPECTED_COMPLETION_TOKENS["image_prompt"]
+            return estimate_cost(messages, completion)
+        cost = estimate_cost(backend.build_creative_messages(*args), EXPECTED_COMPLETION_TOKENS["creative"])
+        if self.with_image_prompt:
+            cost += estimate_cost(backend.build_image_prompt_messages("", args[4]), EXPECTED_COMPLETION_TOKENS["image_prompt"])
+        return cost
+
+    def _run(self, spec, pair, task, args, fast):
+        with tracing.trace("speculate", trigger=pair[0], city=args[0]):
+            self._speculate(spec, pair, task, args, fast)
+
+    def _speculate(self, spec, pair, task, args, fast):
+        with self._lock:
+            if spec.closed and spec.picked != pair:
+                task["state"] = "cancelled"
+                self.cancelled += 1
+                return
+            task["state"] = "running"
+        cost = 0.0
+        try:
+            if fast:
+                messages = backend.build_fast_creative_messages(*args)
+                response_format = {"type": "json_schema", "json_schema": backend.FAST_CREATIVE_SCHEMA}
+                cached = backend.llm_cache.contains(backend.llm_cache_key(backend.OPENAI_TEXT_MODEL, messages, response_format))
+                package = backend.generate_creative_package_fast(self.openai_client, *args)
+                if not cached:
+                    cost += estimate_cost(messages, estimate_tokens(json.dumps(package)))
+            else:
+                messages = backend.build_creative_messages(*args)
+                response_format = {"type": "json_object"}
+                cached = backend.llm_cache.contains(backend.llm_cache_key(backend.OPENAI_TEXT_MODEL, messages, response_format))
+                creative = backend.generate_creative_assets(self.openai_client, *args)
+                if not cached:
+                    cost += estimate_cost(messages, estimate_tokens(json.dumps(creative)))
+
+                if self.with_image_prompt:
+                    messages = backend.build_image_prompt_messages(creative[0], args[4])
+                    cached = backend.llm_cache.contains(backend.llm_cache_key(backend.OPENAI_TEXT_MODEL, messages, None))
+                    image_prompt = backend.generate_safe_image_prompt(self.openai_client, creative[0], args[4])
+                    if not cached:
+                        cost += estimate_cost(messages, estimate_tokens(image_prompt))
+            state = "ready"
+        except Exception as e:
+            print(f"[Speculate] ❌ Pre-generation failed for '{pair[0]}': {e}")
+            state = "failed"
+        with self._lock:
+            task["state"] = state
+            task["cost_usd"] = cost
+            self.spent_usd += cost
+            if spec.closed and spec.picked != pair:
+                self.wasted_usd += cost
+
+    def resolve(self, round_id, trigger, tone):
+        """
+        Records the user's pick: cancels queued work for the other triggers and
+        books finished work for them as wasted spend.
+        Returns True if the pick had been pre-generated.
+        """
+        pair = (trigger, tone)
+        with self._lock:
+            spec = self._rounds.get(round_id)
+            if spec is None or spec.closed:
+                return False
+            spec.closed = True
+            spec.picked = pair
+            task = spec.tasks.get(pair)
+            hit = task is not None and task["state"] in ("queued", "running", "ready")
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._release(spec)
+        print(f"[Speculate] {'⚡ Hit' if hit else 'Miss'} for '{trigger}'")
+        return hit
+
+    def cancel(self, round_id):
+        """
+        Abandons a round without a pick (Start Over, new analysis).
+        """
+        with self._lock:
+            spec = self._rounds.get(round_id)
+            if spec is None or spec.closed:
+                return
+            spec.closed = True
+            self._release(spec)
+
+    def _release(self, spec):
+        for pair, task in spec.tasks.items():
+            if pair == spec.picked:
+                continue
+            if task["future"].cancel():
+                task["state"] = "cancelled"
+                self.cancelled += 1
+            elif task["state"] in ("ready", "failed"):
+                self.wasted_usd += task["cost_usd"]
+
+    def status(self, round_id):
+        """
+        {trigger: state} for a round, in launch order.
+        """
+        with self._lock:
+            spec = self._rounds.get(round_id)
+            return {pair[0]: task["state"] for pair, task in spec.tasks.items()} if spec else {}
+
+    def stats(self):
+        with self._lock:
+            picks = self.hits + self.misses
+            return {
+                "launched": self.launched,
+                "skipped_over_budget": self.skipped,
+                "cancelled": self.cancelled,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / picks, 3) if picks else 0.0,
+                "spent_usd": round(self.spent_usd, 4),
+                "wasted_usd": round(self.wasted_usd, 4),
+            }
+
+
+_speculator = None
+_speculator_lock = threading.Lock()
+
+
+def ensure_speculator(openai_client, **options):
+    """
+    Returns the process-wide speculator, creating it on first call (survives Streamlit reruns).
+    """
+    global _speculator
+    with _speculator_lock:
+        if _speculator is None:
+            _speculator = SpeculativeGenerator(openai_client, **options)
+    return _speculator
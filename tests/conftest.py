@@ -0,0 +1,11 @@
+"""
+Shared test setup: the repo root on sys.path and a throwaway GEOPULSE_DATA_DIR,
+set before anything imports backend, so no test reads or writes .geopulse/.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["GEOPULSE_DATA_DIR"] = tempfile.mkdtemp(prefix="geopulse-tests-")
+os.environ["GEOPULSE_SIGNAL_REFRESH"] = "0"
@@ -0,0 +1,35 @@
+import asyncio
+import base64
+from types import SimpleNamespace
+
+import pytest
+
+import backend
+import tracing
+from async_backend import AsyncPipeline
+
+
+class FakeImages:
+    def __init__(self):
+        self.requests = []
+
+    async def generate(self, **request):
+        self.requests.append(request)
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=base64.b64encode(b"png").decode())])
+
+
+@pytest.mark.parametrize("draft, params", [(False, backend.DALLE_PARAMS), (True, backend.DRAFT_DALLE_PARAMS)])
+def test_image_span_records_the_params_that_were_sent(draft, params):
+    images = FakeImages()
+    pipeline = AsyncPipeline(SimpleNamespace(api_key="test-key", images=images))
+
+    async def main():
+        with tracing.trace("test.image") as root:
+            assert await pipeline.generate_image_with_dalle("a bowl of biryani", draft=draft) == b"png"
+        return root.trace_id
+
+    spans = {span["name"]: span for span in tracing.tracer.get_trace(asyncio.run(main()))}
+    assert images.requests[0]["model"] == params["model"]
+    assert spans["openai.image"]["model"] == params["model"]
+    assert spans["openai.image"]["size"] == params["size"]
+    assert spans["openai.image"]["cost_usd"] == backend.image_cost(params)
@@ -0,0 +1,207 @@
+import json
+import threading
+
+import pytest
+
+import backend
+import rate_limiter
+from circuit_breaker import CLOSED, HALF_OPEN, CircuitBreaker
+from holiday_index import HolidayIndex
+from signal_cache import SignalCache
+from rate_limiter import Rate, RateLimited, RateLimiter, Tier
+
+KEYS = {name: "test-key" for name in backend.KEY_NAMES}
+CITY = "Mumbai"
+
+
+def rate_limited(*args):
+    raise RateLimited("iqair", "aqi", "rate", 12)
+
+
+@pytest.fixture
+def providers(monkeypatch):
+    """
+    Every signal provider answers locally; a test swaps in the one it exercises.
+    """
+    fakes = {
+        "weather": lambda *args: {"temp": 31, "condition": "Clear"},
+        "aqi": lambda *args: {"aqi": 42},
+        "holiday": lambda *args: {"holiday": "None"},
+        "news": lambda *args: {"top_event": "None"},
+    }
+    for provider, fetcher in fakes.items():
+        monkeypatch.setitem(backend.SIGNAL_PROVIDERS, provider, fetcher)
+    return fakes
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """
+    Installs an open breaker with no cool-down for a provider: the next allow() is its probe.
+    """
+    def install(provider):
+        breaker = CircuitBreaker(provider, failure_threshold=1, open_seconds=0)
+        breaker.record_failure("boom")
+        monkeypatch.setitem(backend.signal_breakers, provider, breaker)
+        return breaker
+    return install
+
+
+def fetch():
+    return backend.fetch_live_signals(KEYS, CITY, use_cache=False, use_snapshot=False)
+
+
+def test_rate_limited_probe_leaves_the_breaker_probing(providers, half_open, monkeypatch):
+    breaker = half_open("aqi")
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "aqi", rate_limited)
+    assert fetch()["aqi"] == "N/A"
+    assert breaker.state == HALF_OPEN
+    assert breaker.consecutive_failures == 1
+
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "aqi", providers["aqi"])
+    assert fetch()["aqi"] == 42
+    assert breaker.state == CLOSED
+
+
+def test_rate_limited_group_call_releases_the_probe(half_open):
+    breaker = half_open("weather")
+    cities = [backend.city_registry.get(CITY)]
+
+    def group_rate_limited(session, keys, chunk):
+        raise RateLimited("openweather", "weather_group", "rate", 5)
+
+    assert backend._fetch_group("weather", group_rate_limited, None, KEYS, cities) == {CITY: None}
+    assert breaker.state == HALF_OPEN
+
+    result = backend._fetch_group("weather", lambda session, keys, chunk: {CITY: {"temp": 30, "condition": "Rain"}},
+                                  None, KEYS, cities)
+    assert result == {CITY: {"temp": 30, "condition": "Rain"}}
+    assert breaker.state == CLOSED
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, data):
+        self._data = data
+        self.content = json.dumps(data).encode()
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeAQISession:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return FakeResponse({"data": {"current": {"pollution": {"aqius": 40 + self.calls}}}})
+
+
+@pytest.fixture
+def iqair_limit(tmp_path, monkeypatch):
+    """
+    Swaps in a private rate limiter whose IQAir tier allows burst calls, then per_minute.
+    """
+    def install(per_minute, burst):
+        monkeypatch.setitem(rate_limiter.TIERS["iqair"], "test", Tier(daily=100, endpoints={"aqi": Rate(per_minute, burst)}))
+        monkeypatch.setattr(backend, "rate_limiter", RateLimiter(str(tmp_path / "ratelimits.db"), {"iqair": "test"}))
+        session = FakeAQISession()
+        monkeypatch.setattr(backend, "get_http_session", lambda: session)
+        monkeypatch.setattr(backend, "SIGNAL_MAX_WAIT", 0.0)
+        return session
+    return install
+
+
+def test_paced_bulk_fetch_covers_more_cities_than_the_burst(iqair_limit):
+    session = iqair_limit(per_minute=600, burst=2)
+    results = backend.fetch_providers_bulk(KEYS, backend.CITIES, ["aqi"], use_cache=False, max_wait=5)
+    assert all(results[city]["aqi"] is not None for city in backend.CITIES)
+    assert session.calls == len(backend.CITIES)
+
+
+def test_paced_bulk_fetch_stops_at_max_wait(iqair_limit):
+    session = iqair_limit(per_minute=6, burst=2)
+    results = backend.fetch_providers_bulk(KEYS, backend.CITIES, ["aqi"], use_cache=False, max_wait=1)
+    assert [results[city]["aqi"] is not None for city in backend.CITIES] == [True, True] + [False] * 4
+    assert session.calls == 2
+
+
+def test_unpaced_bulk_fetch_degrades_past_the_burst(iqair_limit):
+    session = iqair_limit(per_minute=6, burst=2)
+    results = backend.fetch_providers_bulk(KEYS, backend.CITIES, ["aqi"], use_cache=False)
+    assert sum(results[city]["aqi"] is None for city in backend.CITIES) == 4
+    assert session.calls == 2
+
+
+class FakeWeatherSession:
+    def __init__(self):
+        self.params = []
+
+    def get(self, url, params=None, timeout=None):
+        self.params.append(params)
+        return FakeResponse({"main": {"temp": 18}, "weather": [{"main": "Clouds"}]})
+
+
+def test_unregistered_city_gets_weather_by_name_and_no_aqi(providers, monkeypatch):
+    session = FakeWeatherSession()
+    monkeypatch.setattr(backend, "get_http_session", lambda: session)
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "weather", backend._fetch_weather)
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "aqi", rate_limited)  # must not be called
+
+    signals = backend.fetch_live_signals(KEYS, "Shimla", use_cache=False, use_snapshot=False)
+    assert signals["temp"] == 18 and signals["aqi"] == "N/A"
+    assert session.params[0]["q"] == "Shimla" and "lat" not in session.params[0]
+    assert all(breaker.consecutive_failures == 0 and breaker.state == CLOSED
+               for breaker in backend.signal_breakers.values())
+
+
+def test_cold_holiday_index_downloads_alongside_the_remote_providers(providers, monkeypatch):
+    today = backend.city_registry.get(CITY).today()
+    weather_called = threading.Event()
+    overlapped = []
+
+    def download_year(keys, country, year):
+        overlapped.append(weather_called.wait(timeout=2))
+        return [{"name": "Test Day", "date": {"iso": today.isoformat()}, "states": "All"}]
+
+    def weather(*args):
+        weather_called.set()
+        return providers["weather"]()
+
+    monkeypatch.setattr(backend, "holiday_index", HolidayIndex(download_year))
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "holiday", backend._fetch_holiday)
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "weather", weather)
+
+    assert fetch()["holiday"] == "Test Day"
+    assert overlapped == [True]
+    assert fetch()["holiday"] == "Test Day"
+    assert len(overlapped) == 1  # warm now: answered inline, no second download
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    signal_cache = SignalCache()
+    monkeypatch.setattr(backend, "signal_cache", signal_cache)
+    return signal_cache
+
+
+def test_alias_shares_the_registry_city_cache_entries(providers, cache, monkeypatch):
+    cache.put("Bengaluru", "weather", {"temp": 24, "condition": "Clouds"})
+    monkeypatch.setitem(backend.SIGNAL_PROVIDERS, "weather", rate_limited)  # must not be called
+
+    signals = backend.fetch_live_signals(KEYS, "Bangalore", use_snapshot=False)
+    assert signals["temp"] == 24 and signals["aqi"] == 42
+    assert cache.get("Bengaluru", "aqi") == {"aqi": 42}
+    assert cache.get("Bangalore", "aqi") is None
+
+
+def test_bulk_fetch_answers_an_alias_from_its_city(cache):
+    cache.put("Bengaluru", "aqi", {"aqi": 77})
+    results = backend.fetch_providers_bulk(KEYS, ["Bangalore"], ["aqi"])
+    assert results == {"Bangalore": {"aqi": {"aqi": 77}}}
@@ -0,0 +1,73 @@
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("test", failure_threshold=2, open_seconds=0, slow_call_s=1.0)
+
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure("boom")
+
+
+def test_opens_after_consecutive_failures_only(breaker):
+    breaker.record_failure("boom")
+    breaker.record_success(0.1)
+    breaker.record_failure("boom")
+    assert breaker.state == CLOSED
+    breaker.record_failure("boom")
+    assert breaker.state == OPEN
+
+
+def test_slow_success_counts_as_a_failure(breaker):
+    breaker.record_success(2.0)
+    breaker.record_success(2.0)
+    assert breaker.state == OPEN and "slow call" in breaker.last_error
+
+
+def test_open_breaker_skips_calls_until_the_cool_down_ends():
+    breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=60)
+    breaker.record_failure("boom")
+    assert not breaker.allow()
+    assert breaker.status()["short_circuited"] == 1 and breaker.status()["reopens_in_s"] > 0
+
+
+def test_half_open_lets_one_probe_through(breaker):
+    trip(breaker)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()  # the probe is still in flight
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED and breaker.allow()
+
+
+def test_failed_probe_reopens_with_a_longer_cool_down():
+    breaker = CircuitBreaker("test", failure_threshold=1, open_seconds=10, max_open_seconds=15)
+    breaker.record_failure("boom")
+    breaker.opened_at -= 10
+    assert breaker.allow()
+    breaker.record_failure("still down")
+    assert breaker.state == OPEN and breaker.trips == 2
+    assert breaker._cooldown() == 15  # 20 s, capped at max_open_seconds
+
+
+def test_released_probe_frees_the_slot_for_the_next_call(breaker):
+    trip(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == HALF_OPEN and breaker.consecutive_failures == 2
+    assert breaker.allow()
+
+
+def test_read_timeout_adapts_to_the_observed_p95():
+    breaker = CircuitBreaker("test", default_timeout=(3.05, 6), min_samples=5, timeout_multiplier=3.0)
+    for latency in (0.2, 0.3, 0.3, 0.4, 0.5):
+        assert breaker.timeout() == (3.05, 6)
+        breaker.record_success(latency)
+    assert breaker.timeout() == (3.05, 1.5)
+    for _ in range(5):
+        breaker.record_success(3.5)
+    assert breaker.timeout() == (3.05, 6)  # never above the static default
@@ -0,0 +1,28 @@
+import pytest
+
+import backend
+import geopulse
+
+
+@pytest.fixture
+def no_keys(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no .streamlit/secrets.toml here
+    for name in backend.KEY_NAMES:
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_missing_keys_are_all_reported_with_exit_2(no_keys, monkeypatch, capsys):
+    monkeypatch.setenv("OPENWEATHER_API_KEY", "set")
+    assert geopulse.main(["signals", "--city", "Delhi"]) == geopulse.EXIT_MISSING_KEY
+    err = capsys.readouterr().err
+    assert "IQAIR_API_KEY, CALENDARIFIC_API_KEY, NEWS_API_KEY" in err
+    assert "OPENWEATHER_API_KEY" not in err
+
+
+def test_other_key_errors_are_not_reported_as_missing_keys(no_keys, monkeypatch):
+    def unknown_brand(args):
+        raise KeyError("Unknown brand: zomatoo")
+
+    monkeypatch.setattr(geopulse, "cmd_brands", unknown_brand)
+    with pytest.raises(KeyError, match="Unknown brand"):
+        geopulse.main(["brands"])
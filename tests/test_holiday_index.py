@@ -0,0 +1,68 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from holiday_index import HolidayIndex
+
+DIWALI = {"name": "Diwali", "date": {"iso": "2026-11-08"}, "states": "All"}
+HOLI = {"name": "Holi", "date": {"iso": "2025-03-14"}, "states": [{"name": "Delhi"}]}
+
+
+class SlowDownload:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, keys, country, year):
+        self.calls.append(year)
+        if year == 2026:
+            assert self.release.wait(5)
+            return [DIWALI]
+        return [HOLI]
+
+
+@pytest.fixture
+def index(tmp_path):
+    download = SlowDownload()
+    return HolidayIndex(download, cache_dir=str(tmp_path)), download
+
+
+def test_cold_download_blocks_no_other_reader(index):
+    holidays, download = index
+    assert holidays.lookup({}, date(2025, 3, 14), state="Delhi") == ["Holi"]
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        waiting = [pool.submit(holidays.lookup, {}, date(2026, 11, 8)) for _ in range(2)]
+        time.sleep(0.1)
+        started = time.monotonic()
+        assert not holidays.is_loaded(2026)
+        assert holidays.lookup({}, date(2025, 3, 14), state="Goa") == []
+        assert time.monotonic() - started < 0.5
+        download.release.set()
+        assert [future.result(timeout=5) for future in waiting] == [["Diwali"], ["Diwali"]]
+    assert download.calls == [2025, 2026]  # both cold lookups shared one download
+    assert holidays.is_loaded(2026)
+
+
+def test_failed_download_is_not_retried_until_retry_after(tmp_path):
+    calls = []
+
+    def failing(keys, country, year):
+        calls.append(year)
+        raise OSError("Calendarific is down")
+
+    holidays = HolidayIndex(failing, cache_dir=str(tmp_path))
+    with pytest.raises(OSError):
+        holidays.lookup({}, date(2026, 1, 1))
+    with pytest.raises(Exception, match="unavailable"):
+        holidays.lookup({}, date(2026, 1, 2))
+    assert calls == [2026]
+
+
+def test_cached_file_counts_as_loaded(index, tmp_path):
+    holidays, download = index
+    holidays.lookup({}, date(2025, 1, 1))
+    fresh = HolidayIndex(download, cache_dir=str(tmp_path))
+    assert fresh.is_loaded(2025) and download.calls == [2025]
@@ -0,0 +1,50 @@
+from image_library import ImageLibrary
+
+PROMPT = "A vibrant top-down photorealistic shot of a steaming bowl of biryani"
+
+
+def test_directory_is_created_on_first_use(tmp_path):
+    directory = tmp_path / "library"
+    library = ImageLibrary(str(directory))
+    assert not directory.exists()
+    assert library.find("Brand", PROMPT) is None
+    assert (directory / "library.db").exists()
+
+
+def test_close_prompt_reuses_the_image_up_to_max_reuse(tmp_path):
+    library = ImageLibrary(str(tmp_path / "library"), max_reuse=1)
+    library.add("Brand", PROMPT, b"png-bytes")
+
+    match = library.find("Brand", PROMPT.replace("bowl", "bowls"))
+    assert match is not None and match.similarity >= library.threshold
+    assert library.use(match) == b"png-bytes"
+    assert library.find("Brand", PROMPT) is None  # reused max_reuse times
+    assert library.find("Other brand", PROMPT) is None
+
+
+def test_draft_image_is_not_offered_for_a_full_size_request(tmp_path):
+    library = ImageLibrary(str(tmp_path / "library"))
+    library.add("Brand", PROMPT, b"draft-bytes", draft=True)
+    assert library.find("Brand", PROMPT) is None
+    assert library.find("Brand", PROMPT, allow_draft=True) is not None
+
+
+def test_usable_image_below_several_drafts_is_found(tmp_path):
+    library = ImageLibrary(str(tmp_path / "library"))
+    for _ in range(6):
+        library.add("Brand", PROMPT, b"draft-bytes", draft=True)
+    library.add("Brand", PROMPT.replace("steaming", "hot"), b"png-bytes")
+
+    match = library.find("Brand", PROMPT)
+    assert match is not None
+    assert library.use(match) == b"png-bytes"
+
+
+def test_second_use_of_the_same_match_is_refused_at_max_reuse(tmp_path):
+    library = ImageLibrary(str(tmp_path / "library"), max_reuse=1)
+    library.add("Brand", PROMPT, b"png-bytes")
+
+    first, second = library.find("Brand", PROMPT), library.find("Brand", PROMPT)
+    assert library.use(first) == b"png-bytes"
+    assert library.use(second) is None
+    assert library.reuses == 1
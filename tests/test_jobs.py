@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+import jobs
+from jobs import JobQueue, WorkerPool
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "jobs.db"))
+
+
+def expire_leases(monkeypatch):
+    # Every lease handed out from now on is already over
+    monkeypatch.setattr(jobs, "LEASE_SECONDS", -1)
+
+
+def test_claim_takes_the_oldest_queued_job_once(queue):
+    first = queue.submit("analyze", {"n": 1})
+    queue.submit("analyze", {"n": 2})
+    queue.submit("generate", {"n": 3})
+
+    job = queue.claim(["analyze"])
+    assert (job["id"], job["payload"], job["attempts"]) == (first, {"n": 1}, 0)
+    assert queue.get(first)["status"] == "running"
+    assert queue.claim(["analyze"])["payload"] == {"n": 2}
+    assert queue.claim(["analyze"]) is None
+
+
+def test_a_job_whose_lease_expired_is_claimed_again(queue, monkeypatch):
+    job_id = queue.submit("analyze", {})
+    expire_leases(monkeypatch)
+    queue.claim(["analyze"])
+
+    again = queue.claim(["analyze"])
+    assert again["id"] == job_id
+    assert queue.get(job_id)["attempts"] == 2
+
+
+def test_a_renewed_lease_is_not_claimed_again(queue, monkeypatch):
+    job_id = queue.submit("analyze", {})
+    expire_leases(monkeypatch)
+    queue.claim(["analyze"])
+    monkeypatch.setattr(jobs, "LEASE_SECONDS", 180)
+    queue.renew_lease(job_id, 1)
+    assert queue.claim(["analyze"]) is None
+
+
+def test_a_job_is_failed_after_max_attempts(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.db"), max_attempts=2)
+    job_id = queue.submit("analyze", {})
+    expire_leases(monkeypatch)
+    assert queue.claim(["analyze"])["id"] == job_id
+    assert queue.claim(["analyze"])["id"] == job_id
+    assert queue.claim(["analyze"]) is None
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert "2 attempts" in job["error"]
+    assert job["lease_until"] is None
+
+
+def test_heartbeat_keeps_a_long_job_leased(queue, monkeypatch):
+    monkeypatch.setattr(jobs, "LEASE_SECONDS", 0.3)
+    monkeypatch.setattr(jobs, "HEARTBEAT_SECONDS", 0.05)
+
+    def slow(job, context, report_progress):
+        time.sleep(1.0)  # far past the lease, with no progress reported
+        return {"ok": True}, None
+
+    pool = WorkerPool(queue, {}, size=1, handlers={"slow": slow}, poll_interval=0.05).start()
+    job_id = pool.submit("slow", {})
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)["status"] == "queued" and time.monotonic() < deadline:
+        time.sleep(0.02)
+    time.sleep(0.6)
+    assert queue.claim(["slow"]) is None  # another worker sees a live lease
+
+    while queue.get(job_id)["status"] == "running" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    job = queue.get(job_id)
+    assert (job["status"], job["result"], job["attempts"]) == ("done", {"ok": True}, 1)
+
+
+def test_a_stale_worker_cannot_overwrite_a_reclaimed_job(queue, monkeypatch):
+    job_id = queue.submit("analyze", {})
+    expire_leases(monkeypatch)
+    stale = queue.claim(["analyze"])
+    monkeypatch.setattr(jobs, "LEASE_SECONDS", 180)
+    current = queue.claim(["analyze"])
+
+    assert not queue.complete(job_id, stale["attempts"] + 1, {"from": "stale"})
+    assert not queue.fail(job_id, stale["attempts"] + 1, "stale worker gave up")
+    assert not queue.renew_lease(job_id, stale["attempts"] + 1)
+    assert queue.get(job_id)["status"] == "running"
+
+    assert queue.complete(job_id, current["attempts"] + 1, {"from": "current"})
+    job = queue.get(job_id)
+    assert (job["status"], job["result"]) == ("done", {"from": "current"})
+    assert not queue.fail(job_id, current["attempts"] + 1, "too late")
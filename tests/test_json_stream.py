@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from json_stream import IncrementalJSONObjectParser
+
+REPLY = {
+    "post_text": "Rain in Mumbai? \"Chai\" time ☕\nStay dry \U0001F327",
+    "hashtags": ["#Monsoon", "#Chai, hot"],
+    "target_audience": {"age": "18-35", "city": "Mumbai"},
+    "predicted_impact_rating": 8,
+    "viral": True,
+}
+
+
+def stream(text, size):
+    parser = IncrementalJSONObjectParser()
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return parser, events
+
+
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_values_match_json_loads_for_any_chunking(ensure_ascii, size):
+    parser, events = stream(json.dumps(REPLY, ensure_ascii=ensure_ascii, indent=1), size)
+    assert parser.done
+    assert parser.values == REPLY
+    assert [key for kind, key, _ in events if kind == "value"] == list(REPLY)
+
+
+def test_string_value_arrives_as_growing_partials():
+    _, events = stream(json.dumps(REPLY), 1)
+    partials = [text for kind, key, text in events if kind == "partial" and key == "post_text"]
+    # Each partial is decoded text so far: never half an escape or surrogate pair
+    assert all(REPLY["post_text"].startswith(text) for text in partials)
+    assert len(partials) > 10
+
+
+def test_a_value_is_reported_before_the_object_closes():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"post_text": "Hi", "hashtags": ["#a"], "rating": 7') == [
+        ("partial", "post_text", "Hi"), ("value", "post_text", "Hi"), ("value", "hashtags", ["#a"])
+    ]
+    assert parser.feed("}") == [("value", "rating", 7)]
+    assert parser.done
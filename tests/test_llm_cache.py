@@ -0,0 +1,21 @@
+import os
+
+from llm_cache import LLMResponseCache, make_key
+
+MESSAGES = [{"role": "system", "content": "Be brief."}, {"role": "user", "content": "Hello"}]
+
+
+def test_disk_tier_is_opened_on_first_use(tmp_path):
+    db_path = str(tmp_path / "llm_cache.db")
+    cache = LLMResponseCache(db_path=db_path)
+    assert not os.path.exists(db_path)
+
+    key = make_key("gpt-4o", MESSAGES)
+    cache.put(key, "Hi", latency_s=1.5, ttl=60)
+    assert os.path.exists(db_path)
+    assert LLMResponseCache(db_path=db_path).get(key) == "Hi"
+
+
+def test_key_depends_on_the_response_format():
+    assert make_key("gpt-4o", MESSAGES) == make_key("gpt-4o", list(MESSAGES))
+    assert make_key("gpt-4o", MESSAGES) != make_key("gpt-4o", MESSAGES, {"type": "json_object"})
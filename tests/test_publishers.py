@@ -0,0 +1,98 @@
+import pytest
+import requests
+import urllib3
+
+import publishers
+from publishers import Publisher
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.text = f"status {status_code}"
+        self.headers = headers or {}
+
+
+class ScriptedPublisher(Publisher):
+    """
+    Answers each send() with the next outcome: a status code or an exception to raise.
+    """
+    name = "scripted"
+    label = "Scripted"
+
+    def __init__(self, outcomes, idempotent=False):
+        self.outcomes = list(outcomes)
+        self.idempotent = idempotent
+        self.sends = 0
+
+    def send(self, session, keys, message_text, image, hashtags):
+        self.sends += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return FakeResponse(outcome, {"Retry-After": "0"} if outcome == 429 else None)
+
+
+@pytest.fixture
+def channel(monkeypatch):
+    def install(outcomes, **options):
+        publisher = ScriptedPublisher(outcomes, **options)
+        monkeypatch.setitem(publishers.PUBLISHERS, publisher.name, publisher)
+        return publisher
+    return install
+
+
+def publish(channel="scripted"):
+    return publishers.publish_one(channel, {}, "Hello", b"png", ["#test"], base_delay=0)
+
+
+def refused():
+    pool = urllib3.HTTPConnectionPool("localhost")
+    reason = urllib3.exceptions.NewConnectionError(None, "Connection refused")
+    return requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(pool, "/", reason))
+
+
+def test_unknown_channel_is_a_failed_result():
+    result = publish("carrier-pigeon")
+    assert not result.ok and "unknown channel" in result.message
+
+
+def test_image_that_will_not_encode_is_a_failed_result(channel, monkeypatch):
+    publisher = channel([200])
+
+    def broken(image_bytes):
+        raise ValueError("cannot identify image file")
+
+    monkeypatch.setattr(publisher, "prepare_image", broken)
+    result = publish()
+    assert not result.ok and "cannot identify image file" in result.message
+    assert publisher.sends == 0
+
+
+@pytest.mark.parametrize("outcome", [503, requests.exceptions.ReadTimeout("read timed out"),
+                                     requests.exceptions.ConnectionError("connection reset")])
+def test_failures_after_the_request_went_out_are_not_retried(channel, outcome):
+    publisher = channel([outcome, 200])
+    result = publish()
+    assert not result.ok and result.attempts == 1 and publisher.sends == 1
+
+
+@pytest.mark.parametrize("outcome", [429, requests.exceptions.ConnectTimeout("connect timed out"), refused()])
+def test_failures_that_cannot_have_posted_are_retried(channel, outcome):
+    publisher = channel([outcome, 200])
+    result = publish()
+    assert result.ok and result.attempts == 2 and publisher.sends == 2
+
+
+def test_idempotent_publisher_retries_5xx_and_read_errors(channel):
+    publisher = channel([503, requests.exceptions.ReadTimeout("read timed out"), 200], idempotent=True)
+    result = publish()
+    assert result.ok and result.attempts == 3 and publisher.sends == 3
+
+
+def test_publish_all_with_no_channels_publishes_nowhere(channel):
+    publisher = channel([200])
+    keys = {"DISCORD_WEBHOOK_URL": "https://discord.example/webhook"}
+    assert publishers.publish_all(keys, "Hello", b"png", [], channels=[]) == []
+    assert publisher.sends == 0
@@ -0,0 +1,98 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import rate_limiter
+from rate_limiter import Rate, RateLimited, RateLimiter, Tier
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def limiter(tmp_path, monkeypatch):
+    """
+    A limiter on a private "test" vendor; call it with the tier's numbers.
+    """
+    def make(per_minute, burst, daily=None):
+        monkeypatch.setitem(rate_limiter.TIERS, "test", {"t": Tier(daily=daily, endpoints={"call": Rate(per_minute, burst)})})
+        return RateLimiter(str(tmp_path / "ratelimits.db"), {"test": "t"})
+    return make
+
+
+def test_queued_async_calls_hold_no_executor_thread(limiter):
+    limits = limiter(per_minute=300, burst=1)  # one token every 0.2 s
+
+    async def main():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+        waiters = [asyncio.create_task(limits.acquire_async("test", "call", "key", max_wait=5)) for _ in range(6)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await asyncio.to_thread(lambda: None)  # would queue behind blocked waiters with a to_thread(acquire)
+        other_thread_s = time.monotonic() - started
+        await asyncio.gather(*waiters)
+        return other_thread_s
+
+    assert asyncio.run(main()) < 0.1
+    assert limits.stats()["queued"] == 5
+
+
+def test_bucket_allows_the_burst_then_reports_the_refill_wait(limiter):
+    limits = limiter(per_minute=60, burst=2)
+    assert limits.try_acquire("test", "call", "key")[0]
+    assert limits.try_acquire("test", "call", "key")[0]
+    allowed, wait, reason = limits.try_acquire("test", "call", "key")
+    assert (allowed, reason) == (False, "rate") and 0.9 < wait <= 1.0
+    assert limits.try_acquire("test", "call", "other key")[0]  # buckets are per key
+
+
+def test_wait_time_takes_no_token(limiter):
+    limits = limiter(per_minute=60, burst=1)
+    assert limits.wait_time("test", "call", "key") == (0.0, None)
+    assert limits.wait_time("test", "call", "key") == (0.0, None)
+    assert limits.try_acquire("test", "call", "key")[0]
+    assert limits.wait_time("test", "call", "key")[1] == "rate"
+
+
+def test_acquire_queues_within_max_wait_and_raises_past_it(limiter):
+    limits = limiter(per_minute=600, burst=1)  # one token every 0.1 s
+    limits.acquire("test", "call", "key")
+    limits.acquire("test", "call", "key", max_wait=1)
+    assert limits.stats()["queued"] == 1
+    with pytest.raises(RateLimited) as error:
+        limits.acquire("test", "call", "key", max_wait=0.01)
+    assert error.value.reason == "rate"
+
+
+def test_daily_quota_is_rejected_at_once(limiter):
+    limits = limiter(per_minute=6000, burst=100, daily=2)
+    limits.acquire("test", "call", "key", cost=2)
+    with pytest.raises(RateLimited) as error:
+        limits.acquire("test", "call", "key", max_wait=60)
+    assert error.value.reason == "quota"
+    assert limits.status("test", "key")[0]["remaining_today"] == 0
+
+
+def test_penalize_and_counts_are_shared_by_every_limiter_on_the_file(limiter, tmp_path):
+    limits = limiter(per_minute=60, burst=5)
+    other_process = RateLimiter(str(tmp_path / "ratelimits.db"), {"test": "t"})
+    other_process.penalize("test", "call", "key", retry_after=30)
+    allowed, wait, reason = limits.try_acquire("test", "call", "key")
+    assert not allowed and 29 < wait <= 30
+
+
+def test_limiter_creates_its_file_on_first_use(limiter, tmp_path):
+    limits = limiter(per_minute=60, burst=5)
+    assert not (tmp_path / "ratelimits.db").exists()
+    limits.try_acquire("test", "call", "key")
+    assert (tmp_path / "ratelimits.db").exists()
+
+
+def test_importing_backend_creates_nothing_on_disk(tmp_path):
+    env = dict(os.environ, GEOPULSE_DATA_DIR=str(tmp_path / "data"), GEOPULSE_SIGNAL_REFRESH="0")
+    subprocess.run([sys.executable, "-c", "import backend"], cwd=REPO, env=env, check=True, capture_output=True)
+    assert list(tmp_path.iterdir()) == []
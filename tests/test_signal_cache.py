@@ -0,0 +1,46 @@
+import io
+import os
+
+from PIL import Image
+
+from signal_cache import SignalCache
+
+
+def test_disk_tier_is_opened_on_first_use(tmp_path):
+    db_path = str(tmp_path / "cache" / "signals.db")
+    cache = SignalCache(db_path=db_path)
+    assert not os.path.exists(db_path)
+
+    cache.put("Mumbai", "weather", {"temp": 31})
+    assert os.path.exists(db_path)
+    assert SignalCache(db_path=db_path).get("Mumbai", "weather") == {"temp": 31}
+
+
+def test_expired_value_is_a_miss_but_still_a_fallback(tmp_path):
+    cache = SignalCache(ttls={"news": 0}, db_path=str(tmp_path / "signals.db"))
+    cache.put("Pune", "news", {"top_event": "Derby"})
+    assert cache.get("Pune", "news") is None
+    value, age = cache.get_stale("Pune", "news")
+    assert value == {"top_event": "Derby"} and age >= 0
+    assert cache.stats()["misses"] == 1
+
+
+def test_file_backed_helpers_create_their_directory_on_first_write(tmp_path):
+    from creative_ranker import RecentPosts
+    from image_derivatives import DerivativeCache
+    from signal_changes import ChangeDetector
+
+    posts = RecentPosts(str(tmp_path / "posts" / "recent_posts.jsonl"))
+    detector = ChangeDetector(log_path=str(tmp_path / "changes" / "signal_deltas.jsonl"))
+    images = DerivativeCache(str(tmp_path / "images"))
+    assert list(tmp_path.iterdir()) == [] and images.stats()["size_bytes"] == 0
+
+    posts.add("Brand", "Hello Mumbai")
+    detector.observe("Mumbai", {"temp": 30})
+    assert (tmp_path / "posts" / "recent_posts.jsonl").exists()
+    assert (tmp_path / "changes" / "signal_deltas.jsonl").exists()
+
+    png = io.BytesIO()
+    Image.new("RGB", (8, 8), "orange").save(png, format="PNG")
+    images.get(png.getvalue(), "preview")
+    assert images.stats()["size_bytes"] > 0
@@ -0,0 +1,44 @@
+import json
+
+import pytest
+
+from signal_changes import ChangeDetector, diff_signals
+
+BASE = {"temp": 30, "condition": "Haze", "aqi": 120, "holiday": "None", "top_event": "None"}
+
+
+def material_fields(deltas):
+    return [delta["field"] for delta in deltas if delta["material"]]
+
+
+@pytest.mark.parametrize("change, material", [
+    ({"aqi": 140}, []),
+    ({"aqi": 160}, ["aqi"]),
+    ({"temp": 33}, []),
+    ({"temp": 26}, ["temp"]),
+    ({"condition": "Rain"}, ["condition"]),
+    ({"holiday": "Diwali"}, ["holiday"]),
+    ({"top_event": "Derby at Wankhede"}, ["top_event"]),
+    ({"aqi": "N/A", "temp": "N/A", "condition": "N/A"}, []),
+])
+def test_which_deltas_are_material(change, material):
+    assert material_fields(diff_signals(BASE, {**BASE, **change})) == material
+
+
+def test_thresholds_can_be_tuned():
+    current = {**BASE, "temp": 32, "condition": "Rain"}
+    assert material_fields(diff_signals(BASE, current, {"temp_swing_c": 2, "condition": False})) == ["temp"]
+
+
+def test_slow_drift_adds_up_against_the_baseline(tmp_path):
+    detector = ChangeDetector(log_path=str(tmp_path / "deltas" / "signal_deltas.jsonl"))
+    assert detector.observe("Mumbai", BASE)[0]["reason"] == "first observation"
+    for temp in (31, 32, 33):
+        assert detector.observe("Mumbai", {**BASE, "temp": temp}) == []
+    assert material_fields(detector.observe("Mumbai", {**BASE, "temp": 34})) == ["temp"]
+    assert detector.observe("Mumbai", {**BASE, "temp": 35}) == []  # the baseline moved to 34
+
+    assert detector.stats()["material_changes"] == 2
+    assert detector.log(limit=1)[0]["to"] == 35
+    lines = (tmp_path / "deltas" / "signal_deltas.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 6 and json.loads(lines[-1])["city"] == "Mumbai"
@@ -0,0 +1,71 @@
+from signal_snapshots import DEFAULT_INTERVALS, REFRESH_QUOTA_SHARE, SignalRefresher, SnapshotStore, quota_intervals
+
+CITIES = ["Delhi", "Mumbai", "Chennai"]
+
+
+class RecordingFetch:
+    def __init__(self, failing=()):
+        self.calls = []
+        self.failing = set(failing)
+
+    def __call__(self, keys, cities, providers):
+        self.calls.append((list(cities), sorted(providers)))
+        return {city: {provider: None if (city, provider) in self.failing else {provider: city} for provider in providers}
+                for city in cities}
+
+
+def make_refresher(tmp_path, fetch):
+    return SignalRefresher(fetch, {}, SnapshotStore(str(tmp_path / "snapshots.db")), CITIES, retry_after=0)
+
+
+def test_first_round_fetches_every_provider_in_one_call(tmp_path):
+    fetch = RecordingFetch()
+    refresher = make_refresher(tmp_path, fetch)
+    assert sorted(refresher.run_once()) == ["aqi", "news", "weather"]
+    assert fetch.calls == [(CITIES, ["aqi", "news", "weather"])]
+    assert refresher.store.read("Mumbai") == {"weather": {"weather": "Mumbai"}, "aqi": {"aqi": "Mumbai"},
+                                              "news": {"news": "Mumbai"}}
+
+
+def test_a_city_that_failed_is_retried_alone(tmp_path):
+    fetch = RecordingFetch(failing={("Chennai", "aqi")})
+    refresher = make_refresher(tmp_path, fetch)
+    refresher.run_once()
+    assert refresher.due_providers() == ["aqi"]
+
+    fetch.failing.clear()
+    assert refresher.run_once() == ["aqi"]
+    assert fetch.calls[-1] == (["Chennai"], ["aqi"])
+    assert refresher.due_providers() == []
+
+
+def test_only_the_lease_holder_refreshes(tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots.db"))
+    first, second = RecordingFetch(), RecordingFetch()
+    assert SignalRefresher(first, {}, store, CITIES).run_once()
+    assert SignalRefresher(second, {}, store, CITIES).run_once() == []
+    assert second.calls == []
+
+
+def test_store_creates_its_file_on_first_use(tmp_path):
+    db_path = tmp_path / "data" / "snapshots.db"
+    store = SnapshotStore(str(db_path))
+    assert not db_path.exists()
+    assert store.version() == 0
+    assert db_path.exists()
+
+
+def test_intervals_leave_most_of_a_small_quota_to_other_callers():
+    intervals = quota_intervals({"weather": 1, "aqi": 6, "news": 2}, {"weather": 33_000, "aqi": 500, "news": 100})
+    assert intervals["weather"] == DEFAULT_INTERVALS["weather"]
+    assert intervals["aqi"] == DEFAULT_INTERVALS["aqi"]  # 24 rounds of 6 is 144 of 500
+    assert 24 * 60 * 60 / intervals["news"] * 2 <= 100 * REFRESH_QUOTA_SHARE
+
+
+def test_refresher_news_fits_the_developer_tier():
+    import backend
+
+    calls = backend.refresh_calls_per_round()["news"]
+    daily = backend.rate_limiter.tier("newsapi").daily
+    assert 24 * 60 * 60 / backend.REFRESH_INTERVALS["news"] * calls <= daily * REFRESH_QUOTA_SHARE
+    assert backend.make_signal_refresher({}).intervals == backend.REFRESH_INTERVALS
@@ -0,0 +1,73 @@
+import json
+
+import pytest
+import requests
+
+import backend
+import publishers
+import tracing
+from circuit_breaker import CircuitBreaker
+
+SECRET = "s3cr3t-key-value"
+KEYS = {name: SECRET for name in backend.KEY_NAMES}
+
+
+class UnauthorizedSession:
+    """
+    Answers every GET with a 401 whose URL, like the real one, carries the query string.
+    """
+    def get(self, url, params=None, timeout=None):
+        response = requests.Response()
+        response.status_code, response.reason, response._content = 401, "Unauthorized", b"{}"
+        response.url = requests.Request("GET", url, params=params).prepare().url
+        return response
+
+
+class RefusedSession:
+    def post(self, url, **kwargs):
+        raise requests.exceptions.ConnectionError(
+            f"HTTPSConnectionPool(host='api.telegram.org', port=443): Max retries exceeded with url: "
+            f"{url.split('api.telegram.org')[1]} (Caused by ConnectTimeoutError())"
+        )
+
+
+@pytest.fixture
+def exported(tmp_path, monkeypatch):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing.tracer, "jsonl_path", str(path))
+    return lambda: [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+@pytest.mark.parametrize("provider", ["weather", "aqi", "news"])
+def test_failed_signal_span_exports_no_api_key(provider, exported, monkeypatch):
+    monkeypatch.setitem(backend.signal_breakers, provider, CircuitBreaker(provider))
+    values, ok = backend._fetch_provider(provider, UnauthorizedSession(), KEYS, "Mumbai",
+                                         backend.city_registry.get("Mumbai").today())
+    assert not ok
+    spans = exported()
+    assert spans[-1]["status"] == "error" and "401" in spans[-1]["error"]
+    assert SECRET not in json.dumps(spans)
+
+
+def test_failed_publish_span_exports_no_bot_token(exported, monkeypatch):
+    monkeypatch.setattr(publishers, "get_session", lambda: RefusedSession())
+    keys = {"TELEGRAM_BOT_TOKEN": SECRET, "TELEGRAM_CHAT_ID": "42"}
+    monkeypatch.setattr(publishers.PUBLISHERS["telegram"], "prepare_image",
+                        lambda image_bytes: publishers.Publisher.prepare_image(publishers.Publisher(), image_bytes))
+    result = publishers.publish_one("telegram", keys, "Hi", b"png", [], max_retries=0)
+    assert not result.ok and SECRET not in result.message
+    assert SECRET not in json.dumps(exported())
+
+
+def test_redact_keeps_the_host_and_path():
+    text = "401 Client Error: Unauthorized for url: https://newsapi.org/v2/everything?q=Mumbai&apiKey=abc"
+    assert tracing.redact(text) == "401 Client Error: Unauthorized for url: https://newsapi.org/v2/everything?<redacted>"
+
+
+def test_breaker_last_error_shows_no_api_key(monkeypatch):
+    breaker = CircuitBreaker("weather")
+    monkeypatch.setitem(backend.signal_breakers, "weather", breaker)
+    backend._fetch_provider("weather", UnauthorizedSession(), KEYS, "Mumbai",
+                            backend.city_registry.get("Mumbai").today())
+    assert "401" in breaker.last_error and SECRET not in breaker.last_error
+    assert SECRET not in json.dumps(backend.signal_breaker_status())
@@ -0,0 +1,343 @@
+"""
+Lightweight tracing for the GeoPulse pipeline.
+
+Every external call (signal APIs, GPT-4o, DALL-E, publishers) runs inside a
+span that records wall time, bytes, retries, token usage and estimated cost.
+Spans are grouped into traces (one per job / batch pipeline), kept in memory
+for the UI waterfall, appended to a JSONL file and folded into
+Prometheus-style metrics, optionally served on /metrics. Error text is
+redacted first (redact()): requests puts the full URL, API key included, into
+its exception messages.
+
+The current span lives in a contextvar, so asyncio tasks inherit it for free;
+work handed to a thread pool must be wrapped with tracing.wrap() to keep its
+parent.
+"""
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {"gpt-4o": (2.50, 10.00)}
+# USD per image, by (model, quality, size)
+IMAGE_PRICES = {
+    ("dall-e-3", "standard", "1024x1024"): 0.040,
+    ("dall-e-3", "hd", "1024x1024"): 0.080,
+    ("dall-e-2", "standard", "1024x1024"): 0.020,
+    ("dall-e-2", "standard", "512x512"): 0.018,
+    ("dall-e-2", "standard", "256x256"): 0.016,
+}
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Where requests' exception text carries credentials: the query string (appid=,
+# key=, apiKey=, api_key=), Telegram's /bot<token>/ and Discord's /webhooks/<id>/<token>
+_SECRET_PATTERNS = (
+    (re.compile(r"\?[^\s'\")]*=[^\s'\")]*"), "?<redacted>"),
+    (re.compile(r"/bot[^/\s'\")]+"), "/bot<redacted>"),
+    (re.compile(r"/webhooks/[^\s'\")]+"), "/webhooks/<redacted>"),
+)
+
+_current_span = contextvars.ContextVar("geopulse_span", default=None)
+_current_trace = contextvars.ContextVar("geopulse_trace", default=None)
+
+
+def llm_cost(model, prompt_tokens, completion_tokens):
+    input_price, output_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4o"])
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def image_cost(model, size, quality="standard", n=1):
+    return IMAGE_PRICES.get((model, quality or "standard", size), 0.0) * n
+
+
+def redact(text):
+    """
+    text with URL query strings and token-bearing URL paths blanked out, so an
+    exception message can be stored in a span, a log or the UI.
+    """
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class Span:
+    def __init__(self, name, kind, trace_id, parent_id=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.parent_id = parent_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration_s = None
+        self.status = "ok"
+        self.error = None
+        self.attrs = {}
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_usage(self, model, usage):
+        """
+        Copies token usage off an OpenAI response (or stream chunk) and prices it.
+        """
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        self.set(model=model, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                 cost_usd=round(llm_cost(model, prompt_tokens, completion_tokens), 6))
+
+    def fail(self, error):
+        self.status = "error"
+        self.error = redact(f"{type(error).__name__}: {error}")[:300]
+
+    def finish(self):
+        if self.duration_s is None:
+            self.duration_s = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "kind": self.kind, "start": round(self.start, 6),
+            "duration_s": round(self.duration_s or 0.0, 6), "status": self.status,
+            "error": self.error, **self.attrs,
+        }
+
+
+class Metrics:
+    """
+    Counters and a duration histogram, rendered in the Prometheus text format.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (metric, labels) -> value
+        self._histograms = {}  # labels -> [bucket counts..., sum, count]
+
+    def _inc(self, metric, labels, value=1.0):
+        self._counters[(metric, labels)] = self._counters.get((metric, labels), 0.0) + value
+
+    def observe(self, span):
+        name = (("name", span.name),)
+        attrs = span.attrs
+        with self._lock:
+            labels = (("name", span.name), ("kind", span.kind))
+            hist = self._histograms.setdefault(labels, [0] * len(DURATION_BUCKETS) + [0.0, 0])
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration_s <= bound:
+                    hist[i] += 1
+            hist[-2] += span.duration_s
+            hist[-1] += 1
+            self._inc("geopulse_spans_total", name + (("status", span.status),))
+            if attrs.get("prompt_tokens"):
+                self._inc("geopulse_llm_tokens_total", name + (("type", "prompt"),), attrs["prompt_tokens"])
+            if attrs.get("completion_tokens"):
+                self._inc("geopulse_llm_tokens_total", name + (("type", "completion"),), attrs["completion_tokens"])
+            if attrs.get("cost_usd"):
+                self._inc("geopulse_cost_usd_total", name, attrs["cost_usd"])
+            if attrs.get("bytes_in"):
+                self._inc("geopulse_bytes_total", name + (("direction", "in"),), attrs["bytes_in"])
+            if attrs.get("bytes_out"):
+                self._inc("geopulse_bytes_total", name + (("direction", "out"),), attrs["bytes_out"])
+            if attrs.get("retries"):
+                self._inc("geopulse_retries_total", name, attrs["retries"])
+            if attrs.get("cache_hit"):
+                self._inc("geopulse_cache_hits_total", name)
+
+    def render(self):
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+        lines = ["# TYPE geopulse_span_duration_seconds histogram"]
+        with self._lock:
+            for labels, hist in sorted(self._histograms.items()):
+                for bound, count in zip(DURATION_BUCKETS, hist):
+                    lines.append(f"geopulse_span_duration_seconds_bucket{fmt(labels + (('le', bound),))} {count}")
+                lines.append(f"geopulse_span_duration_seconds_bucket{fmt(labels + (('le', '+Inf'),))} {hist[-1]}")
+                lines.append(f"geopulse_span_duration_seconds_sum{fmt(labels)} {hist[-2]:.6f}")
+                lines.append(f"geopulse_span_duration_seconds_count{fmt(labels)} {hist[-1]}")
+            seen = set()
+            for (metric, labels), value in sorted(self._counters.items()):
+                if metric not in seen:
+                    lines.append(f"# TYPE {metric} counter")
+                    seen.add(metric)
+                lines.append(f"{metric}{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+class Tracer:
+    def __init__(self, max_traces=200):
+        self.max_traces = max_traces
+        self.metrics = Metrics()
+        self.jsonl_path = None
+        self.max_bytes = 20 * 1024 * 1024
+        self._traces = OrderedDict()  # trace_id -> [span dicts]
+        self._lock = threading.Lock()
+
+    def export_to(self, jsonl_path, max_bytes=20 * 1024 * 1024):
+        """
+        Appends every finished span to jsonl_path (rotated to .1 past max_bytes).
+        The file and its directory are created with the first span.
+        """
+        self.jsonl_path = jsonl_path
+        self.max_bytes = max_bytes
+
+    def record(self, span):
+        record = span.to_dict()
+        self.metrics.observe(span)
+        with self._lock:
+            self._traces.setdefault(span.trace_id, []).append(record)
+            self._traces.move_to_end(span.trace_id)
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+            if self.jsonl_path:
+                try:
+                    if os.path.dirname(self.jsonl_path):
+                        os.makedirs(os.path.dirname(self.jsonl_path), exist_ok=True)
+                    if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) > self.max_bytes:
+                        os.replace(self.jsonl_path, self.jsonl_path + ".1")
+                    with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                except OSError as e:
+                    print(f"[Tracing] ❌ Could not write span to {self.jsonl_path}: {e}")
+
+    def get_trace(self, trace_id):
+        """
+        Finished spans of one trace, oldest first.
+        """
+        with self._lock:
+            return sorted(self._traces.get(trace_id, []), key=lambda s: s["start"])
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def span(name, kind="call", activate=True, **attrs):
+    """
+    Times the block as one span under the current span/trace.
+    activate=False records the span without making it the parent of spans
+    opened inside the block (use it when the block yields, e.g. a stream).
+    """
+    parent = _current_span.get()
+    trace_id = _current_trace.get() or (parent.trace_id if parent else None) or uuid.uuid4().hex
+    current = Span(name, kind, trace_id, parent.span_id if parent else None)
+    current.set(**attrs)
+    token = _current_span.set(current) if activate else None
+    try:
+        yield current
+    except BaseException as e:
+        current.fail(e)
+        raise
+    finally:
+        current.finish()
+        if token is not None:
+            _current_span.reset(token)
+        tracer.record(current)
+
+
+@contextmanager
+def trace(name, trace_id=None, **attrs):
+    """
+    Starts a new trace (e.g. one job run) with a root span called name.
+    """
+    trace_token = _current_trace.set(trace_id or uuid.uuid4().hex)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, kind="run", **attrs) as root:
+            yield root
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+def traced(name, kind="call"):
+    """
+    Decorator form of span().
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with span(name, kind=kind):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs):
+    """
+    Adds attributes to the current span, if there is one.
+    """
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attrs)
+
+
+def current_trace_id():
+    current = _current_span.get()
+    return current.trace_id if current else _current_trace.get()
+
+
+def wrap(func):
+    """
+    Binds func to the caller's trace context, for handing it to a thread pool.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(func, *args, **kwargs)
+    return run
+
+
+# --- Prometheus endpoint ---
+_metrics_server = None
+_metrics_lock = threading.Lock()
+
+
+def start_metrics_server(port=9464, host="127.0.0.1"):
+    """
+    Serves tracer.metrics on http://host:port/metrics from a daemon thread (first call only).
+    """
+    global _metrics_server
+    with _metrics_lock:
+        if _metrics_server is not None:
+            return _metrics_server
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = tracer.metrics.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        _metrics_server = ThreadingHTTPServer((host, port), Handler)
+        _metrics_server.daemon_threads = True
+        threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        print(f"[Tracing] ✅ Metrics on http://{host}:{port}/metrics")
+        return _metrics_server
+
+
+def start_metrics_server_from_env():
+    """
+    Starts the /metrics endpoint if GEOPULSE_METRICS_PORT is set (GEOPULSE_METRICS_HOST defaults to 127.0.0.1).
+    """
+    port = os.environ.get("GEOPULSE_METRICS_PORT")
+    if port:
+        return start_metrics_server(int(port), os.environ.get("GEOPULSE_METRICS_HOST", "127.0.0.1"))
+    return None